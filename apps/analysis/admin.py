@@ -2,7 +2,7 @@
 数据分析后台管理
 """
 from django.contrib import admin
-from .models import MarketReport
+from .models import MarketReport, DistrictStats
 
 
 @admin.register(MarketReport)
@@ -13,3 +13,10 @@ class MarketReportAdmin(admin.ModelAdmin):
     search_fields = ['title', 'summary']
     date_hierarchy = 'report_date'
 
+
+
+@admin.register(DistrictStats)
+class DistrictStatsAdmin(admin.ModelAdmin):
+    list_display = ['district', 'house_count', 'avg_price', 'avg_unit_price',
+                    'recent_transaction_count', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at']
@@ -6,3 +6,5 @@ class AnalysisConfig(AppConfig):
     name = 'apps.analysis'
     verbose_name = '数据分析'
 
+    def ready(self):
+        from . import signals  # noqa: F401
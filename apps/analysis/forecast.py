@@ -0,0 +1,252 @@
+"""
+市场趋势预测
+
+一次按月分组的条件聚合取出月度成交量与成交均价以及近30/90天窗口指标,
+在内存中对月度序列做滚动中位数平滑, 再按成交量加权拟合线性趋势外推下月价格.
+结果按 (区域, 日期, 房源与成交数据版本号) 缓存一天, 数据变化后即重新计算.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.common.cache import get_versions
+from apps.houses.models import House, Transaction
+
+# 参与拟合的历史月数
+HISTORY_MONTHS = 24
+
+# 滚动中位数窗口(月)
+SMOOTHING_WINDOW = 3
+
+# 至少需要的有成交月份数, 不足时返回"数据不足"
+MIN_MONTHS = 3
+
+# 预测月涨跌幅超过该百分比才判定为上涨/下跌
+TREND_THRESHOLD_PERCENT = 1.0
+
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# 预测依赖的响应缓存数据范围, 任一版本号变化即失效
+CACHE_SCOPES = ('house', 'transaction')
+
+
+def _month_starts(today, months):
+    """
+    返回从最早到本月的各月1日, 共 months 个
+    """
+    starts = []
+    month = today.replace(day=1)
+    for _ in range(months):
+        starts.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+def load_market_data(district_id=None, today=None):
+    """
+    读取预测所需的原始数据: 在售房源数一次计数, 成交记录按月分组一次条件聚合
+    (每月的成交量、成交总价, 以及落在近30天/前60天窗口内的部分), 窗口指标由各月结果求和得到
+    """
+    today = today or timezone.localdate()
+    thirty_days_ago = today - timedelta(days=30)
+    ninety_days_ago = today - timedelta(days=90)
+    month_starts = _month_starts(today, HISTORY_MONTHS)
+
+    houses = House.objects.filter(status='available')
+    transactions = Transaction.objects.filter(
+        deal_date__gte=min(month_starts[0], ninety_days_ago), deal_date__lte=today,
+    )
+    if district_id:
+        houses = houses.filter(district_id=district_id)
+        transactions = transactions.filter(house__district_id=district_id)
+
+    recent = Q(deal_date__gte=thirty_days_ago)
+    older = Q(deal_date__gte=ninety_days_ago, deal_date__lt=thirty_days_ago)
+    rows = transactions.order_by().annotate(month=TruncMonth('deal_date')).values('month').annotate(
+        count=Count('id'),
+        total=Sum('deal_price'),
+        recent_count=Count('id', filter=recent),
+        recent_total=Sum('deal_price', filter=recent),
+        older_count=Count('id', filter=older),
+        older_total=Sum('deal_price', filter=older),
+    )
+
+    index_of = {month: index for index, month in enumerate(month_starts)}
+    counts = np.zeros(HISTORY_MONTHS)
+    totals = np.zeros(HISTORY_MONTHS)
+    recent_count = older_count = 0
+    recent_total = older_total = 0.0
+    for row in rows:
+        recent_count += row['recent_count']
+        recent_total += float(row['recent_total'] or 0)
+        older_count += row['older_count']
+        older_total += float(row['older_total'] or 0)
+        month = row['month']
+        index = index_of.get(month.date() if hasattr(month, 'date') else month)
+        if index is not None:
+            counts[index] = row['count']
+            totals[index] = float(row['total'] or 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(counts > 0, totals / counts, np.nan)
+
+    return {
+        'supply_count': houses.count(),
+        'demand_count': recent_count,
+        'recent_avg': recent_total / recent_count if recent_count else None,
+        'older_avg': older_total / older_count if older_count else None,
+        'months': month_starts,
+        'counts': counts,
+        'averages': averages,
+    }
+
+
+def rolling_median(values, window):
+    """
+    尾对齐滚动中位数, 忽略缺失月份; 窗口内全部缺失时为 NaN
+    """
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    result = np.full(len(values), np.nan)
+    valid = ~np.all(np.isnan(windows), axis=1)
+    result[valid] = np.nanmedian(windows[valid], axis=1)
+    return result
+
+
+def fit_trend(averages, counts):
+    """
+    对平滑后的月度均价按成交量加权做线性拟合
+    返回 (平滑序列, 斜率(万元/月), 截距, 有成交的月份数); 数据不足时斜率为 None
+    """
+    smoothed = rolling_median(averages, SMOOTHING_WINDOW)
+    observed = ~np.isnan(averages)
+    month_count = int(observed.sum())
+    mask = observed & ~np.isnan(smoothed)
+    if month_count < MIN_MONTHS or mask.sum() < 2:
+        return smoothed, None, None, month_count
+    x = np.arange(len(averages), dtype=float)[mask]
+    weights = np.sqrt(counts[mask])
+    slope, intercept = np.polyfit(x, smoothed[mask], 1, w=weights)
+    return smoothed, float(slope), float(intercept), month_count
+
+
+def build_forecast(data):
+    """
+    根据原始数据计算供需、热度与价格趋势预测
+    """
+    supply_count = data['supply_count']
+    demand_count = data['demand_count']
+    supply_demand_ratio = supply_count / demand_count if demand_count > 0 else supply_count
+
+    if demand_count > 20:
+        transaction_activity, activity_level = '高', 'high'
+    elif demand_count > 10:
+        transaction_activity, activity_level = '中', 'medium'
+    else:
+        transaction_activity, activity_level = '低', 'low'
+
+    # 市场热度指数 (0-100), 基于供需比和成交活跃度
+    if supply_demand_ratio < 1:
+        heat_base = 80
+    elif supply_demand_ratio < 2:
+        heat_base = 60
+    elif supply_demand_ratio < 5:
+        heat_base = 40
+    else:
+        heat_base = 20
+    market_heat = min(heat_base + min(demand_count * 2, 20), 100)
+
+    recent_avg, older_avg = data['recent_avg'], data['older_avg']
+    price_change_percent = (recent_avg - older_avg) / older_avg * 100 if recent_avg and older_avg else 0
+
+    averages, counts = data['averages'], data['counts']
+    smoothed, slope, intercept, month_count = fit_trend(averages, counts)
+    if slope is None:
+        price_trend, trend_direction = '数据不足', 'unknown'
+        current_avg_price = forecast_next_month = forecast_change = 0
+    else:
+        # 以拟合线在本月的取值为当前水平, 外推一个月
+        current_month = len(averages) - 1
+        current_avg_price = intercept + slope * current_month
+        forecast_next_month = intercept + slope * (current_month + 1)
+        forecast_change = slope / current_avg_price * 100 if current_avg_price else 0
+        if forecast_change > TREND_THRESHOLD_PERCENT:
+            price_trend, trend_direction = '上涨', 'up'
+        elif forecast_change < -TREND_THRESHOLD_PERCENT:
+            price_trend, trend_direction = '下跌', 'down'
+        else:
+            price_trend, trend_direction = '平稳', 'stable'
+
+    if market_heat > 70 and trend_direction == 'up':
+        market_suggestion = '市场火热，价格上涨，建议及时把握投资机会'
+    elif market_heat > 70 and trend_direction == 'stable':
+        market_suggestion = '市场活跃但价格平稳，适合投资'
+    elif market_heat < 40 and trend_direction == 'down':
+        market_suggestion = '市场低迷，价格下跌，建议观望或寻找低价机会'
+    elif trend_direction == 'up':
+        market_suggestion = '价格上涨趋势，但市场活跃度一般'
+    elif trend_direction == 'down':
+        market_suggestion = '价格下跌，可关注潜在投资机会'
+    else:
+        market_suggestion = '市场平稳，可根据个人需求决策'
+
+    monthly_trend = [
+        {
+            'month': month.strftime('%Y-%m'),
+            'transaction_count': int(count),
+            'avg_price': None if np.isnan(avg) else round(float(avg), 2),
+            'smoothed_price': None if np.isnan(smooth) else round(float(smooth), 2),
+        }
+        for month, count, avg, smooth in zip(data['months'], counts, averages, smoothed)
+    ]
+
+    return {
+        'supply_demand_ratio': round(supply_demand_ratio, 2),
+        'supply_count': supply_count,
+        'demand_count': demand_count,
+        'market_heat': round(market_heat, 1),
+        'transaction_activity': transaction_activity,
+        'activity_level': activity_level,
+        'price_trend': price_trend,
+        'trend_direction': trend_direction,
+        'price_change_percent': round(price_change_percent, 2),
+        'current_avg_price': round(current_avg_price, 2),
+        'forecast_next_month': round(forecast_next_month, 2),
+        'forecast_change_percent': round(forecast_change, 2),
+        'market_suggestion': market_suggestion,
+        'model': {
+            'method': 'weighted_linear_trend',
+            'history_months': HISTORY_MONTHS,
+            'observed_months': month_count,
+            'smoothing_window': SMOOTHING_WINDOW,
+            'slope_per_month': round(slope, 4) if slope is not None else None,
+        },
+        'monthly_trend': monthly_trend,
+    }
+
+
+def forecast_cache_key(district_id, day):
+    versions = get_versions(CACHE_SCOPES)
+    version_part = '.'.join(f'{scope}{versions[scope]}' for scope in CACHE_SCOPES)
+    return f'analysis:market_forecast:{district_id or "all"}:{day.isoformat()}:{version_part}'
+
+
+def market_forecast(district_id=None, use_cache=True):
+    """
+    返回区域(为None时全市)的市场趋势预测, 同一区域每天只计算一次
+    """
+    today = timezone.localdate()
+    key = forecast_cache_key(district_id, today)
+    if use_cache:
+        result = cache.get(key)
+        if result is not None:
+            return result
+    result = build_forecast(load_market_data(district_id, today=today))
+    result['analysis_date'] = today.isoformat()
+    if use_cache:
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,124 @@
+"""
+在合成的多年成交数据上对比市场趋势预测的新旧实现
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.analysis.forecast import build_forecast, forecast_cache_key, load_market_data, market_forecast
+from apps.houses.models import District, House, Transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '生成合成的多年成交数据(事务内, 结束后回滚), 对比市场趋势预测新旧实现的查询数与耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--houses', type=int, default=2000, help='合成房源数（默认：2000）')
+        parser.add_argument('--transactions', type=int, default=50000, help='合成成交记录数（默认：50000）')
+        parser.add_argument('--years', type=int, default=3, help='成交记录覆盖年数（默认：3）')
+        parser.add_argument('--monthly-growth', type=float, default=0.5,
+                            help='合成价格的月涨幅百分比（默认：0.5）')
+        parser.add_argument('--repeat', type=int, default=5, help='每种实现重复次数, 取最快一次（默认：5）')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子（默认：42）')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                district = self._generate(options)
+                self._run(district, options)
+                cache.delete(forecast_cache_key(district.id, timezone.localdate()))
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('合成数据已回滚')
+
+    def _generate(self, options):
+        rng = random.Random(options['seed'])
+        district = District.objects.create(name=f'benchmark-{time.time_ns()}', city='benchmark')
+        houses = House.objects.bulk_create([
+            House(
+                title=f'benchmark-{index}', district=district, address='benchmark',
+                price=Decimal('300'), unit_price=Decimal('50000'), area=Decimal(rng.randint(40, 160)),
+                house_type='2室', floor='中层', total_floors=18, orientation='南',
+                status='available' if index % 3 else 'sold',
+            )
+            for index in range(options['houses'])
+        ], batch_size=1000)
+        houses = list(House.objects.filter(district=district).values_list('id', 'area'))
+
+        today = timezone.localdate()
+        days = options['years'] * 365
+        growth = options['monthly_growth'] / 100
+        rows = []
+        for _ in range(options['transactions']):
+            house_id, area = rng.choice(houses)
+            age_days = rng.randint(0, days)
+            level = 5.0 * (1 + growth) ** (-(age_days / 30.4))
+            price = float(area) * level * rng.uniform(0.85, 1.15)
+            rows.append(Transaction(
+                house_id=house_id, deal_price=Decimal(f'{price:.2f}'),
+                deal_date=today - timedelta(days=age_days),
+            ))
+        Transaction.objects.bulk_create(rows, batch_size=2000)
+        self.stdout.write(
+            f'已生成 {len(houses)} 套房源, {len(rows)} 条成交, 覆盖 {options["years"]} 年, '
+            f'月涨幅 {options["monthly_growth"]}%'
+        )
+        return district
+
+    def _run(self, district, options):
+        market_forecast(district.id)  # 预热按天缓存
+        for label, func in (
+            ('旧实现', self._legacy),
+            ('新实现', self._current),
+            ('新实现(日缓存命中)', market_forecast),
+        ):
+            best, queries, result = None, 0, None
+            for _ in range(max(1, options['repeat'])):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    result = func(district.id)
+                    elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+                queries = len(captured)
+            self.stdout.write(
+                f'{label}: {best * 1000:8.1f} ms, {queries} 次查询, 趋势 {result["price_trend"]}, '
+                f'预测月变化 {result["forecast_change_percent"]}%'
+            )
+
+    @staticmethod
+    def _current(district_id):
+        return build_forecast(load_market_data(district_id))
+
+    @staticmethod
+    def _legacy(district_id):
+        # 原实现的查询模式: 多次 count/exists/aggregate, 近30天对比前60天均价乘0.8外推
+        today = timezone.localdate()
+        thirty_days_ago = today - timedelta(days=30)
+        ninety_days_ago = today - timedelta(days=90)
+        available = House.objects.filter(status='available', district_id=district_id)
+        recent = Transaction.objects.filter(deal_date__gte=thirty_days_ago, house__district_id=district_id)
+        older = Transaction.objects.filter(
+            deal_date__gte=ninety_days_ago, deal_date__lt=thirty_days_ago, house__district_id=district_id,
+        )
+        available.count()
+        recent.count()
+        change = 0
+        if recent.exists() and older.exists():
+            recent_avg = recent.aggregate(avg=Avg('deal_price'))['avg']
+            older_avg = older.aggregate(avg=Avg('deal_price'))['avg']
+            change = (float(recent_avg) - float(older_avg)) / float(older_avg) * 100
+        forecast_change = change * 0.8 if abs(change) > 3 else 0
+        trend = '上涨' if change > 3 else '下跌' if change < -3 else '平稳'
+        return {'price_trend': trend, 'forecast_change_percent': round(forecast_change, 2)}
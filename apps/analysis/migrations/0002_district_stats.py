@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houses', '0004_house_geo_index'),
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('house_count', models.IntegerField(default=0, verbose_name='在售房源数')),
+                ('avg_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='平均价格(万元)')),
+                ('min_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='最低价格(万元)')),
+                ('max_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='最高价格(万元)')),
+                ('avg_unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='平均单价(元/平米)')),
+                ('recent_transaction_count', models.IntegerField(default=0, verbose_name='近30天成交数')),
+                ('district', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='houses.district', verbose_name='区域')),
+            ],
+            options={
+                'verbose_name': '区域统计',
+                'verbose_name_plural': '区域统计',
+                'db_table': 'district_stats',
+            },
+        ),
+    ]
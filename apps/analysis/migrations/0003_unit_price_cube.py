@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houses', '0004_house_geo_index'),
+        ('analysis', '0002_district_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitPriceCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('house_type', models.CharField(max_length=20, verbose_name='户型')),
+                ('month', models.DateField(verbose_name='成交月份')),
+                ('sample_count', models.IntegerField(default=0, verbose_name='样本数')),
+                ('p25_unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='单价25分位数(元/平米)')),
+                ('median_unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='单价中位数(元/平米)')),
+                ('p75_unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='单价75分位数(元/平米)')),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unit_price_cells', to='houses.district', verbose_name='区域')),
+            ],
+            options={
+                'verbose_name': '成交单价立方体',
+                'verbose_name_plural': '成交单价立方体',
+                'db_table': 'unit_price_cube',
+                'ordering': ['-month'],
+                'unique_together': {('district', 'house_type', 'month')},
+            },
+        ),
+    ]
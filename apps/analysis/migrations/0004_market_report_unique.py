@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_reports(apps, schema_editor):
+    """
+    旧任务每次执行都会新建报告, 添加唯一约束前每组只保留最新一份
+    """
+    MarketReport = apps.get_model('analysis', 'MarketReport')
+    duplicates = (
+        MarketReport.objects.order_by()
+        .values('district_id', 'report_type', 'report_date')
+        .annotate(latest_id=Max('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        MarketReport.objects.filter(
+            district_id=row['district_id'],
+            report_type=row['report_type'],
+            report_date=row['report_date'],
+        ).exclude(id=row['latest_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_unit_price_cube'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='marketreport',
+            constraint=models.UniqueConstraint(fields=('district', 'report_type', 'report_date'), name='market_report_district_type_date'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_city_reports(apps, schema_editor):
+    """
+    区域为空的全市报告不受 market_report_district_type_date 约束, 添加条件约束前每组只保留最新一份
+    """
+    MarketReport = apps.get_model('analysis', 'MarketReport')
+    city_reports = MarketReport.objects.filter(district__isnull=True)
+    duplicates = (
+        city_reports.order_by()
+        .values('report_type', 'report_date')
+        .annotate(latest_id=Max('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        city_reports.filter(
+            report_type=row['report_type'],
+            report_date=row['report_date'],
+        ).exclude(id=row['latest_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_market_report_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_city_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='marketreport',
+            constraint=models.UniqueConstraint(condition=models.Q(('district__isnull', True)), fields=('report_type', 'report_date'), name='market_report_city_type_date'),
+        ),
+    ]
@@ -1,9 +1,17 @@
 """
 数据分析模型
 """
-from django.db import models
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db import models, transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from apps.common.db import upsert_options
 from apps.common.models import BaseModel
-from apps.houses.models import District
+from apps.houses.models import District, House, Transaction
 
 
 class MarketReport(BaseModel):
@@ -16,6 +24,13 @@ class MarketReport(BaseModel):
         ('yearly', '年度报告'),
     ]
     
+    # 各报告类型的统计周期(天)与标题前缀
+    PERIOD_DAYS = {'monthly': 30, 'quarterly': 90, 'yearly': 365}
+    TITLE_PREFIXES = {'monthly': '月度', 'quarterly': '季度', 'yearly': '年度'}
+
+    # price_change_rate 字段可容纳的最大绝对值
+    MAX_CHANGE_RATE = 999.99
+
     title = models.CharField(max_length=200, verbose_name='报告标题')
     report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES, 
                                    default='monthly', verbose_name='报告类型')
@@ -45,7 +60,407 @@ class MarketReport(BaseModel):
         verbose_name = '市场报告'
         verbose_name_plural = verbose_name
         ordering = ['-report_date']
+        constraints = [
+            models.UniqueConstraint(fields=['district', 'report_type', 'report_date'],
+                                    name='market_report_district_type_date'),
+            # 唯一索引不约束 NULL, 全市报告(区域为空)需要单独的条件约束
+            models.UniqueConstraint(fields=['report_type', 'report_date'],
+                                    condition=Q(district__isnull=True),
+                                    name='market_report_city_type_date'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.report_date}"
 
+    @classmethod
+    def generate(cls, report_types=('monthly',), district_ids=None, include_city=True, report_date=None):
+        """
+        批量生成市场报告并写入, 返回报告列表
+        在售房源按区域分组查询一次, 成交记录按区域分组做一次条件聚合, 同时得到各报告类型
+        本期与上期的成交量和成交额; 全市数据与环比在内存中汇总, 查询数与区域数、报告类型数无关.
+        同一 (区域, 报告类型, 报告日期) 重复生成时替换旧报告.
+        参数:
+            report_types: 报告类型列表 (monthly/quarterly/yearly)
+            district_ids: 仅生成指定区域的报告, 为None时生成全部区域, 为空列表时不生成区域报告
+            include_city: 是否同时生成全市报告
+            report_date: 报告日期, 默认今天
+        """
+        unknown = set(report_types) - set(cls.PERIOD_DAYS)
+        if unknown:
+            raise ValueError(f"未知的报告类型: {', '.join(sorted(unknown))}")
+        report_types = [report_type for report_type in cls.PERIOD_DAYS if report_type in report_types]
+        report_date = report_date or timezone.now().date()
+        if not report_types:
+            return []
+
+        districts = District.objects.order_by('id')
+        houses = House.objects.filter(status='available')
+        earliest = report_date - timedelta(days=2 * max(cls.PERIOD_DAYS[t] for t in report_types))
+        transactions = Transaction.objects.filter(deal_date__gte=earliest, deal_date__lte=report_date)
+        if district_ids is not None:
+            districts = districts.filter(id__in=district_ids)
+            # 全市报告需要全部区域的数据
+            if not include_city:
+                houses = houses.filter(district_id__in=district_ids)
+                transactions = transactions.filter(house__district_id__in=district_ids)
+
+        house_stats = {
+            row['district_id']: row
+            for row in houses.order_by().values('district_id').annotate(
+                count=Count('id'),
+                price_total=Sum('price'),
+                unit_price_total=Sum('unit_price'),
+            )
+        }
+
+        columns = {}
+        for report_type in report_types:
+            start, previous_start = cls._period_starts(report_type, report_date)
+            current = Q(deal_date__gte=start)
+            previous = Q(deal_date__gte=previous_start, deal_date__lt=start)
+            columns[f'{report_type}_count'] = Count('id', filter=current)
+            columns[f'{report_type}_total'] = Sum('deal_price', filter=current)
+            columns[f'{report_type}_previous_count'] = Count('id', filter=previous)
+            columns[f'{report_type}_previous_total'] = Sum('deal_price', filter=previous)
+        transaction_stats = {
+            row['house__district_id']: row
+            for row in transactions.order_by().values('house__district_id').annotate(**columns)
+        }
+
+        scopes = [(district, house_stats.get(district.id, {}), transaction_stats.get(district.id, {}))
+                  for district in districts]
+        if include_city:
+            scopes.append((None, cls._sum_rows(house_stats.values()),
+                           cls._sum_rows(transaction_stats.values())))
+
+        reports = [
+            cls._build_report(report_type, district, houses_row, transactions_row, report_date)
+            for district, houses_row, transactions_row in scopes
+            for report_type in report_types
+        ]
+
+        stale = Q(district_id__in=[district.id for district, _, _ in scopes if district is not None])
+        if include_city:
+            stale |= Q(district__isnull=True)
+        with transaction.atomic():
+            cls.objects.filter(stale, report_date=report_date, report_type__in=report_types).delete()
+            cls.objects.bulk_create(reports, batch_size=500)
+        return reports
+
+    @classmethod
+    def _period_starts(cls, report_type, report_date):
+        """
+        返回 (本期起始日, 上期起始日); 本期为 [起始日, 报告日期], 上期为 [上期起始日, 本期起始日)
+        """
+        days = timedelta(days=cls.PERIOD_DAYS[report_type])
+        return report_date - days, report_date - 2 * days
+
+    @staticmethod
+    def _sum_rows(rows):
+        totals = {}
+        for row in rows:
+            for key, value in row.items():
+                if key.endswith('district_id') or value is None:
+                    continue
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    @classmethod
+    def _build_report(cls, report_type, district, houses_row, transactions_row, report_date):
+        listing_count = houses_row.get('count') or 0
+        avg_price = houses_row['price_total'] / listing_count if listing_count else 0
+        avg_unit_price = houses_row['unit_price_total'] / listing_count if listing_count else 0
+
+        transaction_count = transactions_row.get(f'{report_type}_count') or 0
+        previous_count = transactions_row.get(f'{report_type}_previous_count') or 0
+        current_avg = (transactions_row[f'{report_type}_total'] / transaction_count
+                       if transaction_count else 0)
+        previous_avg = (transactions_row[f'{report_type}_previous_total'] / previous_count
+                        if previous_count else 0)
+
+        # 价格变化率(与上期对比)
+        if previous_avg > 0:
+            price_change_rate = (current_avg - previous_avg) / previous_avg * 100
+        else:
+            price_change_rate = 0
+        price_change_rate = max(-cls.MAX_CHANGE_RATE, min(cls.MAX_CHANGE_RATE, round(float(price_change_rate), 2)))
+
+        title_prefix = cls.TITLE_PREFIXES[report_type]
+        title = f"{district.name if district else '全市'}{title_prefix}市场报告"
+        summary = f"本期平均价格{avg_price:.2f}万元，" \
+                  f"平均单价{avg_unit_price:.2f}元/平米，" \
+                  f"在售房源{listing_count}套，" \
+                  f"成交{transaction_count}套，" \
+                  f"价格{'上涨' if price_change_rate > 0 else '下降'}{abs(price_change_rate):.2f}%"
+        start_date, _ = cls._period_starts(report_type, report_date)
+
+        return cls(
+            title=title,
+            report_type=report_type,
+            district=district,
+            report_date=report_date,
+            avg_price=round(avg_price, 2),
+            avg_unit_price=round(avg_unit_price, 2),
+            total_listings=listing_count,
+            total_transactions=transaction_count,
+            price_change_rate=price_change_rate,
+            summary=summary,
+            content=f"报告时间范围: {start_date} 至 {report_date}",
+        )
+
+
+
+class DistrictStats(BaseModel):
+    """
+    区域统计汇总表
+
+    由 refresh() 通过两条分组查询整体重算, 分析接口直接读取本表,
+    不再逐区域执行聚合查询.
+    """
+    RECENT_TRANSACTION_DAYS = 30
+
+    district = models.OneToOneField(District, on_delete=models.CASCADE,
+                                    related_name='stats', verbose_name='区域')
+    house_count = models.IntegerField(default=0, verbose_name='在售房源数')
+    avg_price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                    verbose_name='平均价格(万元)')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                    verbose_name='最低价格(万元)')
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                    verbose_name='最高价格(万元)')
+    avg_unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                         verbose_name='平均单价(元/平米)')
+    recent_transaction_count = models.IntegerField(default=0, verbose_name='近30天成交数')
+
+    class Meta:
+        db_table = 'district_stats'
+        verbose_name = '区域统计'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f"{self.district.name} - {self.house_count}套"
+
+    @classmethod
+    def refresh(cls, district_ids=None):
+        """
+        重算区域统计并批量写入, 返回写入的区域数
+        参数:
+            district_ids: 仅刷新指定区域, 为None时刷新全部区域
+        """
+        rows = cls.aggregate(district_ids=district_ids)
+        cls.objects.bulk_create(rows, batch_size=500, **upsert_options(
+            cls,
+            unique_fields=['district'],
+            update_fields=['house_count', 'avg_price', 'min_price', 'max_price',
+                           'avg_unit_price', 'recent_transaction_count', 'updated_at'],
+        ))
+        return len(rows)
+
+    @classmethod
+    def aggregate(cls, district_ids=None, city=None):
+        """
+        实时计算区域统计, 返回未保存的统计对象列表(已关联区域)
+        房源按区域、近期成交按 house__district 各分组查询一次, 在内存中合并, 查询数与区域数无关
+        参数:
+            district_ids: 仅计算指定区域
+            city: 仅计算该城市的区域
+        """
+        districts = District.objects.order_by('id')
+        houses = House.objects.filter(status='available')
+        since = timezone.now().date() - timedelta(days=cls.RECENT_TRANSACTION_DAYS)
+        transactions = Transaction.objects.filter(deal_date__gte=since)
+        if district_ids is not None:
+            districts = districts.filter(id__in=district_ids)
+            houses = houses.filter(district_id__in=district_ids)
+            transactions = transactions.filter(house__district_id__in=district_ids)
+        if city:
+            districts = districts.filter(city=city)
+            houses = houses.filter(district__city=city)
+            transactions = transactions.filter(house__district__city=city)
+
+        house_stats = {
+            row['district_id']: row
+            for row in houses.order_by().values('district_id').annotate(
+                count=Count('id'),
+                avg_price=Avg('price'),
+                min_price=Min('price'),
+                max_price=Max('price'),
+                avg_unit_price=Avg('unit_price'),
+            )
+        }
+        transaction_counts = dict(
+            transactions.order_by().values_list('house__district_id').annotate(count=Count('id'))
+        )
+
+        rows = []
+        for district in districts:
+            stats = house_stats.get(district.id, {})
+            rows.append(cls(
+                district=district,
+                house_count=stats.get('count') or 0,
+                avg_price=round(stats.get('avg_price') or 0, 2),
+                min_price=stats.get('min_price') or 0,
+                max_price=stats.get('max_price') or 0,
+                avg_unit_price=round(stats.get('avg_unit_price') or 0, 2),
+                recent_transaction_count=transaction_counts.get(district.id, 0),
+            ))
+        return rows
+
+    @classmethod
+    def current(cls):
+        """
+        返回统计查询集, 表为空时(如首次部署)先同步刷新一次
+        """
+        if not cls.objects.exists():
+            cls.refresh()
+        return cls.objects.select_related('district')
+
+
+class UnitPriceCube(BaseModel):
+    """
+    成交单价分位数立方体, 维度为 (区域, 户型, 成交月份)
+
+    每个单元保存该月成交单价的样本数与 25/50/75 分位数.
+    新增成交记录时通过信号只重算其所在单元, rebuild() 用于全量重建.
+    """
+    UPDATE_FIELDS = ['sample_count', 'p25_unit_price', 'median_unit_price',
+                     'p75_unit_price', 'updated_at']
+
+    district = models.ForeignKey(District, on_delete=models.CASCADE,
+                                 related_name='unit_price_cells', verbose_name='区域')
+    house_type = models.CharField(max_length=20, verbose_name='户型')
+    month = models.DateField(verbose_name='成交月份')
+    sample_count = models.IntegerField(default=0, verbose_name='样本数')
+    p25_unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                         verbose_name='单价25分位数(元/平米)')
+    median_unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                            verbose_name='单价中位数(元/平米)')
+    p75_unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                         verbose_name='单价75分位数(元/平米)')
+
+    class Meta:
+        db_table = 'unit_price_cube'
+        verbose_name = '成交单价立方体'
+        verbose_name_plural = verbose_name
+        unique_together = ['district', 'house_type', 'month']
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.district_id}-{self.house_type}-{self.month:%Y-%m}"
+
+    @staticmethod
+    def month_of(day):
+        return day.replace(day=1)
+
+    @staticmethod
+    def _transaction_rows(transactions):
+        return transactions.filter(house__area__gt=0).values_list(
+            'house__district_id', 'house__house_type', 'deal_date', 'deal_price', 'house__area'
+        )
+
+    @classmethod
+    def _build_cells(cls, rows):
+        df = pd.DataFrame.from_records(
+            list(rows), columns=['district_id', 'house_type', 'deal_date', 'deal_price', 'area']
+        )
+        if df.empty:
+            return []
+
+        df['unit_price'] = df['deal_price'].astype(float) * 10000 / df['area'].astype(float)
+        df['month'] = pd.to_datetime(df['deal_date']).dt.to_period('M').dt.start_time.dt.date
+
+        grouped = df.groupby(['district_id', 'house_type', 'month'])['unit_price']
+        quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+        counts = grouped.size()
+
+        cells = []
+        for (district_id, house_type, month), row in quantiles.iterrows():
+            cells.append(cls(
+                district_id=district_id,
+                house_type=house_type,
+                month=month,
+                sample_count=int(counts.loc[(district_id, house_type, month)]),
+                p25_unit_price=round(row[0.25], 2),
+                median_unit_price=round(row[0.5], 2),
+                p75_unit_price=round(row[0.75], 2),
+            ))
+        return cells
+
+    @classmethod
+    def _save_cells(cls, cells):
+        cls.objects.bulk_create(cells, batch_size=500, **upsert_options(
+            cls, unique_fields=['district', 'house_type', 'month'], update_fields=cls.UPDATE_FIELDS,
+        ))
+
+    @classmethod
+    def refresh_cell(cls, district_id, house_type, month):
+        """
+        重算单个单元, 成交记录新增/删除时调用
+        """
+        month = cls.month_of(month)
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        rows = cls._transaction_rows(Transaction.objects.filter(
+            house__district_id=district_id,
+            house__house_type=house_type,
+            deal_date__gte=month,
+            deal_date__lt=next_month,
+        ))
+        cells = cls._build_cells(rows)
+        if cells:
+            cls._save_cells(cells)
+        else:
+            cls.objects.filter(district_id=district_id, house_type=house_type, month=month).delete()
+
+    @classmethod
+    def rebuild(cls, since=None):
+        """
+        全量重建立方体, 返回写入的单元数
+        参数:
+            since: 仅重建该日期所在月份及之后的单元, 为None时重建全部
+        """
+        transactions = Transaction.objects.all()
+        stale = cls.objects.all()
+        if since is not None:
+            since = cls.month_of(since)
+            transactions = transactions.filter(deal_date__gte=since)
+            stale = stale.filter(month__gte=since)
+
+        cells = cls._build_cells(cls._transaction_rows(transactions))
+        # 删除与写入在同一事务内完成, 重建期间查询仍能读到旧单元
+        with transaction.atomic():
+            stale.delete()
+            cls._save_cells(cells)
+        return len(cells)
+
+    @classmethod
+    def lookup(cls, keys, since):
+        """
+        批量查询 (区域, 户型) 自 since 所在月份起的单元, 一次查询返回
+        {(district_id, house_type): (中位数单价, 样本数)}
+
+        多个月份的中位数按样本数加权合并, 作为窗口期中位数的近似值.
+        """
+        keys = {(int(district_id), house_type) for district_id, house_type in keys}
+        if not keys:
+            return {}
+
+        cells = cls.objects.filter(
+            district_id__in={district_id for district_id, _ in keys},
+            house_type__in={house_type for _, house_type in keys},
+            month__gte=cls.month_of(since),
+        ).values_list('district_id', 'house_type', 'median_unit_price', 'sample_count')
+
+        grouped = {}
+        for district_id, house_type, median, count in cells:
+            if (district_id, house_type) in keys and count:
+                grouped.setdefault((district_id, house_type), []).append((float(median), count))
+
+        result = {}
+        for key, values in grouped.items():
+            medians = np.array([median for median, _ in values])
+            weights = np.array([count for _, count in values])
+            order = np.argsort(medians)
+            cumulative = np.cumsum(weights[order])
+            index = np.searchsorted(cumulative, cumulative[-1] / 2)
+            result[key] = (float(medians[order][index]), int(weights.sum()))
+        return result
@@ -0,0 +1,121 @@
+"""
+数据分析信号处理
+"""
+import threading
+
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.houses.models import House, Transaction
+from .models import UnitPriceCube
+
+
+class _PendingCells(threading.local):
+    """
+    当前事务内受影响的单价单元, 提交后每个单元只重算一次
+    """
+
+    def __init__(self):
+        # (区域, 户型, 月份)
+        self.cells = set()
+        # 只知道房源ID的 (房源, 月份), 提交时一次查询解析区域与户型
+        self.house_months = set()
+        # 本事务内已删除房源的 (区域, 户型), 提交时已无法查询
+        self.deleted_houses = {}
+
+
+_pending = _PendingCells()
+
+
+def _schedule():
+    # 每次都登记回调: 事务回滚会丢弃已登记的回调, 仅按是否已有待处理单元判断会漏算.
+    # 首个回调已处理全部单元, 其余回调为空操作
+    transaction.on_commit(refresh_pending_cells)
+
+
+def refresh_pending_cells():
+    cells, _pending.cells = _pending.cells, set()
+    house_months, _pending.house_months = _pending.house_months, set()
+    house_keys, _pending.deleted_houses = _pending.deleted_houses, {}
+
+    missing = {house_id for house_id, _ in house_months if house_id not in house_keys}
+    if missing:
+        house_keys.update(
+            (pk, (district_id, house_type)) for pk, district_id, house_type in
+            House.objects.filter(pk__in=missing).values_list('pk', 'district_id', 'house_type')
+        )
+    for house_id, month in house_months:
+        if house_id in house_keys:
+            cells.add((*house_keys[house_id], month))
+
+    for district_id, house_type, month in sorted(cells):
+        UnitPriceCube.refresh_cell(district_id, house_type, month)
+
+
+@receiver(post_save, sender=Transaction)
+def refresh_unit_price_cell_on_save(sender, instance, created, **kwargs):
+    """
+    成交记录新增或修改时重算其所在的 (区域, 户型, 月份) 单价单元;
+    房源或成交日期变化时原单元一并重算
+    """
+    _pending.house_months.add((instance.house_id, UnitPriceCube.month_of(instance.deal_date)))
+    loaded_house_id = getattr(instance, '_loaded_house_id', None)
+    loaded_deal_date = getattr(instance, '_loaded_deal_date', None)
+    if not created and loaded_house_id is not None and loaded_deal_date is not None and (
+            (loaded_house_id, loaded_deal_date) != (instance.house_id, instance.deal_date)):
+        _pending.house_months.add((loaded_house_id, UnitPriceCube.month_of(loaded_deal_date)))
+    instance._loaded_house_id = instance.house_id
+    instance._loaded_deal_date = instance.deal_date
+    _schedule()
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_unit_price_cell_on_delete(sender, instance, **kwargs):
+    """
+    成交记录删除时只登记房源与月份, 不逐行查询或重算
+    """
+    _pending.house_months.add((instance.house_id, UnitPriceCube.month_of(instance.deal_date)))
+    _schedule()
+
+
+@receiver(post_save, sender=House)
+def move_unit_price_cells(sender, instance, created, **kwargs):
+    """
+    房源区域或户型变化时, 其成交记录所在的新旧单元都需要重算
+    """
+    if created or not instance.unit_price_key_changed():
+        return
+    old_key = (instance._loaded_district_id, instance._loaded_house_type)
+    instance._loaded_district_id = instance.district_id
+    instance._loaded_house_type = instance.house_type
+    schedule_moved_houses({instance.pk: old_key})
+
+
+def schedule_moved_houses(old_keys):
+    """
+    登记区域或户型已变化的房源 {房源ID: (原区域, 原户型)}, 提交后重算其成交所在的新旧单元.
+    bulk_update 不发送 post_save, 批量改写房源的调用方需直接调用
+    """
+    if not old_keys:
+        return
+    house_months = Transaction.objects.filter(house_id__in=list(old_keys)).annotate(
+        month=TruncMonth('deal_date')
+    ).order_by().values_list('house_id', 'month').distinct()
+    scheduled = False
+    for house_id, month in house_months:
+        _pending.cells.add((*old_keys[house_id], month))
+        _pending.house_months.add((house_id, month))
+        scheduled = True
+    if scheduled:
+        _schedule()
+
+
+@receiver(post_delete, sender=House)
+def remember_deleted_house(sender, instance, **kwargs):
+    """
+    级联删除房源时其成交记录先于房源删除, 记下区域与户型供提交时解析
+    """
+    _pending.deleted_houses[instance.pk] = (instance.district_id, instance.house_type)
+    _schedule()
@@ -0,0 +1,35 @@
+"""
+市场报告测试
+"""
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from apps.houses.models import District
+from .models import MarketReport
+
+
+class MarketReportUniqueTests(TestCase):
+    """
+    同一 (区域, 报告类型, 报告日期) 只保留一份报告, 全市报告同样适用
+    """
+
+    report_date = date(2026, 10, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.district = District.objects.create(name='报告测试区')
+
+    def test_regenerating_replaces_reports(self):
+        MarketReport.generate(report_date=self.report_date)
+        MarketReport.generate(report_date=self.report_date)
+        self.assertEqual(MarketReport.objects.filter(district=self.district).count(), 1)
+        self.assertEqual(MarketReport.objects.filter(district__isnull=True).count(), 1)
+
+    def test_duplicate_city_report_is_rejected(self):
+        report = MarketReport.generate(district_ids=[], report_date=self.report_date)[0]
+        self.assertIsNone(report.district_id)
+        report.pk = None
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            report.save()
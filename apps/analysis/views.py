@@ -4,18 +4,47 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Avg, Count, Max, Min, Q
+from django.http import HttpResponse
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Q
+from django.db.models.functions import NullIf, TruncMonth
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
+import math
 
-from .models import MarketReport
+from .models import MarketReport, DistrictStats, UnitPriceCube
+from .forecast import market_forecast
 from .serializers import MarketReportSerializer
-from apps.houses.models import House, Transaction, District
+from apps.houses.models import House, Transaction
 from apps.common.response import success_response, error_response
+from apps.common.cache import cache_response, response_cache_stats
+from apps.common.profiling import profiling_stats, prometheus_text
 from apps.common.permissions import IsAgentOrAdmin
 
 
+# 价格区间分布默认边界(万元)
+DEFAULT_PRICE_BINS = [100, 200, 300, 500, 1000]
+
+# 统计接口缓存依赖的数据范围
+ANALYSIS_CACHE_SCOPES = ('house', 'transaction', 'district')
+
+# 批量房价预测单次最多条目数
+MAX_BATCH_PREDICTIONS = 500
+
+
+def _format_price(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def build_price_ranges(edges):
+    """
+    根据区间边界生成 (最小值, 最大值, 标签) 列表, 首尾为开区间
+    """
+    ranges = [(0, edges[0], f'{_format_price(edges[0])}万以下')]
+    for low, high in zip(edges, edges[1:]):
+        ranges.append((low, high, f'{_format_price(low)}-{_format_price(high)}万'))
+    ranges.append((edges[-1], float('inf'), f'{_format_price(edges[-1])}万以上'))
+    return ranges
+
+
 class AnalysisViewSet(viewsets.ViewSet):
     """
     数据分析视图集
@@ -23,6 +52,7 @@ class AnalysisViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.price_trend', ttl=600, scopes=ANALYSIS_CACHE_SCOPES)
     def price_trend(self, request):
         """
         价格趋势分析
@@ -40,50 +70,51 @@ class AnalysisViewSet(viewsets.ViewSet):
         transactions = Transaction.objects.filter(
             deal_date__gte=start_date,
             deal_date__lte=end_date
-        ).select_related('house', 'house__district')
+        )
         
         if district_id:
             transactions = transactions.filter(house__district_id=district_id)
         
-        # 转换为DataFrame进行分析
-        if not transactions.exists():
-            return success_response(data={'trend': [], 'summary': {}})
-        
-        data = []
-        for t in transactions:
-            data.append({
-                'date': t.deal_date,
-                'price': float(t.deal_price),
-                'area': float(t.house.area),
-                'unit_price': float(t.deal_price * 10000 / t.house.area)
-            })
+        # 单笔成交单价(元/平米), 面积为0时置空不参与平均
+        unit_price = ExpressionWrapper(
+            F('deal_price') * 10000 / NullIf(F('house__area'), 0),
+            output_field=FloatField()
+        )
         
-        df = pd.DataFrame(data)
+        # 总体统计与按月分组统计均在数据库中完成
+        summary_stats = transactions.aggregate(
+            avg_price=Avg('deal_price'),
+            max_price=Max('deal_price'),
+            min_price=Min('deal_price'),
+            avg_unit_price=Avg(unit_price),
+            total=Count('id')
+        )
+        if not summary_stats['total']:
+            return success_response(data={'trend': [], 'summary': {}})
         
-        # 按月分组统计
-        df['month'] = pd.to_datetime(df['date']).dt.to_period('M')
-        monthly_stats = df.groupby('month').agg({
-            'price': 'mean',
-            'unit_price': 'mean',
-            'date': 'count'
-        }).reset_index()
+        monthly_stats = transactions.annotate(
+            month=TruncMonth('deal_date')
+        ).values('month').annotate(
+            avg_price=Avg('deal_price'),
+            avg_unit_price=Avg(unit_price),
+            transaction_count=Count('id')
+        ).order_by('month')
         
         trend_data = []
-        for _, row in monthly_stats.iterrows():
+        for row in monthly_stats:
             trend_data.append({
-                'month': str(row['month']),
-                'avg_price': round(row['price'], 2),
-                'avg_unit_price': round(row['unit_price'], 2),
-                'transaction_count': int(row['date'])
+                'month': row['month'].strftime('%Y-%m'),
+                'avg_price': round(float(row['avg_price'] or 0), 2),
+                'avg_unit_price': round(float(row['avg_unit_price'] or 0), 2),
+                'transaction_count': row['transaction_count']
             })
         
-        # 计算总体统计
         summary = {
-            'avg_price': round(df['price'].mean(), 2),
-            'max_price': round(df['price'].max(), 2),
-            'min_price': round(df['price'].min(), 2),
-            'avg_unit_price': round(df['unit_price'].mean(), 2),
-            'total_transactions': len(df)
+            'avg_price': round(float(summary_stats['avg_price']), 2),
+            'max_price': round(float(summary_stats['max_price']), 2),
+            'min_price': round(float(summary_stats['min_price']), 2),
+            'avg_unit_price': round(float(summary_stats['avg_unit_price'] or 0), 2),
+            'total_transactions': summary_stats['total']
         }
         
         return success_response(data={
@@ -92,40 +123,26 @@ class AnalysisViewSet(viewsets.ViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.district_comparison', ttl=300, scopes=('district_stats',))
     def district_comparison(self, request):
         """
         区域对比分析
         GET /api/analysis/district_comparison/
         """
-        # 获取所有区域的统计数据
-        districts = District.objects.all()
+        # 读取区域统计汇总表, 仅包含有在售房源的区域
+        district_stats = DistrictStats.current().filter(house_count__gt=0)
         
         comparison_data = []
-        for district in districts:
-            # 在售房源统计
-            available_houses = House.objects.filter(
-                district=district,
-                status='available'
-            )
-            
-            if available_houses.exists():
-                stats = available_houses.aggregate(
-                    avg_price=Avg('price'),
-                    avg_unit_price=Avg('unit_price'),
-                    min_price=Min('price'),
-                    max_price=Max('price'),
-                    count=Count('id')
-                )
-                
-                comparison_data.append({
-                    'district_id': district.id,
-                    'district_name': district.name,
-                    'avg_price': round(float(stats['avg_price'] or 0), 2),
-                    'avg_unit_price': round(float(stats['avg_unit_price'] or 0), 2),
-                    'min_price': round(float(stats['min_price'] or 0), 2),
-                    'max_price': round(float(stats['max_price'] or 0), 2),
-                    'house_count': stats['count']
-                })
+        for stats in district_stats:
+            comparison_data.append({
+                'district_id': stats.district_id,
+                'district_name': stats.district.name,
+                'avg_price': round(float(stats.avg_price), 2),
+                'avg_unit_price': round(float(stats.avg_unit_price), 2),
+                'min_price': round(float(stats.min_price), 2),
+                'max_price': round(float(stats.max_price), 2),
+                'house_count': stats.house_count
+            })
         
         # 按平均价格排序
         comparison_data.sort(key=lambda x: x['avg_price'], reverse=True)
@@ -133,6 +150,7 @@ class AnalysisViewSet(viewsets.ViewSet):
         return success_response(data=comparison_data)
     
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.house_type_distribution', ttl=300, scopes=ANALYSIS_CACHE_SCOPES)
     def house_type_distribution(self, request):
         """
         户型分布统计
@@ -168,11 +186,12 @@ class AnalysisViewSet(viewsets.ViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.price_range_distribution', ttl=300, scopes=ANALYSIS_CACHE_SCOPES)
     def price_range_distribution(self, request):
         """
         价格区间分布
         GET /api/analysis/price_range_distribution/
-        参数: district_id (可选)
+        参数: district_id (可选), bins (可选, 区间边界, 单位万元, 如 100,200,300,500,1000)
         """
         district_id = request.query_params.get('district_id')
         
@@ -180,25 +199,36 @@ class AnalysisViewSet(viewsets.ViewSet):
         if district_id:
             queryset = queryset.filter(district_id=district_id)
         
+        # 解析区间边界
+        bins = request.query_params.get('bins')
+        if bins:
+            try:
+                edges = [float(edge) for edge in bins.split(',') if edge.strip()]
+            except ValueError:
+                return error_response(msg='bins 必须是以逗号分隔的数字')
+            if (not edges or not all(map(math.isfinite, edges)) or edges[0] <= 0 or
+                    any(b <= a for a, b in zip(edges, edges[1:]))):
+                return error_response(msg='bins 必须是递增的正数')
+        else:
+            edges = DEFAULT_PRICE_BINS
+        
         # 定义价格区间
-        price_ranges = [
-            (0, 100, '100万以下'),
-            (100, 200, '100-200万'),
-            (200, 300, '200-300万'),
-            (300, 500, '300-500万'),
-            (500, 1000, '500-1000万'),
-            (1000, float('inf'), '1000万以上')
-        ]
+        price_ranges = build_price_ranges(edges)
+        
+        # 条件聚合: 一次扫描同时得到各区间数量与总数
+        aggregates = {'total': Count('id')}
+        for index, (min_price, max_price, label) in enumerate(price_ranges):
+            condition = Q(price__gte=min_price)
+            if max_price != float('inf'):
+                condition &= Q(price__lt=max_price)
+            aggregates[f'range_{index}'] = Count('id', filter=condition)
+        counts = queryset.aggregate(**aggregates)
         
         distribution_data = []
-        total_count = queryset.count()
+        total_count = counts['total']
         
-        for min_price, max_price, label in price_ranges:
-            if max_price == float('inf'):
-                count = queryset.filter(price__gte=min_price).count()
-            else:
-                count = queryset.filter(price__gte=min_price, price__lt=max_price).count()
-            
+        for index, (min_price, max_price, label) in enumerate(price_ranges):
+            count = counts[f'range_{index}']
             distribution_data.append({
                 'range': label,
                 'count': count,
@@ -220,7 +250,7 @@ class AnalysisViewSet(viewsets.ViewSet):
         预测公式: P = A × M(r,t)
         P: 预测总价
         A: 目标房源面积
-        M(r,t): 近6个月同区域r、同户型t的成交单价中位数
+        M(r,t): 近6个月同区域r、同户型t的成交单价中位数, 读取自 UnitPriceCube
         """
         district_id = request.data.get('district_id')
         house_type = request.data.get('house_type')
@@ -230,29 +260,89 @@ class AnalysisViewSet(viewsets.ViewSet):
             return error_response(msg='缺少必要参数')
         
         try:
-            area = float(area)
-        except ValueError:
-            return error_response(msg='面积必须是数字')
+            district_id, house_type, area = self._parse_prediction_input(district_id, house_type, area)
+        except ValueError as exc:
+            return error_response(msg=str(exc))
         
-        # 获取近6个月的成交记录
-        six_months_ago = datetime.now().date() - timedelta(days=180)
-        transactions = Transaction.objects.filter(
-            house__district_id=district_id,
-            house__house_type=house_type,
-            deal_date__gte=six_months_ago
-        ).select_related('house')
-        
-        if not transactions.exists():
+        medians = UnitPriceCube.lookup([(district_id, house_type)], since=self._prediction_since())
+        if (district_id, house_type) not in medians:
             return error_response(msg='暂无足够的历史数据进行预测')
         
-        # 计算单价中位数
-        unit_prices = []
-        for t in transactions:
-            unit_price = float(t.deal_price * 10000 / t.house.area)
-            unit_prices.append(unit_price)
+        median_unit_price, sample_count = medians[(district_id, house_type)]
+        return success_response(data=self._build_prediction(area, median_unit_price, sample_count))
+    
+    @action(detail=False, methods=['post'], url_path='predict_price/batch')
+    def predict_price_batch(self, request):
+        """
+        批量房价预测
+        POST /api/analysis/predict_price/batch/
+        Body: {"items": [{"district_id": 1, "house_type": "2室", "area": 80}, ...]}
         
-        median_unit_price = np.median(unit_prices)
+        所有候选房源共用一次单价立方体查询, 无历史数据的条目返回 error 字段
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return error_response(msg='缺少必要参数: items')
+        if len(items) > MAX_BATCH_PREDICTIONS:
+            return error_response(msg=f'单次最多预测 {MAX_BATCH_PREDICTIONS} 套房源')
+        
+        # 每项为 (区域ID, 户型, 面积) 或校验失败的提示信息
+        parsed = []
+        for item in items:
+            try:
+                parsed.append(self._parse_prediction_input(item['district_id'], item['house_type'], item['area']))
+            except ValueError as exc:
+                parsed.append(str(exc))
+            except (TypeError, KeyError):
+                parsed.append('参数缺失或格式错误')
+        
+        medians = UnitPriceCube.lookup(
+            [item[:2] for item in parsed if isinstance(item, tuple)],
+            since=self._prediction_since()
+        )
         
+        results = []
+        for item, parsed_item in zip(items, parsed):
+            if isinstance(parsed_item, str):
+                results.append({'input': item, 'error': parsed_item})
+                continue
+            district_id, house_type, area = parsed_item
+            if (district_id, house_type) not in medians:
+                results.append({'input': item, 'error': '暂无足够的历史数据进行预测'})
+                continue
+            median_unit_price, sample_count = medians[(district_id, house_type)]
+            prediction = self._build_prediction(area, median_unit_price, sample_count)
+            prediction.update({'district_id': district_id, 'house_type': house_type})
+            results.append(prediction)
+        
+        return success_response(data={'results': results, 'count': len(results)})
+    
+    @staticmethod
+    def _parse_prediction_input(district_id, house_type, area):
+        """
+        校验预测参数, 返回 (区域ID, 户型, 面积), 不合法时抛出带提示信息的 ValueError
+        """
+        try:
+            district_id = int(district_id)
+        except (TypeError, ValueError):
+            raise ValueError('district_id 必须是整数')
+        if not isinstance(house_type, str) or not house_type.strip():
+            raise ValueError('house_type 必须是非空字符串')
+        try:
+            area = float(area)
+        except (TypeError, ValueError):
+            raise ValueError('面积必须是数字')
+        if not math.isfinite(area) or area <= 0:
+            raise ValueError('面积必须是大于0的数字')
+        return district_id, house_type, area
+    
+    @staticmethod
+    def _prediction_since():
+        # 近6个月的成交记录
+        return datetime.now().date() - timedelta(days=180)
+    
+    @staticmethod
+    def _build_prediction(area, median_unit_price, sample_count):
         # 预测总价
         predicted_price = (area * median_unit_price) / 10000
         
@@ -260,53 +350,36 @@ class AnalysisViewSet(viewsets.ViewSet):
         price_range_min = predicted_price * 0.9
         price_range_max = predicted_price * 1.1
         
-        return success_response(data={
+        return {
             'predicted_price': round(predicted_price, 2),
             'price_range': {
                 'min': round(price_range_min, 2),
                 'max': round(price_range_max, 2)
             },
             'median_unit_price': round(median_unit_price, 2),
-            'sample_count': len(unit_prices),
+            'sample_count': sample_count,
             'area': area
-        })
-
+        }
 
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.district_heat_map', ttl=60, scopes=ANALYSIS_CACHE_SCOPES)
     def district_heat_map(self, request):
         """
         区域热度图数据
         GET /api/analysis/district_heat_map/
+        参数: city (可选, 仅统计该城市的区域)
         
         返回各区域的热度指数（基于房源数量、平均价格、成交活跃度）
         """
-        from datetime import datetime, timedelta
-        
-        # 获取所有区域
-        districts = District.objects.all()
-        
         heat_map_data = []
         max_heat = 0
         
-        for district in districts:
-            # 在售房源数
-            available_count = House.objects.filter(
-                district=district,
-                status='available'
-            ).count()
-            
-            # 近30天成交数
-            thirty_days_ago = datetime.now().date() - timedelta(days=30)
-            transaction_count = Transaction.objects.filter(
-                house__district=district,
-                deal_date__gte=thirty_days_ago
-            ).count()
-            
-            # 平均价格
-            avg_price = House.objects.filter(
-                district=district,
-                status='available'
-            ).aggregate(avg_price=Avg('price'))['avg_price'] or 0
+        # 实时分组聚合, 查询数固定; 响应缓存保证短时间内重复请求不再访问数据库
+        city = request.query_params.get('city') or None
+        for stats in DistrictStats.aggregate(city=city):
+            available_count = stats.house_count
+            transaction_count = stats.recent_transaction_count
+            avg_price = stats.avg_price
             
             # 计算热度指数
             # 热度 = (在售房源数 × 0.3) + (成交数 × 5) + (平均价格/50 × 0.2)
@@ -316,8 +389,8 @@ class AnalysisViewSet(viewsets.ViewSet):
                 max_heat = heat_index
             
             heat_map_data.append({
-                'district_id': district.id,
-                'district_name': district.name,
+                'district_id': stats.district_id,
+                'district_name': stats.district.name,
                 'heat_index': round(heat_index, 2),
                 'available_count': available_count,
                 'transaction_count': transaction_count,
@@ -469,6 +542,7 @@ class AnalysisViewSet(viewsets.ViewSet):
         return success_response(data=result)
     
     @action(detail=False, methods=['get'])
+    @cache_response('analysis.market_trend_forecast', ttl=1800, scopes=ANALYSIS_CACHE_SCOPES)
     def market_trend_forecast(self, request):
         """
         市场趋势预测分析 (经纪人专用)
@@ -481,138 +555,48 @@ class AnalysisViewSet(viewsets.ViewSet):
         - price_trend: 价格趋势（上涨/平稳/下跌）
         - forecast_next_month: 下月价格预测
         - transaction_activity: 成交活跃度
+        - monthly_trend: 近24个月成交均价及平滑序列
         """
         # 检查是否为经纪人
         if request.user.role not in ['agent', 'admin']:
             return error_response(msg='此功能仅限经纪人使用', code=403)
         
         district_id = request.query_params.get('district_id')
+        if district_id and not district_id.isdigit():
+            return error_response(msg='district_id 参数无效')
         
-        # 基础查询
-        available_houses = House.objects.filter(status='available')
-        if district_id:
-            available_houses = available_houses.filter(district_id=district_id)
+        # 单次条件聚合 + 月度趋势拟合, 结果按区域每天缓存一次
+        result = market_forecast(int(district_id) if district_id else None)
         
-        # 获取近30天的数据
-        thirty_days_ago = datetime.now().date() - timedelta(days=30)
-        recent_transactions = Transaction.objects.filter(deal_date__gte=thirty_days_ago)
-        if district_id:
-            recent_transactions = recent_transactions.filter(house__district_id=district_id)
+        return success_response(data=result)
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        接口响应缓存命中统计（管理员专用）
+        GET /api/analysis/cache_stats/
+        """
+        if request.user.role != 'admin' and not request.user.is_superuser:
+            return error_response(msg='此功能仅限管理员使用', code=403)
         
-        # 获取近90天的数据用于对比
-        ninety_days_ago = datetime.now().date() - timedelta(days=90)
-        older_transactions = Transaction.objects.filter(
-            deal_date__gte=ninety_days_ago,
-            deal_date__lt=thirty_days_ago
-        )
-        if district_id:
-            older_transactions = older_transactions.filter(house__district_id=district_id)
-        
-        # 供需比 = 在售房源数 / 近30天成交量
-        supply_count = available_houses.count()
-        demand_count = recent_transactions.count()
-        supply_demand_ratio = supply_count / demand_count if demand_count > 0 else supply_count
-        
-        # 成交活跃度
-        if demand_count > 20:
-            transaction_activity = '高'
-            activity_level = 'high'
-        elif demand_count > 10:
-            transaction_activity = '中'
-            activity_level = 'medium'
-        else:
-            transaction_activity = '低'
-            activity_level = 'low'
-        
-        # 市场热度指数 (0-100)
-        # 基于供需比和成交活跃度
-        if supply_demand_ratio < 1:
-            heat_base = 80
-        elif supply_demand_ratio < 2:
-            heat_base = 60
-        elif supply_demand_ratio < 5:
-            heat_base = 40
-        else:
-            heat_base = 20
-        
-        activity_bonus = min(demand_count * 2, 20)
-        market_heat = min(heat_base + activity_bonus, 100)
-        
-        # 价格趋势分析
-        if recent_transactions.exists() and older_transactions.exists():
-            recent_avg = recent_transactions.aggregate(
-                avg_price=Avg('deal_price')
-            )['avg_price']
-            older_avg = older_transactions.aggregate(
-                avg_price=Avg('deal_price')
-            )['avg_price']
-            
-            if recent_avg and older_avg:
-                price_change_percent = ((float(recent_avg) - float(older_avg)) / float(older_avg)) * 100
-                
-                if price_change_percent > 3:
-                    price_trend = '上涨'
-                    trend_direction = 'up'
-                    forecast_change = price_change_percent * 0.8  # 预测下月涨幅
-                elif price_change_percent < -3:
-                    price_trend = '下跌'
-                    trend_direction = 'down'
-                    forecast_change = price_change_percent * 0.8
-                else:
-                    price_trend = '平稳'
-                    trend_direction = 'stable'
-                    forecast_change = 0
-                
-                # 预测下月价格
-                current_avg_price = float(recent_avg)
-                forecast_next_month = current_avg_price * (1 + forecast_change / 100)
-            else:
-                price_trend = '数据不足'
-                trend_direction = 'unknown'
-                price_change_percent = 0
-                current_avg_price = 0
-                forecast_next_month = 0
-                forecast_change = 0
-        else:
-            price_trend = '数据不足'
-            trend_direction = 'unknown'
-            price_change_percent = 0
-            current_avg_price = 0
-            forecast_next_month = 0
-            forecast_change = 0
-        
-        # 市场建议
-        if market_heat > 70 and trend_direction == 'up':
-            market_suggestion = '市场火热，价格上涨，建议及时把握投资机会'
-        elif market_heat > 70 and trend_direction == 'stable':
-            market_suggestion = '市场活跃但价格平稳，适合投资'
-        elif market_heat < 40 and trend_direction == 'down':
-            market_suggestion = '市场低迷，价格下跌，建议观望或寻找低价机会'
-        elif trend_direction == 'up':
-            market_suggestion = '价格上涨趋势，但市场活跃度一般'
-        elif trend_direction == 'down':
-            market_suggestion = '价格下跌，可关注潜在投资机会'
-        else:
-            market_suggestion = '市场平稳，可根据个人需求决策'
+        return success_response(data=response_cache_stats())
+    
+    @action(detail=False, methods=['get'])
+    def profiling_stats(self, request):
+        """
+        接口性能采样统计（管理员专用）
+        GET /api/analysis/profiling_stats/
+        参数: output=prometheus 时以 Prometheus 文本格式输出直方图
         
-        result = {
-            'supply_demand_ratio': round(supply_demand_ratio, 2),
-            'supply_count': supply_count,
-            'demand_count': demand_count,
-            'market_heat': round(market_heat, 1),
-            'transaction_activity': transaction_activity,
-            'activity_level': activity_level,
-            'price_trend': price_trend,
-            'trend_direction': trend_direction,
-            'price_change_percent': round(price_change_percent, 2),
-            'current_avg_price': round(current_avg_price, 2),
-            'forecast_next_month': round(forecast_next_month, 2),
-            'forecast_change_percent': round(forecast_change, 2),
-            'market_suggestion': market_suggestion,
-            'analysis_date': datetime.now().date().isoformat()
-        }
+        返回各接口的采样数, 以及总耗时、SQL 条数与耗时、序列化耗时、响应大小的均值和 p50/p95/p99
+        """
+        if request.user.role != 'admin' and not request.user.is_superuser:
+            return error_response(msg='此功能仅限管理员使用', code=403)
         
-        return success_response(data=result)
+        if request.query_params.get('output') == 'prometheus':
+            return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        
+        return success_response(data=profiling_stats())
 
 
 class MarketReportViewSet(viewsets.ModelViewSet):
@@ -6,3 +6,10 @@ class CommonConfig(AppConfig):
     name = 'apps.common'
     verbose_name = '通用工具'
 
+
+    def ready(self):
+        from django.conf import settings
+
+        if getattr(settings, 'PROFILING_ENABLED', False):
+            from .profiling import install_serializer_timer
+            install_serializer_timer()
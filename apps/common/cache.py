@@ -0,0 +1,161 @@
+"""
+只读接口响应缓存
+
+缓存键由 接口命名空间 + 用户角色 + 依赖数据的版本号 + 规范化后的请求地址 组成.
+数据变化时只需递增对应范围(house/transaction/district)的版本号, 旧缓存随之失效,
+无需逐个删除键; 未被访问的旧键由 TTL 自然淘汰.
+"""
+import functools
+import hashlib
+import logging
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'respcache'
+
+# 已注册的缓存命名空间, 用于汇总命中统计
+_namespaces = set()
+
+
+def _version_key(scope):
+    return f'{CACHE_PREFIX}:version:{scope}'
+
+
+def _stats_key(namespace, outcome):
+    return f'{CACHE_PREFIX}:stats:{namespace}:{outcome}'
+
+
+def _incr(key):
+    # add 保证计数键存在, 多进程并发时也不会互相覆盖
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def get_versions(scopes):
+    """
+    读取各数据范围的当前版本号, 缺失时以毫秒时间戳初始化
+    """
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for scope, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            version = cache.get(key)
+        versions[scope] = version
+    return versions
+
+
+def bump_version(*scopes):
+    """
+    递增数据范围的版本号, 使依赖它的响应缓存全部失效
+    """
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 版本号被淘汰时用时间戳重建, 保证不会与旧版本号重复
+            cache.set(key, int(time.time() * 1000), timeout=None)
+        except Exception:
+            logger.exception("Failed to bump response cache version for %s", scope)
+
+
+def request_role(request):
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated:
+        return 'anonymous'
+    return getattr(user, 'role', None) or 'user'
+
+
+def normalized_query_string(request):
+    """
+    参数按名称和取值排序并去掉空值, 使参数顺序不同的同一请求命中同一缓存
+    """
+    items = []
+    for name, values in sorted(request.query_params.lists()):
+        items.extend((name, value) for value in sorted(values) if value != '')
+    return urlencode(items)
+
+
+def build_cache_key(namespace, request, versions):
+    # 分页链接和图片地址依赖协议与主机名, 一并计入
+    location = f'{request.scheme}://{request.get_host()}{request.path}?{normalized_query_string(request)}'
+    digest = hashlib.md5(location.encode('utf-8')).hexdigest()
+    version_part = '.'.join(f'{scope}{versions[scope]}' for scope in sorted(versions))
+    return f'{CACHE_PREFIX}:{namespace}:{request_role(request)}:{version_part}:{digest}'
+
+
+def cache_response(namespace, ttl, scopes=()):
+    """
+    视图方法响应缓存装饰器, 仅缓存 GET 请求的 200 响应
+    参数:
+        namespace: 缓存命名空间, 同时作为命中统计的名称
+        ttl: 默认缓存秒数, 可通过 settings.RESPONSE_CACHE_TTLS[namespace] 覆盖, 0 表示不缓存
+        scopes: 响应依赖的数据范围, 任一范围版本号变化即失效
+    """
+    _namespaces.add(namespace)
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            timeout = getattr(settings, 'RESPONSE_CACHE_TTLS', {}).get(namespace, ttl)
+            if (request.method != 'GET' or not timeout or
+                    not getattr(settings, 'RESPONSE_CACHE_ENABLED', True)):
+                return view_method(self, request, *args, **kwargs)
+
+            try:
+                key = build_cache_key(namespace, request, get_versions(scopes))
+                cached = cache.get(key)
+            except Exception:
+                # 缓存服务不可用时直接走数据库, 不影响接口可用性
+                logger.exception("Response cache unavailable for %s", namespace)
+                return view_method(self, request, *args, **kwargs)
+
+            if cached is not None:
+                _incr(_stats_key(namespace, 'hit'))
+                response = Response(cached)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _incr(_stats_key(namespace, 'miss'))
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def response_cache_stats():
+    """
+    返回各命名空间的命中、未命中次数和命中率
+    """
+    namespaces = sorted(_namespaces)
+    keys = [_stats_key(namespace, outcome) for namespace in namespaces for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    stats = {}
+    for namespace in namespaces:
+        hits = values.get(_stats_key(namespace, 'hit'), 0)
+        misses = values.get(_stats_key(namespace, 'miss'), 0)
+        total = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return stats
@@ -0,0 +1,21 @@
+"""
+数据库通用工具
+"""
+from django.db import connections, router
+
+
+def upsert_options(model, unique_fields, update_fields):
+    """
+    构造 bulk_create(update_conflicts=True) 的参数
+
+    MySQL 的 ON DUPLICATE KEY UPDATE 不接受冲突目标, 传入 unique_fields 会报错;
+    PostgreSQL/SQLite 则必须指定. 这里按当前数据库能力决定是否携带 unique_fields.
+    """
+    connection = connections[router.db_for_write(model)]
+    options = {
+        'update_conflicts': True,
+        'update_fields': list(update_fields),
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = list(unique_fields)
+    return options
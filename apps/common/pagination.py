@@ -1,7 +1,16 @@
 """
 自定义分页类
 """
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 from .response import APIResponse
 
 
@@ -32,3 +41,142 @@ class CustomPagination(PageNumberPagination):
             }
         )
 
+
+class KeysetPagination(CustomPagination):
+    """
+    游标(keyset)分页类
+
+    请求中带有 ?cursor= 参数时启用, 按 (排序字段, id) 做范围查询代替 OFFSET,
+    深度翻页耗时不随页码增长; 未携带 cursor 时退化为 CustomPagination 的页码分页.
+    视图通过 cursor_ordering_fields 声明允许作为游标的排序字段, 第一个为默认字段.
+    总数使用缓存的 COUNT, 避免每次翻页重新全表计数.
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    count_cache_timeout = 60
+    invalid_cursor_message = '无效的游标'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.use_cursor = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.use_cursor = True
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_cursor_ordering(request, view)
+        self.count = self.get_cached_count(queryset)
+
+        queryset = self.order_queryset(queryset)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.build_position_filter(*position))
+
+        # 多取一条用于判断是否还有下一页
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page_results = results[:self.page_size]
+        return self.page_results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        return APIResponse(
+            code=200,
+            msg='success',
+            data={
+                'count': self.count,
+                'next': self.get_next_link(),
+                'previous': None,
+                'results': data,
+                'page_size': self.page_size,
+                'ordering': ('-' if self.descending else '') + self.field,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+
+        last = self.page_results[-1]
+        cursor = self.encode_cursor(getattr(last, self.field), last.pk)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        return None
+
+    def get_cursor_ordering(self, request, view):
+        """
+        解析排序字段, 只接受视图 cursor_ordering_fields 中声明的字段
+        """
+        allowed = list(getattr(view, 'cursor_ordering_fields', None) or ['created_at'])
+        default = (getattr(view, 'ordering', None) or ['-' + allowed[0]])[0]
+
+        ordering = request.query_params.get(self.ordering_query_param, '')
+        ordering = ordering.split(',')[0].strip() or default
+        field = ordering.lstrip('-')
+        if field not in allowed:
+            ordering = default
+            field = ordering.lstrip('-')
+        return field, ordering.startswith('-')
+
+    def order_queryset(self, queryset):
+        prefix = '-' if self.descending else ''
+        return queryset.order_by(prefix + self.field, prefix + 'pk')
+
+    def build_position_filter(self, value, pk):
+        lookup = 'lt' if self.descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value}) |
+            Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def encode_cursor(self, value, pk):
+        payload = {
+            'f': self.field,
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'id': pk,
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        """
+        解码游标, 返回 (字段值, 主键); 空游标表示第一页
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['f'] != self.field:
+                raise ValueError('cursor ordering mismatch')
+            value = model._meta.get_field(self.field).to_python(payload['v'])
+            pk = model._meta.pk.to_python(payload['id'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def get_cached_count(self, queryset):
+        """
+        按查询SQL缓存总数, 同一筛选条件下翻页不再重复 COUNT
+        """
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except Exception:
+            return queryset.count()
+
+        digest = hashlib.md5(f'{sql}|{params}'.encode('utf-8')).hexdigest()
+        cache_key = f'pagination:count:{queryset.model._meta.label_lower}:{digest}'
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_timeout)
+        return count
@@ -0,0 +1,365 @@
+"""
+接口性能采样
+
+ProfilingMiddleware 按 PROFILING_SAMPLE_RATE 抽样请求, 记录每个视图的总耗时、SQL 条数与耗时、
+序列化耗时和响应大小. 采样结果先在进程内按直方图分桶累计, 达到间隔时间或累计次数后
+以 incr 写入缓存, 多个 worker 的数据自然合并; 读取时由分桶计数估算 p50/p95/p99,
+也可输出 Prometheus 文本格式. 未被抽中的请求只多一次随机数判断.
+"""
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'profiling'
+
+# 各指标的直方图分桶上界, 最后一个桶为 +Inf
+METRIC_BUCKETS = {
+    'wall_ms': (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    'db_ms': (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    'serializer_ms': (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    'queries': (0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+    'response_bytes': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+}
+
+# 缓存计数只支持整数, 求和值按该倍数放大后存储
+SUM_SCALE = 1000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    单个被采样请求的计量数据
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self._serializer_depth = 0
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+def _bucket_index(metric, value):
+    for index, bound in enumerate(METRIC_BUCKETS[metric]):
+        if value <= bound:
+            return index
+    return len(METRIC_BUCKETS[metric])
+
+
+def _endpoint_part(endpoint):
+    # 缓存键中不能含空格
+    return endpoint.replace(' ', ':')
+
+
+def _bucket_key(endpoint, metric, index):
+    return f'{CACHE_PREFIX}:{_endpoint_part(endpoint)}:{metric}:{index}'
+
+
+def _sum_key(endpoint, metric):
+    return f'{CACHE_PREFIX}:{_endpoint_part(endpoint)}:{metric}:sum'
+
+
+def _endpoint_marker_key(endpoint):
+    return f'{CACHE_PREFIX}:{_endpoint_part(endpoint)}:registered'
+
+
+def _endpoint_count_key():
+    return f'{CACHE_PREFIX}:endpoints:count'
+
+
+def _endpoint_slot_key(slot):
+    return f'{CACHE_PREFIX}:endpoints:{slot}'
+
+
+def _register_endpoint(endpoint):
+    """
+    登记接口名, 供读取时枚举. 每个接口一个标记键, add 只有首个写入者成功,
+    由它递增计数领取序号写入接口名; 全程没有读-改-写, 多进程并发刷新也不会丢失接口
+    """
+    if not cache.add(_endpoint_marker_key(endpoint), 1, timeout=None):
+        return
+    try:
+        cache.add(_endpoint_count_key(), 0, timeout=None)
+        slot = cache.incr(_endpoint_count_key())
+        cache.set(_endpoint_slot_key(slot), endpoint, timeout=None)
+    except Exception:
+        # 登记未完成时撤销标记, 下次刷新重试
+        cache.delete(_endpoint_marker_key(endpoint))
+        raise
+
+
+def _registered_endpoints():
+    count = cache.get(_endpoint_count_key()) or 0
+    slots = cache.get_many([_endpoint_slot_key(slot) for slot in range(1, count + 1)])
+    return sorted(set(slots.values()))
+
+
+class ProfileRecorder:
+    """
+    进程内采样缓冲区, 与房源浏览量缓冲一样按间隔或累计次数批量写入缓存
+    """
+
+    def __init__(self, flush_interval=10, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = Counter()
+        self._endpoints = set()
+        self._samples = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, values):
+        with self._lock:
+            self._endpoints.add(endpoint)
+            self._samples += 1
+            for metric, value in values.items():
+                self._pending[_bucket_key(endpoint, metric, _bucket_index(metric, value))] += 1
+                self._pending[_sum_key(endpoint, metric)] += int(round(value * SUM_SCALE))
+
+    def is_due(self):
+        return bool(self._samples) and (
+            self._samples >= self.flush_threshold or
+            time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def maybe_flush(self):
+        if self.is_due():
+            self.flush()
+
+    def flush(self):
+        """
+        将缓冲区累加到缓存, 返回写入的采样数
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            endpoints, self._endpoints = self._endpoints, set()
+            samples, self._samples = self._samples, 0
+            self._last_flush = time.monotonic()
+        if not samples:
+            return 0
+
+        try:
+            for endpoint in endpoints:
+                _register_endpoint(endpoint)
+            for key, amount in pending.items():
+                # add 保证计数键存在, 多进程并发时也不会互相覆盖
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, amount)
+        except Exception:
+            logger.exception("Failed to flush %s profiling samples", samples)
+            return 0
+        return samples
+
+
+recorder = ProfileRecorder(
+    flush_interval=getattr(settings, 'PROFILING_FLUSH_INTERVAL', 10),
+    flush_threshold=getattr(settings, 'PROFILING_FLUSH_THRESHOLD', 100),
+)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f'{request.method} {match.view_name or match.route}'
+
+
+class ProfilingMiddleware:
+    """
+    抽样记录接口耗时指标, 应放在 MIDDLEWARE 首位以覆盖其余中间件的耗时
+    PROFILING_ENABLED 为 False 时不加载
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.05)
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 1000)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        endpoint = endpoint_name(request)
+        if endpoint is None:
+            return response
+        values = {
+            'wall_ms': wall_ms,
+            'db_ms': profile.query_seconds * 1000,
+            'serializer_ms': profile.serializer_seconds * 1000,
+            'queries': profile.query_count,
+        }
+        if not response.streaming:
+            values['response_bytes'] = len(response.content)
+        recorder.record(endpoint, values)
+        recorder.maybe_flush()
+
+        if wall_ms >= self.slow_ms:
+            logger.warning(
+                "Slow request %s %s: %.1f ms, %s queries (%.1f ms), serializer %.1f ms",
+                endpoint, request.get_full_path(), wall_ms, profile.query_count,
+                values['db_ms'], values['serializer_ms'],
+            )
+        return response
+
+
+def install_serializer_timer():
+    """
+    为 DRF 序列化器的 .data 计时, 仅在被采样的请求中生效; 嵌套调用只计最外层
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, '_profiled', False):
+        return
+
+    @functools.wraps(original.fget)
+    def timed_data(serializer):
+        profile = _current_profile.get()
+        if profile is None:
+            return original.fget(serializer)
+        profile._serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return original.fget(serializer)
+        finally:
+            profile._serializer_depth -= 1
+            if not profile._serializer_depth:
+                profile.serializer_seconds += time.perf_counter() - started
+
+    timed_data._profiled = True
+    BaseSerializer.data = property(timed_data)
+
+
+def _estimate_quantile(bounds, counts, quantile):
+    """
+    由分桶计数线性插值估算分位数, 落在 +Inf 桶时返回最后一个有限上界
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if index >= len(bounds):
+                return float(bounds[-1])
+            lower = bounds[index - 1] if index else 0
+            return lower + (bounds[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return float(bounds[-1])
+
+
+def _load_histograms():
+    """
+    从缓存读取各接口各指标的 (分桶计数列表, 求和)
+    """
+    endpoints = _registered_endpoints()
+    keys = []
+    for endpoint in endpoints:
+        for metric, bounds in METRIC_BUCKETS.items():
+            keys.extend(_bucket_key(endpoint, metric, index) for index in range(len(bounds) + 1))
+            keys.append(_sum_key(endpoint, metric))
+    values = cache.get_many(keys)
+
+    histograms = {}
+    for endpoint in endpoints:
+        histograms[endpoint] = {
+            metric: (
+                [values.get(_bucket_key(endpoint, metric, index), 0) for index in range(len(bounds) + 1)],
+                values.get(_sum_key(endpoint, metric), 0) / SUM_SCALE,
+            )
+            for metric, bounds in METRIC_BUCKETS.items()
+        }
+    return histograms
+
+
+def profiling_stats():
+    """
+    返回各接口的采样数及各指标的均值与 p50/p95/p99 估算值, 按总耗时均值降序
+    """
+    recorder.flush()
+    stats = []
+    for endpoint, metrics in _load_histograms().items():
+        samples = sum(metrics['wall_ms'][0])
+        if not samples:
+            continue
+        entry = {'endpoint': endpoint, 'samples': samples}
+        for metric, (counts, total) in metrics.items():
+            observed = sum(counts)
+            summary = {'avg': round(total / observed, 2) if observed else None}
+            for quantile in QUANTILES:
+                value = _estimate_quantile(METRIC_BUCKETS[metric], counts, quantile)
+                summary[f'p{int(quantile * 100)}'] = round(value, 2) if value is not None else None
+            entry[metric] = summary
+        stats.append(entry)
+    stats.sort(key=lambda entry: entry['wall_ms']['avg'] or 0, reverse=True)
+    return {
+        'sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', 0.05),
+        'endpoints': stats,
+    }
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text():
+    """
+    以 Prometheus 文本格式输出各指标的直方图
+    """
+    recorder.flush()
+    histograms = _load_histograms()
+    lines = []
+    for metric, bounds in METRIC_BUCKETS.items():
+        name = f'api_request_{metric}'
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, metrics in histograms.items():
+            counts, total = metrics[metric]
+            if not sum(counts):
+                continue
+            method, _, view = endpoint.partition(' ')
+            labels = f'method="{_escape_label(method)}",view="{_escape_label(view)}"'
+            cumulative = 0
+            for bound, count in zip(list(bounds) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
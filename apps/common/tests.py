@@ -0,0 +1,186 @@
+"""
+公共组件测试
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APITestCase
+
+from apps.houses.models import District, House
+from . import profiling
+
+
+def _encode(payload):
+    raw = json.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class KeysetPaginationTests(APITestCase):
+    """
+    房源列表的游标分页
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        district = District.objects.create(name='分页测试区')
+        # 每个价格重复 3 次, 翻页边界必须按 id 区分同价房源
+        House.objects.bulk_create([
+            House(
+                title=f'房源{index}',
+                district=district,
+                address=f'测试路{index}号',
+                price=Decimal(100 + index // 3),
+                unit_price=Decimal('30000.00'),
+                area=Decimal('100.00'),
+                house_type='2室',
+                floor='中层',
+                total_floors=18,
+                orientation='南',
+            )
+            for index in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def _walk(self, url):
+        """
+        沿 next 链接取完所有页, 返回 (每页结果列表, 各页响应数据)
+        """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.data['data']
+            pages.append(data)
+            url = data['next']
+        return pages
+
+    def test_cursor_round_trip_covers_every_row_once(self):
+        pages = self._walk('/api/houses/?cursor=&ordering=-price&page_size=4')
+        self.assertEqual([len(page['results']) for page in pages], [4] * 6 + [1])
+        self.assertTrue(all(page['count'] == 25 for page in pages))
+        self.assertIsNone(pages[-1]['next'])
+
+        ids = [item['id'] for page in pages for item in page['results']]
+        expected = list(House.objects.order_by('-price', '-pk').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_ties_on_ordering_field_are_broken_by_id(self):
+        # 每页 2 条时每个价格组都会跨页
+        pages = self._walk('/api/houses/?cursor=&ordering=price&page_size=2')
+        rows = [(Decimal(item['price']), item['id']) for page in pages for item in page['results']]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(len({pk for _, pk in rows}), 25)
+        self.assertEqual(rows, sorted(rows))
+
+    def test_unknown_ordering_falls_back_to_default(self):
+        response = self.client.get('/api/houses/?cursor=&ordering=views&page_size=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['ordering'], '-created_at')
+
+    def test_invalid_cursor_returns_404(self):
+        for cursor in [
+            'not-base64!!',
+            _encode(['price', 1]),
+            _encode({'f': 'price', 'v': 'abc', 'id': 1}),
+            _encode({'f': 'created_at', 'v': '100', 'id': 1}),
+            _encode({'f': 'price', 'v': '100'}),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/houses/', {'cursor': cursor, 'ordering': 'price'})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['msg'], '无效的游标')
+
+    def test_without_cursor_uses_page_numbers(self):
+        response = self.client.get('/api/houses/?page=2&page_size=10')
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['page'], 2)
+        self.assertEqual(data['total_pages'], 3)
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 10)
+        self.assertNotIn('ordering', data)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1, RESPONSE_CACHE_ENABLED=False)
+class ProfilingMiddlewareTests(APITestCase):
+    """
+    全量采样时中间件记录的分位数与 Prometheus 输出
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        district = District.objects.create(name='采样测试区')
+        House.objects.bulk_create([
+            House(
+                title=f'房源{index}', district=district, address=f'测试路{index}号',
+                price=Decimal('300.00'), unit_price=Decimal('30000.00'), area=Decimal('100.00'),
+                house_type='2室', floor='中层', total_floors=18, orientation='南',
+            )
+            for index in range(5)
+        ])
+
+    def setUp(self):
+        profiling.recorder.flush()
+        cache.clear()
+
+    def test_sampled_requests_are_summarised(self):
+        for _ in range(20):
+            response = self.client.get('/api/houses/')
+        self.client.get('/api/districts/')
+        view = resolve('/api/houses/').view_name
+
+        stats = {entry['endpoint']: entry for entry in profiling.profiling_stats()['endpoints']}
+        self.assertEqual(set(stats), {f'GET {view}', f'GET {resolve("/api/districts/").view_name}'})
+        houses = stats[f'GET {view}']
+        self.assertEqual(houses['samples'], 20)
+        # COUNT + 房源 + 图片预取, 全部落在 (2, 3] 桶内
+        self.assertEqual(houses['queries']['avg'], 3)
+        for quantile in ('p50', 'p95', 'p99'):
+            self.assertTrue(2 < houses['queries'][quantile] <= 3)
+        self.assertLessEqual(houses['queries']['p50'], houses['queries']['p95'])
+        self.assertEqual(houses['response_bytes']['avg'], len(response.content))
+
+        text = profiling.prometheus_text()
+        labels = f'method="GET",view="{view}"'
+        self.assertIn('# TYPE api_request_queries histogram', text)
+        self.assertIn(f'api_request_queries_bucket{{{labels},le="2"}} 0', text)
+        self.assertIn(f'api_request_queries_bucket{{{labels},le="3"}} 20', text)
+        self.assertIn(f'api_request_queries_bucket{{{labels},le="+Inf"}} 20', text)
+        self.assertIn(f'api_request_queries_sum{{{labels}}} 60.0', text)
+        self.assertIn(f'api_request_wall_ms_count{{{labels}}} 20', text)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get('/api/houses/')
+        self.assertEqual(profiling.profiling_stats()['endpoints'], [])
+
+
+class ProfileRecorderTests(SimpleTestCase):
+    """
+    多个 worker 的缓冲区各自刷新时不丢失接口
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_endpoints_from_separate_recorders_are_merged(self):
+        recorders = [profiling.ProfileRecorder(), profiling.ProfileRecorder()]
+        for index, recorder in enumerate(recorders):
+            recorder.record(f'GET view-{index}', {'wall_ms': 5})
+            recorder.record('GET shared', {'wall_ms': 5})
+        for recorder in recorders:
+            self.assertEqual(recorder.flush(), 2)
+        recorders[0].record('GET shared', {'wall_ms': 5})
+        recorders[0].flush()
+
+        self.assertEqual(profiling._registered_endpoints(), ['GET shared', 'GET view-0', 'GET view-1'])
+        self.assertEqual(cache.get(profiling._endpoint_count_key()), 3)
+        histograms = profiling._load_histograms()
+        self.assertEqual(sum(histograms['GET shared']['wall_ms'][0]), 3)
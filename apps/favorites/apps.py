@@ -6,3 +6,6 @@ class FavoritesConfig(AppConfig):
     name = 'apps.favorites'
     verbose_name = '收藏与提醒'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favorites', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['house', 'status', 'target_price'], name='price_alert_house_i_5b3fa7_idx'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 """
 收藏与提醒模型
 """
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
 from apps.common.models import BaseModel
 from apps.users.models import User
 from apps.houses.models import House
@@ -55,6 +57,9 @@ class PriceAlert(BaseModel):
         verbose_name = '价格提醒'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['house', 'status', 'target_price']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.house.title} - {self.target_price}"
@@ -71,3 +76,56 @@ class PriceAlert(BaseModel):
             return True
         return False
 
+
+    @classmethod
+    def sync_current_prices(cls, house_ids=None):
+        """
+        用房源最新价格批量刷新激活提醒的当前价格, 返回更新的提醒数
+        参数:
+            house_ids: 仅刷新这些房源的提醒, 为None时刷新全部
+        """
+        connection = connections[router.db_for_write(cls)]
+        if connection.vendor == 'mysql':
+            # MySQL 直接 UPDATE ... JOIN, 避免 Django 先把待更新主键全部查到内存
+            sql = (
+                f'UPDATE {cls._meta.db_table} pa '
+                f'INNER JOIN {House._meta.db_table} h ON h.id = pa.house_id '
+                f'SET pa.current_price = h.price, pa.updated_at = %s '
+                f"WHERE pa.status = 'active' AND pa.current_price <> h.price"
+            )
+            params = [timezone.now()]
+            if house_ids is not None:
+                house_ids = list(house_ids)
+                if not house_ids:
+                    return 0
+                sql += f" AND pa.house_id IN ({', '.join(['%s'] * len(house_ids))})"
+                params.extend(house_ids)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.rowcount
+
+        house_price = Subquery(House.objects.filter(pk=OuterRef('house_id')).values('price')[:1])
+        alerts = cls.objects.filter(status='active')
+        if house_ids is not None:
+            alerts = alerts.filter(house_id__in=house_ids)
+        return alerts.update(current_price=house_price, updated_at=timezone.now())
+
+    @classmethod
+    def trigger_reached(cls, house_ids=None):
+        """
+        将当前价格已达到目标价格的激活提醒一次性置为已触发
+        返回 (触发数, 本次触发的提醒查询集)
+
+        先锁定并取出待触发提醒的主键, 再按主键更新状态; 并发执行时后到者在锁释放后
+        重新判断状态, 不会重复触发, 返回的查询集也只包含本次触发的提醒
+        """
+        triggered_at = timezone.now()
+        alerts = cls.objects.filter(status='active', current_price__lte=F('target_price'))
+        if house_ids is not None:
+            alerts = alerts.filter(house_id__in=house_ids)
+        with transaction.atomic(using=router.db_for_write(cls)):
+            pks = list(alerts.select_for_update().values_list('pk', flat=True))
+            count = cls.objects.filter(pk__in=pks, status='active').update(
+                status='triggered', triggered_at=triggered_at, updated_at=triggered_at
+            ) if pks else 0
+        return count, cls.objects.filter(pk__in=pks)
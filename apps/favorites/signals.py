@@ -0,0 +1,52 @@
+"""
+收藏与提醒信号处理
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.houses.models import House
+
+logger = logging.getLogger(__name__)
+
+# 批量写入后每个检查任务处理的房源数
+PRICE_ALERT_CHECK_BATCH_SIZE = 500
+
+
+@receiver(post_save, sender=House)
+def dispatch_price_alerts_on_price_change(sender, instance, created, **kwargs):
+    """
+    房源价格实际变化时, 在事务提交后异步评估该房源的价格提醒
+    """
+    if created or not instance.price_changed():
+        return
+    instance._loaded_price = instance.price
+    house_id = instance.pk
+    transaction.on_commit(lambda: _enqueue_house_price_alerts(house_id))
+
+
+def _enqueue_house_price_alerts(house_id):
+    from apps.tasks.tasks import check_house_price_alerts
+
+    try:
+        check_house_price_alerts.delay(house_id)
+    except Exception:
+        # 投递失败不影响房源保存, 每小时的全量检查会兜底
+        logger.exception("Failed to enqueue price alert check for house %s", house_id)
+
+
+def enqueue_price_alert_checks(house_ids, batch_size=PRICE_ALERT_CHECK_BATCH_SIZE):
+    """
+    bulk_update 不发送 post_save: 批量改价的调用方在事务提交后用它按批投递价格提醒检查
+    """
+    from apps.tasks.tasks import check_houses_price_alerts
+
+    house_ids = sorted(set(house_ids))
+    for start in range(0, len(house_ids), batch_size):
+        batch = house_ids[start:start + batch_size]
+        try:
+            check_houses_price_alerts.delay(batch)
+        except Exception:
+            logger.exception("Failed to enqueue price alert check for %s houses", len(batch))
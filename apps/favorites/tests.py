@@ -0,0 +1,64 @@
+"""
+价格提醒测试
+"""
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.houses.models import District, House
+from apps.users.models import User
+from .models import PriceAlert
+
+
+class PriceAlertTriggerTests(TestCase):
+    """
+    批量触发价格提醒
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', password='password', email='buyer@example.com', phone='13900000000',
+        )
+        district = District.objects.create(name='提醒测试区')
+        cls.houses = House.objects.bulk_create([
+            House(
+                title=f'房源{index}', district=district, address=f'测试路{index}号',
+                price=Decimal('300.00'), unit_price=Decimal('30000.00'), area=Decimal('100.00'),
+                house_type='2室', floor='中层', total_floors=18, orientation='南',
+            )
+            for index in range(3)
+        ])
+
+    def _alert(self, house, target_price='350.00'):
+        return PriceAlert.objects.create(
+            user=self.user, house=house, target_price=Decimal(target_price), current_price=house.price,
+        )
+
+    def test_triggers_only_reached_alerts(self):
+        reached = self._alert(self.houses[0])
+        pending = self._alert(self.houses[1], target_price='200.00')
+
+        count, triggered = PriceAlert.trigger_reached()
+
+        self.assertEqual(count, 1)
+        self.assertEqual(list(triggered), [reached])
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'active')
+
+    def test_same_timestamp_runs_do_not_share_rows(self):
+        # 两次执行落在同一时间戳时, 后一次不能把前一次触发的提醒当作自己的
+        now = timezone.now()
+        first = self._alert(self.houses[0])
+        with mock.patch('apps.favorites.models.timezone.now', return_value=now):
+            count, triggered = PriceAlert.trigger_reached(house_ids=[self.houses[0].pk])
+            self.assertEqual((count, list(triggered)), (1, [first]))
+
+            second = self._alert(self.houses[1])
+            count, triggered = PriceAlert.trigger_reached()
+            self.assertEqual((count, list(triggered)), (1, [second]))
+
+            count, triggered = PriceAlert.trigger_reached()
+            self.assertEqual((count, list(triggered)), (0, []))
@@ -22,7 +22,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user).select_related('house', 'house__district').prefetch_related('house__images')
+        return Favorite.objects.filter(user=self.request.user).select_related('house', 'house__district', 'house__agent').prefetch_related('house__images')
     
     def create(self, request, *args, **kwargs):
         """
@@ -95,7 +95,7 @@ class PriceAlertViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     
     def get_queryset(self):
-        return PriceAlert.objects.filter(user=self.request.user).select_related('house', 'house__district').prefetch_related('house__images')
+        return PriceAlert.objects.filter(user=self.request.user).select_related('house', 'house__district', 'house__agent').prefetch_related('house__images')
     
     def create(self, request, *args, **kwargs):
         """
@@ -169,7 +169,7 @@ class PriceAlertViewSet(viewsets.ModelViewSet):
             return error_response(msg='缺少房源ID')
         
         # 获取该房源的激活状态提醒
-        alert = PriceAlert.objects.filter(
+        alert = PriceAlert.objects.select_related('house').filter(
             user=request.user,
             house_id=house_id,
             status='active'
@@ -178,18 +178,15 @@ class PriceAlertViewSet(viewsets.ModelViewSet):
         if not alert:
             return success_response(data={'has_alert': False})
         
-        # 更新当前价格
-        alert.current_price = alert.house.price
-        alert.save(update_fields=['current_price'])
-        
-        # 检查是否触发
-        triggered = alert.check_and_trigger()
+        # 只读检查: 提醒的触发由房源价格变化事件和定时任务负责, GET 请求不写库
+        current_price = alert.house.price
+        triggered = current_price <= alert.target_price
         
         return success_response(data={
             'has_alert': True,
             'alert_id': alert.id,
             'target_price': float(alert.target_price),
-            'current_price': float(alert.current_price),
+            'current_price': float(current_price),
             'triggered': triggered,
             'status': alert.status
         })
@@ -6,3 +6,10 @@ class HousesConfig(AppConfig):
     name = 'apps.houses'
     verbose_name = '房源管理'
 
+    def ready(self):
+        from django.core.signals import request_finished
+        from .view_counter import flush_on_request_finished
+        from . import signals  # noqa: F401
+
+        # 请求结束后按需写回缓冲的浏览量
+        request_finished.connect(flush_on_request_finished, dispatch_uid='houses.flush_views')
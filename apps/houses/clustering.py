@@ -0,0 +1,123 @@
+"""
+地图聚合工具: 按视口(bbox)和缩放级别把房源聚合为网格簇
+"""
+from django.db.models import Avg, Count, FloatField
+from django.db.models.functions import Cast, Floor
+
+# 每个 256px 瓦片在横向上划分的网格数, 数值越大簇越细
+GRID_CELLS_PER_TILE = 4
+
+# 达到该缩放级别后不再聚合, 直接返回视口内的房源点
+CLUSTER_MAX_ZOOM = 15
+
+# 聚合的最低缩放级别, 更低的级别按该级别聚合. 约为一座城市占满视口的级别,
+# 再往下每个网格都会覆盖整个城市, 而聚合查询的扫描范围却扩大到全部房源
+CLUSTER_MIN_ZOOM = 8
+
+# 聚合视口最多覆盖的瓦片数(每个方向), 超出的 bbox 以中心点为准收缩
+MAX_VIEWPORT_TILES = 8
+
+# 单次返回的房源点上限, 防止超大视口拉取全部数据
+MAX_POINTS = 2000
+
+
+def parse_bbox(value):
+    """
+    解析 bbox=最小经度,最小纬度,最大经度,最大纬度, 非法时返回 None
+    """
+    if not value:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = [float(part) for part in value.split(',')]
+    except ValueError:
+        return None
+    if min_lng > max_lng or min_lat > max_lat:
+        return None
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_zoom(value, default=None):
+    try:
+        return max(0, min(int(value), 22))
+    except (TypeError, ValueError):
+        return default
+
+
+def cell_size(zoom):
+    """
+    缩放级别对应的网格边长(度)
+    """
+    return 360.0 / (2 ** zoom * GRID_CELLS_PER_TILE)
+
+
+def clamp_zoom(zoom):
+    """
+    聚合使用的缩放级别, 不低于 CLUSTER_MIN_ZOOM
+    """
+    return max(zoom, CLUSTER_MIN_ZOOM)
+
+
+def clamp_bbox(bbox, zoom):
+    """
+    将 bbox 每个方向的跨度限制在该缩放级别 MAX_VIEWPORT_TILES 个瓦片以内,
+    使聚合查询始终是 (经度, 纬度) 索引上的有界范围扫描
+    """
+    max_span = 360.0 / 2 ** zoom * MAX_VIEWPORT_TILES
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if max_lng - min_lng > max_span:
+        center = (min_lng + max_lng) / 2
+        min_lng, max_lng = center - max_span / 2, center + max_span / 2
+    if max_lat - min_lat > max_span:
+        center = (min_lat + max_lat) / 2
+        min_lat, max_lat = center - max_span / 2, center + max_span / 2
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def filter_bbox(queryset, bbox):
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return queryset.filter(
+        longitude__gte=min_lng, longitude__lte=max_lng,
+        latitude__gte=min_lat, latitude__lte=max_lat,
+    )
+
+
+def cluster_queryset(queryset, zoom):
+    """
+    按网格分组聚合, 返回每个网格的房源数、质心和均价
+    """
+    size = cell_size(zoom)
+    lng = Cast('longitude', FloatField())
+    lat = Cast('latitude', FloatField())
+    return (
+        queryset.order_by().select_related(None).prefetch_related(None)
+        .annotate(cell_x=Floor(lng / size), cell_y=Floor(lat / size))
+        .values('cell_x', 'cell_y')
+        .annotate(
+            point_count=Count('id'),
+            center_lng=Avg(lng),
+            center_lat=Avg(lat),
+            avg_price=Avg('price'),
+        )
+    )
+
+
+def cluster_features(rows, zoom):
+    """
+    将聚合结果转换为 GeoJSON Feature 列表
+    """
+    features = []
+    for row in rows:
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(row['center_lng'], 6), round(row['center_lat'], 6)]
+            },
+            "properties": {
+                "cluster": True,
+                "cluster_id": f"{zoom}:{int(row['cell_x'])}:{int(row['cell_y'])}",
+                "point_count": row['point_count'],
+                "avg_price": round(float(row['avg_price'] or 0), 2),
+            }
+        })
+    return features
@@ -0,0 +1,74 @@
+"""
+房源过滤与搜索后端
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# 与 0003 迁移中 FULLTEXT 索引的列保持一致
+FULLTEXT_COLUMNS = ('title', 'address', 'description')
+
+# ngram 解析器默认 ngram_token_size=2, 更短的词无法命中全文索引
+NGRAM_TOKEN_SIZE = 2
+
+# 布尔模式下有特殊含义的字符
+BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+class HouseFullTextSearchFilter(filters.SearchFilter):
+    """
+    房源全文搜索
+
+    MySQL 下使用 title/address/description 上的 FULLTEXT(ngram) 索引做
+    MATCH ... AGAINST 检索, 并按相关度注解 search_rank 供排序使用;
+    其他数据库或搜索词过短时退化为 SearchFilter 的 icontains 查询.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = [
+            BOOLEAN_OPERATORS.sub(' ', term).strip()
+            for term in self.get_search_terms(request)
+        ]
+        search_terms = [term for term in search_terms if term]
+
+        if not search_terms or not self.use_fulltext(queryset, search_terms):
+            return super().filter_queryset(request, queryset, view)
+
+        boolean_query = ' '.join(f'+"{term}"' for term in search_terms)
+        natural_query = ' '.join(search_terms)
+        table = queryset.model._meta.db_table
+
+        return queryset.annotate(
+            search_rank=RawSQL(self.match_sql(table, 'NATURAL LANGUAGE'), [natural_query],
+                               output_field=FloatField()),
+        ).filter(
+            RawSQL(self.match_sql(table, 'BOOLEAN'), [boolean_query], output_field=BooleanField())
+        )
+
+    @staticmethod
+    def match_sql(table, mode):
+        columns = ', '.join(f'{table}.{column}' for column in FULLTEXT_COLUMNS)
+        return f'MATCH({columns}) AGAINST (%s IN {mode} MODE)'
+
+    @staticmethod
+    def use_fulltext(queryset, search_terms):
+        if connections[queryset.db].vendor != 'mysql':
+            return False
+        return all(len(term) >= NGRAM_TOKEN_SIZE for term in search_terms)
+
+
+class HouseOrderingFilter(filters.OrderingFilter):
+    """
+    房源排序
+
+    未显式指定 ?ordering= 且存在全文搜索相关度时, 按相关度降序返回.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and \
+                'search_rank' in queryset.query.annotations:
+            return ['-search_rank'] + list(self.get_default_ordering(view) or [])
+        return super().get_ordering(request, queryset, view)
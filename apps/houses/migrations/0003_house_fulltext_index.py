@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'houses_fulltext_idx'
+
+
+def create_fulltext_index(apps, schema_editor):
+    # FULLTEXT + ngram 解析器仅 MySQL 支持, 其他数据库保持 icontains 搜索
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f'ALTER TABLE houses ADD FULLTEXT INDEX {INDEX_NAME} '
+        f'(title, address, description) WITH PARSER ngram'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f'ALTER TABLE houses DROP INDEX {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houses', '0002_alter_house_cover_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
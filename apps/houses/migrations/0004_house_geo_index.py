@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houses', '0003_house_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['longitude', 'latitude'], name='houses_longitu_1b7541_idx'),
+        ),
+    ]
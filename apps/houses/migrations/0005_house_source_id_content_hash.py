@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houses', '0004_house_geo_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='house',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='来源内容摘要'),
+        ),
+        migrations.AddField(
+            model_name='house',
+            name='source_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='来源房源ID'),
+        ),
+    ]
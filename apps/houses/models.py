@@ -85,6 +85,11 @@ class House(BaseModel):
                              related_name='published_houses', verbose_name='发布经纪人')
     views = models.IntegerField(default=0, verbose_name='浏览次数')
     
+    # 数据来源标识, 用于增量导入
+    source_id = models.CharField(max_length=64, unique=True, null=True, blank=True,
+                                 verbose_name='来源房源ID')
+    content_hash = models.CharField(max_length=32, blank=True, default='', verbose_name='来源内容摘要')
+    
     class Meta:
         db_table = 'houses'
         verbose_name = '房源'
@@ -94,11 +99,37 @@ class House(BaseModel):
             models.Index(fields=['district', 'status']),
             models.Index(fields=['price']),
             models.Index(fields=['house_type']),
+            models.Index(fields=['longitude', 'latitude']),
         ]
     
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的价格、区域与户型, 保存时据此判断是否变化
+        instance._loaded_price = instance.__dict__.get('price')
+        instance._loaded_district_id = instance.__dict__.get('district_id')
+        instance._loaded_house_type = instance.__dict__.get('house_type')
+        return instance
+
+    def price_changed(self):
+        """
+        价格相对加载时是否发生变化; 新建对象返回 False
+        """
+        if self._state.adding or not hasattr(self, '_loaded_price'):
+            return False
+        return self._loaded_price != self.price
+
+    def unit_price_key_changed(self):
+        """
+        区域或户型相对加载时是否发生变化, 变化时成交单价立方体的归属单元随之改变
+        """
+        if self._state.adding or not hasattr(self, '_loaded_district_id'):
+            return False
+        return (self._loaded_district_id, self._loaded_house_type) != (self.district_id, self.house_type)
+
     def get_cover_image_url(self):
         """
         返回封面图URL, 支持本地文件和远程URL.
@@ -106,11 +137,22 @@ class House(BaseModel):
         url = self._resolve_field_file_url(self.cover_image)
         if url:
             return url
-        first_image = self.images.first()
+        first_image = self._first_image()
         if first_image:
             return self._resolve_field_file_url(first_image.image)
         return None
 
+    def _first_image(self):
+        """
+        返回排序最靠前的图片; 已 prefetch_related('images') 时直接读取缓存,
+        避免 .first() 追加 ORDER BY 绕过预取导致逐行查询.
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'images' in prefetched:
+            images = list(prefetched['images'])
+            return min(images, key=lambda image: (image.order, image.pk)) if images else None
+        return self.images.first()
+
     @staticmethod
     def _resolve_field_file_url(field_file):
         if not field_file:
@@ -163,3 +205,11 @@ class Transaction(BaseModel):
     
     def __str__(self):
         return f"{self.house.title} - {self.deal_date}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的房源与成交日期, 保存时据此刷新原所在的单价单元
+        instance._loaded_house_id = instance.__dict__.get('house_id')
+        instance._loaded_deal_date = instance.__dict__.get('deal_date')
+        return instance
@@ -17,7 +17,11 @@ class DistrictSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'city', 'description', 'house_count', 'created_at']
     
     def get_house_count(self, obj):
-        return obj.houses.filter(status='available').count()
+        # 视图已通过注解提供在售数量时直接读取, 避免逐行 COUNT
+        count = getattr(obj, 'available_house_count', None)
+        if count is None:
+            count = obj.houses.filter(status='available').count()
+        return count
 
 
 class HouseImageSerializer(serializers.ModelSerializer):
@@ -0,0 +1,28 @@
+"""
+房源信号处理
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.common.cache import bump_version
+from .models import District, House, HouseImage, Transaction
+
+
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def invalidate_district_cache(sender, **kwargs):
+    bump_version('district')
+
+
+@receiver(post_save, sender=House)
+@receiver(post_delete, sender=House)
+@receiver(post_save, sender=HouseImage)
+@receiver(post_delete, sender=HouseImage)
+def invalidate_house_cache(sender, **kwargs):
+    bump_version('house')
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_cache(sender, **kwargs):
+    bump_version('transaction')
@@ -0,0 +1,147 @@
+"""
+房源接口查询次数测试
+"""
+import threading
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from apps.users.models import User
+from . import clustering
+from .models import District, House, HouseImage
+from .view_counter import ViewCounter, view_counter
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class HouseQueryCountTests(APITestCase):
+    """
+    列表类接口的 SQL 条数不应随返回行数增长
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = User.objects.create_user(
+            username='agent', password='password', email='agent@example.com',
+            phone='13800000000', role='agent', real_name='经纪人',
+        )
+        cls.districts = [
+            District.objects.create(name=f'区域{index}') for index in range(3)
+        ]
+        houses = House.objects.bulk_create([
+            House(
+                title=f'房源{index}',
+                district=cls.districts[index % 3],
+                address=f'测试路{index}号',
+                price=Decimal('300.00') + index,
+                unit_price=Decimal('30000.00'),
+                area=Decimal('100.00'),
+                house_type='2室',
+                floor='中层',
+                total_floors=18,
+                orientation='南',
+                longitude=Decimal('121.4') + Decimal(index) / 1000,
+                latitude=Decimal('31.2') + Decimal(index) / 1000,
+                agent=cls.agent,
+                views=index,
+            )
+            for index in range(100)
+        ])
+        # 部分房源没有封面图, 需要回退到第一张图片
+        HouseImage.objects.bulk_create([
+            HouseImage(house=house, image=f'houses/images/{house.pk}-{order}.jpg', order=order)
+            for house in houses[:50]
+            for order in (1, 0)
+        ])
+
+    def setUp(self):
+        # 清空浏览量缓冲并重置写回计时, 避免请求结束时的写回计入查询次数
+        view_counter.flush()
+
+    def test_house_list(self):
+        # COUNT + 房源(关联区域、经纪人) + 图片预取
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/houses/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['data']['results']
+        self.assertEqual(len(results), 100)
+        self.assertTrue(all(item['agent_name'] == '经纪人' for item in results))
+
+    def test_house_list_cover_image_uses_first_image(self):
+        response = self.client.get('/api/houses/', {'page_size': 100})
+        covers = {item['id']: item['cover_image'] for item in response.data['data']['results']}
+        house = House.objects.filter(images__isnull=False).first()
+        self.assertTrue(covers[house.pk].endswith(f'{house.pk}-0.jpg'))
+
+    def test_map_data(self):
+        # 房源(关联区域、经纪人) + 图片预取
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/houses/map_data/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']['features']), 100)
+
+    def test_hot_houses(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/houses/hot_houses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['views'] for item in response.data['data']][:3], [99, 98, 97])
+
+    def test_district_list(self):
+        # 在售房源数以注解随区域一起聚合
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/districts/')
+        self.assertEqual(response.status_code, 200)
+        counts = {item['id']: item['house_count'] for item in response.data['data']}
+        self.assertEqual(counts, {district.pk: 34 if index == 0 else 33
+                                  for index, district in enumerate(self.districts)})
+
+    def test_house_detail(self):
+        house = House.objects.filter(district=self.districts[0]).first()
+        House.objects.filter(pk=house.pk).update(status='sold')
+        # 房源(含区域在售数子查询) + 图片预取
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/houses/{house.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['district_info']['house_count'], 33)
+
+    def test_map_data_clusters_require_bbox(self):
+        response = self.client.get('/api/houses/map_data/', {'zoom': 10})
+        self.assertEqual(response.status_code, 400)
+
+    def test_map_data_clusters_within_clamped_viewport(self):
+        # 低于最低聚合级别时按 CLUSTER_MIN_ZOOM 聚合
+        response = self.client.get('/api/houses/map_data/', {'zoom': 3, 'bbox': '121,31,122,32'})
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['zoom'], clustering.CLUSTER_MIN_ZOOM)
+        self.assertEqual(sum(feature['properties']['point_count'] for feature in data['features']), 100)
+
+        # 全球范围的 bbox 收缩为以中心点为准的有界视口, 不再扫描全部房源
+        response = self.client.get('/api/houses/map_data/', {'zoom': 3, 'bbox': '-180,-85,180,85'})
+        min_lng, min_lat, max_lng, max_lat = response.data['data']['bbox']
+        self.assertLessEqual(max_lng - min_lng, 360.0 / 2 ** clustering.CLUSTER_MIN_ZOOM * clustering.MAX_VIEWPORT_TILES)
+        self.assertEqual(response.data['data']['features'], [])
+
+
+class ViewCounterTests(SimpleTestCase):
+    """
+    浏览量缓冲的后台写回
+    """
+
+    def _counter(self, **kwargs):
+        counter = ViewCounter(flush_interval=0.05, flush_threshold=100, **kwargs)
+        counter.flushed = threading.Event()
+        counter.flush = lambda: counter.flushed.set() or 0
+        return counter
+
+    def test_idle_worker_flushes_without_requests(self):
+        counter = self._counter()
+        counter.record(1)
+        # 之后没有任何请求, 由后台线程按间隔写回
+        self.assertTrue(counter.flushed.wait(timeout=2))
+
+    def test_background_flush_can_be_disabled(self):
+        counter = self._counter(background=False)
+        counter.record(1)
+        self.assertFalse(counter.flushed.wait(timeout=0.2))
+        self.assertEqual(counter.pending(1), 1)
@@ -0,0 +1,132 @@
+"""
+房源浏览量写回缓冲
+
+详情页浏览不再逐次 UPDATE, 而是先在进程内累计, 达到间隔时间或累计次数后
+以 F('views') + n 的方式批量写回数据库, 避免读-改-写丢失计数和热门房源行锁争用.
+
+写回时机: 请求结束时按需写回; 进程内的后台线程每隔 flush_interval 秒检查一次,
+空闲的 worker 也会按时写回; 正常退出时在 atexit 中写回剩余部分.
+进程被强制结束(SIGKILL、OOM)时最多丢失最近约 2 × flush_interval 秒内的浏览量.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    进程内浏览量缓冲区
+    """
+
+    def __init__(self, flush_interval=10, flush_threshold=100, background=True):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.background = background
+        self._pending = Counter()
+        self._total = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # 后台写回线程所属的进程号, fork 出的子进程需要重新启动线程
+        self._flusher_pid = None
+
+    def record(self, house_id, count=1):
+        with self._lock:
+            self._pending[house_id] += count
+            self._total += count
+        if self.background and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_periodically, name='house-view-flusher', daemon=True)
+        thread.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.maybe_flush()
+            except Exception:
+                logger.exception("Periodic house view flush failed")
+            finally:
+                # 本线程的数据库连接不复用, 避免长时间空闲后被服务端断开
+                connection.close()
+
+    def pending(self, house_id):
+        """
+        返回尚未写回数据库的浏览次数
+        """
+        with self._lock:
+            return self._pending.get(house_id, 0)
+
+    def is_due(self):
+        return bool(self._total) and (
+            self._total >= self.flush_threshold or
+            time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def maybe_flush(self):
+        if self.is_due():
+            self.flush()
+
+    def flush(self):
+        """
+        将缓冲区写回数据库, 增量相同的房源合并为一条 UPDATE, 返回写回的浏览次数
+        """
+        from .models import House
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            total, self._total = self._total, 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        by_increment = defaultdict(list)
+        for house_id, count in pending.items():
+            by_increment[count].append(house_id)
+
+        try:
+            for count, house_ids in by_increment.items():
+                House.objects.filter(pk__in=house_ids).update(views=F('views') + count)
+        except Exception:
+            # 写回失败时放回缓冲区, 下次再试
+            logger.exception("Failed to flush %s buffered house views", total)
+            with self._lock:
+                self._pending.update(pending)
+                self._total += total
+            return 0
+        return total
+
+
+view_counter = ViewCounter(
+    flush_interval=getattr(settings, 'HOUSE_VIEWS_FLUSH_INTERVAL', 10),
+    flush_threshold=getattr(settings, 'HOUSE_VIEWS_FLUSH_THRESHOLD', 100),
+    background=getattr(settings, 'HOUSE_VIEWS_BACKGROUND_FLUSH', True),
+)
+
+
+def flush_on_request_finished(sender, **kwargs):
+    view_counter.maybe_flush()
+
+
+def _flush_at_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception("Failed to flush house views at exit")
+
+
+atexit.register(_flush_at_exit)
@@ -6,9 +6,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Count, OuterRef, Q, Subquery
 
 from .models import District, House, HouseImage, Transaction
+from . import clustering
+from .view_counter import view_counter
+from .filters import HouseFullTextSearchFilter, HouseOrderingFilter
 from .serializers import (
     DistrictSerializer, HouseListSerializer, HouseDetailSerializer,
     HouseCreateUpdateSerializer, TransactionSerializer, HouseMapSerializer,
@@ -16,7 +19,8 @@ from .serializers import (
 )
 from apps.common.response import success_response, error_response
 from apps.common.permissions import IsAgentOrAdmin
-from apps.common.pagination import CustomPagination
+from apps.common.pagination import KeysetPagination
+from apps.common.cache import bump_version, cache_response
 
 
 class DistrictViewSet(viewsets.ModelViewSet):
@@ -36,6 +40,13 @@ class DistrictViewSet(viewsets.ModelViewSet):
             return [IsAgentOrAdmin()]
         return [IsAuthenticatedOrReadOnly()]
     
+    def get_queryset(self):
+        # 在售房源数随区域一起聚合查询, 列表只需一条SQL
+        return super().get_queryset().annotate(
+            available_house_count=Count('houses', filter=Q(houses__status='available'))
+        )
+    
+    @cache_response('districts.list', ttl=300, scopes=('district', 'house'))
     def list(self, request, *args, **kwargs):
         """获取区域列表"""
         queryset = self.filter_queryset(self.get_queryset())
@@ -79,12 +90,13 @@ class HouseViewSet(viewsets.ModelViewSet):
     """
     queryset = House.objects.select_related('district', 'agent').prefetch_related('images').all()
     permission_classes = [IsAuthenticatedOrReadOnly]
-    pagination_class = CustomPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, HouseFullTextSearchFilter, HouseOrderingFilter]
     filterset_fields = ['district', 'status', 'house_type', 'orientation']
     search_fields = ['title', 'address', 'description']
     ordering_fields = ['price', 'unit_price', 'area', 'created_at', 'views']
     ordering = ['-created_at']
+    cursor_ordering_fields = ['created_at', 'price']  # ?cursor= 游标分页支持的排序字段
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -117,8 +129,16 @@ class HouseViewSet(viewsets.ModelViewSet):
         if max_area:
             queryset = queryset.filter(area__lte=max_area)
         
+        if self.action == 'retrieve':
+            # 详情页嵌套的区域信息需要在售房源数, 以关联子查询随房源一起取出
+            queryset = queryset.annotate(district_available_house_count=Subquery(
+                House.objects.filter(district=OuterRef('district'), status='available')
+                .order_by().values('district').annotate(count=Count('id')).values('count')
+            ))
+        
         return queryset
     
+    @cache_response('houses.list', ttl=60, scopes=('house', 'district'))
     def list(self, request, *args, **kwargs):
         """获取房源列表"""
         queryset = self.filter_queryset(self.get_queryset())
@@ -144,8 +164,10 @@ class HouseViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """获取房源详情,增加浏览次数"""
         instance = self.get_object()
-        instance.views += 1
-        instance.save(update_fields=['views'])
+        # 浏览量先记入缓冲区, 请求结束后批量写回
+        view_counter.record(instance.pk)
+        instance.views += view_counter.pending(instance.pk)
+        instance.district.available_house_count = instance.district_available_house_count or 0
         serializer = self.get_serializer(instance)
         return success_response(data=serializer.data)
     
@@ -198,6 +220,8 @@ class HouseViewSet(viewsets.ModelViewSet):
         
         # 批量更新
         updated_count = House.objects.filter(id__in=ids).update(status=new_status)
+        if updated_count:
+            bump_version('house')
         
         return success_response(
             data={'updated_count': updated_count},
@@ -266,10 +290,16 @@ class HouseViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @cache_response('houses.map_data', ttl=120, scopes=('house', 'district'))
     def map_data(self, request):
         """
         获取地图数据(GeoJSON格式)
         GET /api/houses/map_data/
+        参数: bbox=最小经度,最小纬度,最大经度,最大纬度 (可选), zoom (可选)
+        
+        传入 zoom 且低于 CLUSTER_MAX_ZOOM 时返回网格聚合簇, 此时必须提供 bbox,
+        缩放级别不低于 CLUSTER_MIN_ZOOM, bbox 按缩放级别限制跨度;
+        否则返回视口内的房源点; 均不传时返回全部房源点
         """
         queryset = self.filter_queryset(self.get_queryset())
         queryset = queryset.filter(
@@ -278,45 +308,81 @@ class HouseViewSet(viewsets.ModelViewSet):
             status='available'
         )
         
+        bbox = clustering.parse_bbox(request.query_params.get('bbox'))
+        zoom = clustering.parse_zoom(request.query_params.get('zoom'))
+        
+        # 低缩放级别: 数据库内按网格聚合, 返回簇而非逐个房源.
+        # 只在有界视口内聚合, 避免每次请求对全部房源做 GROUP BY
+        if zoom is not None and zoom < clustering.CLUSTER_MAX_ZOOM:
+            if not bbox:
+                return error_response(msg='聚合模式需要提供 bbox')
+            zoom = clustering.clamp_zoom(zoom)
+            bbox = clustering.clamp_bbox(bbox, zoom)
+            rows = clustering.cluster_queryset(clustering.filter_bbox(queryset, bbox), zoom)
+            return success_response(data={
+                "type": "FeatureCollection",
+                "features": clustering.cluster_features(rows, zoom),
+                "clustered": True,
+                "zoom": zoom,
+                "bbox": list(bbox),
+            })
+        
+        if bbox:
+            queryset = clustering.filter_bbox(queryset, bbox)
+        
+        truncated = False
+        if bbox or zoom is not None:
+            houses = list(queryset[:clustering.MAX_POINTS + 1])
+            truncated = len(houses) > clustering.MAX_POINTS
+            houses = houses[:clustering.MAX_POINTS]
+        else:
+            houses = queryset
+        
         # 构建GeoJSON格式
-        features = []
-        for house in queryset:
-            # 获取封面图URL
-            cover_image_url = house.get_cover_image_url()
-            if cover_image_url and not cover_image_url.startswith('http'):
-                try:
-                    cover_image_url = request.build_absolute_uri(cover_image_url)
-                except Exception:
-                    pass
-            
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [float(house.longitude), float(house.latitude)]
-                },
-                "properties": {
-                    "id": house.id,
-                    "title": house.title,
-                    "price": float(house.price),
-                    "unit_price": float(house.unit_price),
-                    "area": float(house.area),
-                    "house_type": house.house_type,
-                    "address": house.address,
-                    "cover_image": cover_image_url,
-                    "district": house.district.id if house.district else None,
-                    "district_name": house.district.name if house.district else "未知区域",
-                }
-            }
-            features.append(feature)
+        features = [self._build_map_feature(house, request) for house in houses]
         
         geojson = {
             "type": "FeatureCollection",
             "features": features
         }
+        if bbox or zoom is not None:
+            geojson.update({"clustered": False, "zoom": zoom, "truncated": truncated})
         
         return success_response(data=geojson)
     
+    @staticmethod
+    def _build_map_feature(house, request):
+        """
+        将单个房源转换为 GeoJSON Feature
+        """
+        # 获取封面图URL
+        cover_image_url = house.get_cover_image_url()
+        if cover_image_url and not cover_image_url.startswith('http'):
+            try:
+                cover_image_url = request.build_absolute_uri(cover_image_url)
+            except Exception:
+                pass
+        
+        return {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [float(house.longitude), float(house.latitude)]
+            },
+            "properties": {
+                "id": house.id,
+                "title": house.title,
+                "price": float(house.price),
+                "unit_price": float(house.unit_price),
+                "area": float(house.area),
+                "house_type": house.house_type,
+                "address": house.address,
+                "cover_image": cover_image_url,
+                "district": house.district.id if house.district else None,
+                "district_name": house.district.name if house.district else "未知区域",
+            }
+        }
+    
     @action(detail=False, methods=['get'])
     def my_houses(self, request):
         """
@@ -333,13 +399,18 @@ class HouseViewSet(viewsets.ModelViewSet):
         return success_response(data=serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response('houses.hot_houses', ttl=30, scopes=('house', 'district'))
     def hot_houses(self, request):
         """
         获取热门房源(按浏览量排序)
         GET /api/houses/hot_houses/
         """
-        queryset = self.get_queryset().filter(status='available').order_by('-views')[:10]
-        serializer = HouseListSerializer(queryset, many=True, context={'request': request})
+        houses = list(self.get_queryset().filter(status='available').order_by('-views')[:10])
+        # 叠加尚未写回的浏览量
+        for house in houses:
+            house.views += view_counter.pending(house.pk)
+        houses.sort(key=lambda house: house.views, reverse=True)
+        serializer = HouseListSerializer(houses, many=True, context={'request': request})
         return success_response(data=serializer.data)
 
 
@@ -422,11 +493,12 @@ class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.select_related('house', 'house__district')
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['house__district']
     ordering_fields = ['deal_date', 'deal_price']
     ordering = ['-deal_date']
+    cursor_ordering_fields = ['deal_date', 'deal_price']
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -0,0 +1,634 @@
+"""
+基准测试工具: 按随机种子批量生成可复现的合成数据, 并对热点接口与后台任务逐项计时.
+
+数据全部通过 bulk_create 写入, 同一种子生成的数据完全一致; 基准结果为 JSON,
+可保存后在不同提交之间对比耗时与查询数的变化.
+"""
+from __future__ import annotations
+
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from apps.common.cache import bump_version
+from apps.favorites.models import Favorite, PriceAlert
+from apps.houses.models import District, House, Transaction
+from apps.users.models import User
+
+DEFAULT_CITY = "benchmark"
+
+TITLE_WORDS = ["花园", "公寓", "名邸", "雅苑", "新村", "广场", "湾", "华府", "公馆", "家园"]
+TITLE_FEATURES = ["精装", "南北通透", "近地铁", "满五唯一", "学区", "带车位", "采光好", "低总价"]
+HOUSE_TYPE_WEIGHTS = [("1室", 15), ("2室", 40), ("3室", 30), ("4室", 10), ("5室及以上", 5)]
+STATUS_WEIGHTS = [("available", 70), ("sold", 25), ("reserved", 5)]
+ORIENTATIONS = [value for value, _ in House.ORIENTATION_CHOICES]
+DECORATIONS = ["精装", "简装", "毛坯"]
+
+# 合成房源的经纬度范围 (中心点, 半径)
+CENTER = (121.47, 31.23)
+SPREAD = 0.3
+
+# 成交价格的月涨幅
+MONTHLY_GROWTH = 0.003
+
+
+@dataclass
+class SyntheticDataset:
+    city: str
+    district_ids: List[int]
+    house_ids: List[int]
+    admin_id: int
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, city: str = DEFAULT_CITY) -> "SyntheticDataset":
+        """
+        读取已由 seed_benchmark_data 写入数据库的数据集
+        """
+        district_ids = list(District.objects.filter(city=city).order_by("id").values_list("id", flat=True))
+        house_ids = list(House.objects.filter(district_id__in=district_ids).order_by("id").values_list("id", flat=True))
+        admin = User.objects.filter(username=f"{city}_admin").first()
+        if not district_ids or admin is None:
+            raise LookupError(f"未找到城市 {city} 的基准数据, 请先执行 seed_benchmark_data")
+        return cls(
+            city=city,
+            district_ids=district_ids,
+            house_ids=house_ids,
+            admin_id=admin.id,
+            counts={
+                "districts": len(district_ids),
+                "houses": len(house_ids),
+                "transactions": Transaction.objects.filter(house__district_id__in=district_ids).count(),
+                "users": User.objects.filter(username__startswith=f"{city}_").count(),
+                "favorites": Favorite.objects.filter(house__district_id__in=district_ids).count(),
+                "alerts": PriceAlert.objects.filter(house__district_id__in=district_ids).count(),
+            },
+        )
+
+
+class SyntheticDataGenerator:
+    """
+    按种子批量生成区域、用户(含经纪人与管理员)、房源、成交、收藏和价格提醒
+    """
+
+    def __init__(
+        self,
+        seed: int = 42,
+        districts: int = 10,
+        houses: int = 5000,
+        transactions: int = 20000,
+        users: int = 200,
+        favorites: int = 2000,
+        alerts: int = 1000,
+        years: int = 2,
+        city: str = DEFAULT_CITY,
+        batch_size: int = 2000,
+    ) -> None:
+        self.seed = seed
+        self.sizes = {
+            "districts": max(1, districts),
+            "houses": max(1, houses),
+            "transactions": max(0, transactions),
+            "users": max(2, users),
+            "favorites": max(0, favorites),
+            "alerts": max(0, alerts),
+        }
+        self.years = max(1, years)
+        self.city = city
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+
+    def generate(self) -> SyntheticDataset:
+        if District.objects.filter(city=self.city).exists():
+            raise ValueError(f"城市 {self.city} 已存在数据, 请先清除或更换城市名")
+
+        districts = self._districts()
+        users = self._users()
+        agents = [user for user in users if user.role == "agent"]
+        houses = self._houses(districts, agents)
+        transactions = self._transactions(houses)
+        favorites = self._favorites(users, houses)
+        alerts = self._alerts(users, houses)
+
+        self._refresh_derived(transactions)
+        return SyntheticDataset(
+            city=self.city,
+            district_ids=[district.id for district in districts],
+            house_ids=[house.id for house in houses],
+            admin_id=users[0].id,
+            counts={
+                "districts": len(districts),
+                "houses": len(houses),
+                "transactions": transactions,
+                "users": len(users),
+                "favorites": favorites,
+                "alerts": alerts,
+            },
+        )
+
+    def _districts(self) -> List[District]:
+        District.objects.bulk_create([
+            District(name=f"{self.city}-{index:03d}", city=self.city, description="合成基准数据")
+            for index in range(self.sizes["districts"])
+        ])
+        # MySQL 的 bulk_create 不回填主键, 统一重新查询
+        districts = list(District.objects.filter(city=self.city).order_by("id"))
+        # 每个区域的基准单价(元/平米)
+        self._base_unit_prices = {district.id: self.rng.uniform(20000, 100000) for district in districts}
+        return districts
+
+    def _users(self) -> List[User]:
+        # 哈希计算很慢, 所有合成用户共用同一个密码哈希
+        password = make_password(f"{self.city}-password")
+        users = []
+        for index in range(self.sizes["users"]):
+            if index == 0:
+                username, role = f"{self.city}_admin", "admin"
+            elif index <= max(1, self.sizes["users"] // 10):
+                username, role = f"{self.city}_agent{index:05d}", "agent"
+            else:
+                username, role = f"{self.city}_user{index:05d}", "user"
+            users.append(User(
+                username=username,
+                email=f"{username}@{self.city}.example.com",
+                phone=f"19{self.seed % 1000:03d}{index:06d}",
+                role=role,
+                password=password,
+                is_staff=role == "admin",
+                is_superuser=role == "admin",
+            ))
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        return list(User.objects.filter(username__startswith=f"{self.city}_").order_by("id"))
+
+    def _houses(self, districts: List[District], agents: List[User]) -> List[House]:
+        rng = self.rng
+        house_types, type_weights = zip(*HOUSE_TYPE_WEIGHTS)
+        statuses, status_weights = zip(*STATUS_WEIGHTS)
+        rows = []
+        for index in range(self.sizes["houses"]):
+            district = districts[index % len(districts)]
+            house_type = rng.choices(house_types, type_weights)[0]
+            area = Decimal(f"{rng.uniform(35, 60) * (house_types.index(house_type) + 1):.2f}")
+            unit_price = Decimal(f"{self._base_unit_prices[district.id] * rng.uniform(0.8, 1.2):.2f}")
+            total_floors = rng.randint(6, 33)
+            rows.append(House(
+                title=f"{rng.choice(TITLE_WORDS)}{index} {rng.choice(TITLE_FEATURES)}{house_type}",
+                district=district,
+                address=f"{district.name}路{rng.randint(1, 999)}号",
+                price=(area * unit_price / 10000).quantize(Decimal("0.01")),
+                unit_price=unit_price,
+                area=area,
+                house_type=house_type,
+                floor=rng.choice(["低层", "中层", "高层"]),
+                total_floors=total_floors,
+                orientation=rng.choice(ORIENTATIONS),
+                decoration=rng.choice(DECORATIONS),
+                build_year=rng.randint(1995, 2022),
+                longitude=Decimal(f"{CENTER[0] + rng.uniform(-SPREAD, SPREAD):.7f}"),
+                latitude=Decimal(f"{CENTER[1] + rng.uniform(-SPREAD, SPREAD):.7f}"),
+                description=f"{rng.choice(TITLE_FEATURES)}, {rng.choice(TITLE_FEATURES)}",
+                status=rng.choices(statuses, status_weights)[0],
+                agent=rng.choice(agents) if agents else None,
+                views=int(rng.paretovariate(1.2) * 10),
+            ))
+        House.objects.bulk_create(rows, batch_size=self.batch_size)
+        return list(
+            House.objects.filter(district__city=self.city).order_by("id")
+            .only("id", "district_id", "house_type", "price", "area")
+        )
+
+    def _transactions(self, houses: List[House]) -> int:
+        rng = self.rng
+        today = timezone.localdate()
+        days = self.years * 365
+        rows = []
+        created = 0
+        for _ in range(self.sizes["transactions"]):
+            house = rng.choice(houses)
+            age_days = rng.randint(0, days)
+            # 价格按月涨幅从当前挂牌价回推到成交日
+            level = (1 + MONTHLY_GROWTH) ** (-(age_days / 30.4))
+            rows.append(Transaction(
+                house_id=house.id,
+                deal_price=Decimal(f"{float(house.price) * level * rng.uniform(0.9, 1.05):.2f}"),
+                deal_date=today - timedelta(days=age_days),
+                buyer_name=f"买家{rng.randint(1, 99999)}",
+            ))
+            if len(rows) >= self.batch_size:
+                Transaction.objects.bulk_create(rows)
+                created += len(rows)
+                rows = []
+        if rows:
+            Transaction.objects.bulk_create(rows)
+            created += len(rows)
+        return created
+
+    def _favorites(self, users: List[User], houses: List[House]) -> int:
+        target = min(self.sizes["favorites"], len(users) * len(houses))
+        pairs = set()
+        while len(pairs) < target:
+            pairs.add((self.rng.choice(users).id, self.rng.choice(houses).id))
+        Favorite.objects.bulk_create(
+            [Favorite(user_id=user_id, house_id=house_id) for user_id, house_id in sorted(pairs)],
+            batch_size=self.batch_size,
+        )
+        return len(pairs)
+
+    def _alerts(self, users: List[User], houses: List[House]) -> int:
+        rng = self.rng
+        rows = []
+        for _ in range(self.sizes["alerts"]):
+            house = rng.choice(houses)
+            rows.append(PriceAlert(
+                user=rng.choice(users),
+                house_id=house.id,
+                # 约三成提醒的目标价高于当前价, 检查时会被触发
+                target_price=(house.price * Decimal(f"{rng.uniform(0.85, 1.05):.4f}")).quantize(Decimal("0.01")),
+                current_price=house.price,
+            ))
+        PriceAlert.objects.bulk_create(rows, batch_size=self.batch_size)
+        return len(rows)
+
+    def _refresh_derived(self, transactions: int) -> None:
+        """
+        bulk_create 不触发信号, 手动刷新区域统计、单价立方体和响应缓存版本
+        """
+        from apps.analysis.models import DistrictStats, UnitPriceCube
+
+        DistrictStats.refresh(district_ids=list(self._base_unit_prices))
+        if transactions:
+            UnitPriceCube.rebuild(since=timezone.localdate() - timedelta(days=self.years * 365))
+        bump_version("district", "house", "transaction", "district_stats")
+
+
+def add_dataset_arguments(parser) -> None:
+    """
+    为管理命令添加合成数据规模参数
+    """
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（默认：42）")
+    parser.add_argument("--city", default=DEFAULT_CITY, help=f"合成数据所属城市名（默认：{DEFAULT_CITY}）")
+    parser.add_argument("--districts", type=int, default=10, help="区域数（默认：10）")
+    parser.add_argument("--houses", type=int, default=5000, help="房源数（默认：5000）")
+    parser.add_argument("--transactions", type=int, default=20000, help="成交记录数（默认：20000）")
+    parser.add_argument("--users", type=int, default=200, help="用户数, 其中约一成为经纪人（默认：200）")
+    parser.add_argument("--favorites", type=int, default=2000, help="收藏数（默认：2000）")
+    parser.add_argument("--alerts", type=int, default=1000, help="价格提醒数（默认：1000）")
+    parser.add_argument("--years", type=int, default=2, help="成交记录覆盖年数（默认：2）")
+
+
+def generator_from_options(options: Dict[str, Any]) -> SyntheticDataGenerator:
+    return SyntheticDataGenerator(**{
+        name: options[name]
+        for name in ("seed", "city", "districts", "houses", "transactions", "users", "favorites", "alerts", "years")
+    })
+
+
+def flush_dataset(city: str = DEFAULT_CITY) -> int:
+    """
+    删除某个城市的全部合成数据, 返回删除的区域数
+    """
+    deleted = District.objects.filter(city=city).count()
+    District.objects.filter(city=city).delete()
+    User.objects.filter(username__startswith=f"{city}_").delete()
+    bump_version("district", "house", "transaction", "district_stats")
+    return deleted
+
+
+def legacy_price_trend(district_id: Optional[int] = None, days: int = 180) -> Dict[str, Any]:
+    """
+    price_trend 改为数据库分组统计之前的实现: 逐条加载成交记录后用 pandas 按月汇总,
+    仅用于基准对比, 输出与接口一致
+    """
+    import pandas as pd
+
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days)
+    transactions = Transaction.objects.filter(
+        deal_date__gte=start_date, deal_date__lte=end_date
+    ).select_related("house", "house__district")
+    if district_id:
+        transactions = transactions.filter(house__district_id=district_id)
+    if not transactions.exists():
+        return {"trend": [], "summary": {}}
+
+    df = pd.DataFrame([
+        {
+            "date": t.deal_date,
+            "price": float(t.deal_price),
+            "area": float(t.house.area),
+            "unit_price": float(t.deal_price * 10000 / t.house.area),
+        }
+        for t in transactions
+    ])
+    df["month"] = pd.to_datetime(df["date"]).dt.to_period("M")
+    monthly_stats = df.groupby("month").agg({
+        "price": "mean",
+        "unit_price": "mean",
+        "date": "count",
+    }).reset_index()
+
+    trend = [
+        {
+            "month": str(row["month"]),
+            "avg_price": round(row["price"], 2),
+            "avg_unit_price": round(row["unit_price"], 2),
+            "transaction_count": int(row["date"]),
+        }
+        for _, row in monthly_stats.iterrows()
+    ]
+    summary = {
+        "avg_price": round(df["price"].mean(), 2),
+        "max_price": round(df["price"].max(), 2),
+        "min_price": round(df["price"].min(), 2),
+        "avg_unit_price": round(df["unit_price"].mean(), 2),
+        "total_transactions": len(df),
+    }
+    return {"trend": trend, "summary": summary}
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[], Any]
+    # 每次计时前执行, 不计入耗时
+    setup: Optional[Callable[[], None]] = None
+    # 有副作用、只能执行一次的场景
+    once: bool = False
+
+
+def _percentile(values: List[float], quantile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(quantile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class BenchmarkRunner:
+    """
+    逐项执行场景, 记录耗时(最小值/中位数/p95)、SQL 条数和响应状态
+    """
+
+    def __init__(self, dataset: SyntheticDataset, repeat: int = 5, warmup: int = 1,
+                 response_cache: bool = False, seed: int = 42) -> None:
+        from rest_framework.test import APIClient
+
+        self.dataset = dataset
+        self.repeat = max(1, repeat)
+        self.warmup = max(0, warmup)
+        self.response_cache = response_cache
+        self.rng = random.Random(seed)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=dataset.admin_id))
+
+    def scenarios(self) -> List[Scenario]:
+        from apps.analysis.forecast import forecast_cache_key
+
+        dataset = self.dataset
+        district_id = dataset.district_ids[0]
+        house_id = dataset.house_ids[len(dataset.house_ids) // 2]
+        deep_page = max(1, min(50, len(dataset.house_ids) // 20))
+        lon, lat = CENTER
+        bbox = f"{lon - 0.05},{lat - 0.05},{lon + 0.05},{lat + 0.05}"
+        city_bbox = f"{lon - SPREAD},{lat - SPREAD},{lon + SPREAD},{lat + SPREAD}"
+        batch_items = [
+            {"district_id": self.rng.choice(dataset.district_ids),
+             "house_type": self.rng.choice(HOUSE_TYPE_WEIGHTS)[0],
+             "area": self.rng.randint(40, 160)}
+            for _ in range(50)
+        ]
+
+        def get(path):
+            return lambda: self.client.get(path)
+
+        def post(path, data):
+            return lambda: self.client.post(path, data, format="json")
+
+        def clear_forecast_cache():
+            cache.delete(forecast_cache_key(district_id, timezone.localdate()))
+
+        return [
+            Scenario("districts.list", get("/api/districts/")),
+            Scenario("houses.list", get("/api/houses/")),
+            Scenario("houses.list_deep_page", get(f"/api/houses/?page={deep_page}")),
+            Scenario("houses.list_cursor", get("/api/houses/?cursor=&ordering=-price")),
+            Scenario("houses.search", get(f"/api/houses/?search={TITLE_WORDS[0]}")),
+            Scenario("houses.filter", get(
+                f"/api/houses/?district={district_id}&house_type=2室&status=available"
+                f"&min_price=100&max_price=800&ordering=-unit_price"
+            )),
+            Scenario("houses.retrieve", get(f"/api/houses/{house_id}/")),
+            Scenario("houses.map_data", get("/api/houses/map_data/")),
+            Scenario("houses.map_data_clustered", get(f"/api/houses/map_data/?bbox={city_bbox}&zoom=10")),
+            Scenario("houses.map_data_bbox", get(f"/api/houses/map_data/?bbox={bbox}&zoom=15")),
+            Scenario("houses.hot_houses", get("/api/houses/hot_houses/")),
+            Scenario("houses.stats", get("/api/houses/stats/")),
+            Scenario("analysis.price_trend", get(f"/api/analysis/price_trend/?district_id={district_id}&days=365")),
+            # 旧版逐行 + pandas 实现, 与上一项对比
+            Scenario("analysis.price_trend_legacy", lambda: legacy_price_trend(district_id, days=365)),
+            Scenario("analysis.district_comparison", get("/api/analysis/district_comparison/")),
+            Scenario("analysis.house_type_distribution", get("/api/analysis/house_type_distribution/")),
+            Scenario("analysis.price_range_distribution", get("/api/analysis/price_range_distribution/")),
+            Scenario("analysis.predict_price", post(
+                "/api/analysis/predict_price/", {"district_id": district_id, "house_type": "2室", "area": 89}
+            )),
+            Scenario("analysis.predict_price_batch", post("/api/analysis/predict_price/batch/", {"items": batch_items})),
+            Scenario("analysis.district_heat_map", get("/api/analysis/district_heat_map/")),
+            Scenario("analysis.roi_analysis", post(
+                "/api/analysis/roi_analysis/",
+                {"house_id": house_id, "purchase_price": 500, "monthly_rent": 8000, "property_fee": 400},
+            )),
+            Scenario("analysis.market_trend_forecast",
+                     get(f"/api/analysis/market_trend_forecast/?district_id={district_id}"),
+                     setup=None if self.response_cache else clear_forecast_cache),
+            Scenario("analysis.cache_stats", get("/api/analysis/cache_stats/")),
+            Scenario("analysis.profiling_stats", get("/api/analysis/profiling_stats/")),
+        ] + self._task_scenarios()
+
+    def _task_scenarios(self) -> List[Scenario]:
+        from apps.tasks.excel_importer import FangExcelImporter
+        from apps.tasks.tasks import check_price_alerts, generate_market_report
+
+        records = self._import_records(500)
+        changed = [dict(record, price_total_wan=record["price_total_wan"] + 1) for record in records]
+        importer = FangExcelImporter(chunk_size=500)
+        return [
+            Scenario("tasks.import_records_new", lambda: importer.import_records(records, source="benchmark"),
+                     once=True),
+            Scenario("tasks.import_records_unchanged", lambda: importer.import_records(records, source="benchmark")),
+            Scenario("tasks.import_records_changed", lambda: importer.import_records(changed, source="benchmark"),
+                     once=True),
+            Scenario("tasks.check_price_alerts", check_price_alerts, once=True),
+            Scenario("tasks.generate_market_report_all",
+                     lambda: generate_market_report(all_districts=True, report_type="all")),
+        ]
+
+    def _import_records(self, count: int) -> List[Dict[str, Any]]:
+        from apps.tasks.fang_scraper import FangListing
+        from apps.tasks.record_reader import clean_record
+
+        rng = self.rng
+        records = []
+        for index in range(count):
+            rooms = rng.randint(1, 5)
+            area = round(rng.uniform(35, 60) * rooms, 2)
+            price = round(area * rng.uniform(2, 8), 2)
+            listing = FangListing(
+                source_id=f"{self.dataset.city}-{index:06d}",
+                title=f"{rng.choice(TITLE_WORDS)}{index} {rng.choice(TITLE_FEATURES)}",
+                house_url=f"https://esf.example.com/chushou/{index}.htm",
+                layout=f"{rooms}室1厅",
+                house_type=f"{rooms}室",
+                area_sqm=area,
+                floor="中层",
+                total_floors=rng.randint(6, 33),
+                orientation=rng.choice(ORIENTATIONS),
+                price_total_wan=price,
+                unit_price=round(price * 10000 / area, 2),
+                agent_name=f"经纪人{index % 20}",
+                agent_store_url="",
+                agent_id=f"{self.dataset.city}-agent-{index % 20}",
+                community=f"小区{index % 50}",
+                region="合成",
+                district_name=f"{self.dataset.city}-import-{index % 5}",
+                sub_district="",
+                address=f"合成路{index}号",
+                tags=[rng.choice(TITLE_FEATURES)],
+                cover_image="",
+                status="available",
+                decoration=rng.choice(DECORATIONS),
+                build_year=rng.randint(1995, 2022),
+                description="合成导入数据",
+                longitude=round(CENTER[0] + rng.uniform(-SPREAD, SPREAD), 6),
+                latitude=round(CENTER[1] + rng.uniform(-SPREAD, SPREAD), 6),
+                city=self.dataset.city,
+                scraped_at="2026-01-01T00:00:00+08:00",
+            )
+            records.append(clean_record(listing.as_dict()))
+        return records
+
+    def run(self, only: Optional[List[str]] = None,
+            on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        results = {}
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"],
+                RESPONSE_CACHE_ENABLED=self.response_cache,
+                EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            ))
+            stack.enter_context(_eager_celery())
+            for scenario in self.scenarios():
+                if only and not any(scenario.name.startswith(prefix) for prefix in only):
+                    continue
+                results[scenario.name] = self._measure(scenario)
+                if on_result is not None:
+                    on_result(scenario.name, results[scenario.name])
+        return {"meta": self.metadata(), "results": results}
+
+    def _measure(self, scenario: Scenario) -> Dict[str, Any]:
+        runs = 1 if scenario.once else self.repeat
+        warmup = 0 if scenario.once else self.warmup
+        timings, queries, outcome = [], 0, None
+        for attempt in range(warmup + runs):
+            if scenario.setup is not None:
+                scenario.setup()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                outcome = scenario.run()
+                elapsed = time.perf_counter() - started
+            if attempt >= warmup:
+                timings.append(elapsed * 1000)
+                queries = len(captured)
+
+        result = {
+            "runs": runs,
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(_percentile(timings, 0.95), 3),
+            "queries": queries,
+        }
+        status_code = getattr(outcome, "status_code", None)
+        if status_code is not None:
+            result["status"] = status_code
+            result["bytes"] = len(outcome.content)
+        return result
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "commit": _git_commit(),
+            "timestamp": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "dataset": dict(self.dataset.counts),
+            "repeat": self.repeat,
+            "response_cache": self.response_cache,
+        }
+
+
+@contextmanager
+def _eager_celery():
+    """
+    基准期间任务在进程内同步执行, 不依赖消息队列
+    """
+    from celery import current_app
+
+    previous = current_app.conf.task_always_eager
+    current_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        current_app.conf.task_always_eager = previous
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    与基线结果逐项对比, 中位数耗时增幅超过 threshold 或 SQL 条数增加时标记为回归
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] if before["median_ms"] else 0
+        rows.append({
+            "name": name,
+            "baseline_ms": before["median_ms"],
+            "current_ms": result["median_ms"],
+            "change": round(change, 4),
+            "baseline_queries": before["queries"],
+            "current_queries": result["queries"],
+            "regression": change > threshold or result["queries"] > before["queries"],
+        })
+    return rows
+
+
+def write_results(results: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -0,0 +1,278 @@
+"""
+旧数据分批清理: 按主键顺序分批删除过期的已售房源和成交记录, 可选在删除前归档.
+
+每批只选取 batch_size 个主键, 在一个短事务内完成 归档 -> 删除子表 -> 删除主表,
+批次之间暂停 pause 秒, 避免长时间持有行锁阻塞接口写入. 子表没有进一步的级联和
+删除信号依赖时使用原生删除, 不再把级联对象逐个加载到内存; 被绕过的信号副作用
+(响应缓存版本号、成交单价立方体、区域统计)在清理结束后统一处理.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+from apps.common.cache import bump_version
+from apps.houses.models import House, Transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE_SECONDS = 0.2
+DEFAULT_RETENTION_DAYS = 730
+ARCHIVE_FORMATS = ("jsonl", "parquet")
+
+
+@dataclass
+class CleanupStats:
+    houses: int = 0
+    transactions: int = 0
+    related: Dict[str, int] = field(default_factory=dict)
+    batches: int = 0
+    archived_files: List[str] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "houses": self.houses,
+            "transactions": self.transactions,
+            "related": dict(self.related),
+            "batches": self.batches,
+            "archived_files": list(self.archived_files),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+        }
+
+
+class CleanupArchive:
+    """
+    删除前的归档写入器, 每张表一个 gzip 压缩的 JSONL 文件; parquet 格式每批每表写一个文件.
+    """
+
+    def __init__(self, directory: Path, archive_format: str = "jsonl") -> None:
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式: {archive_format}")
+        self.directory = Path(directory)
+        self.archive_format = archive_format
+        self._handles: Dict[str, Any] = {}
+        self._parquet_parts: Dict[str, int] = {}
+        self.files: List[str] = []
+
+    def write(self, model: type[models.Model], rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        table = model._meta.db_table
+        if self.archive_format == "parquet":
+            self._write_parquet(table, rows)
+            return
+        handle = self._handles.get(table)
+        if handle is None:
+            path = self.directory / f"{table}.jsonl.gz"
+            handle = self._handles[table] = gzip.open(path, "at", encoding="utf-8")
+            self.files.append(str(path))
+        for row in rows:
+            handle.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            handle.write("\n")
+        # 每批落盘后再删除数据库记录
+        handle.flush()
+
+    def _write_parquet(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("parquet 归档需要安装 pyarrow") from exc
+
+        part = self._parquet_parts.get(table, 0) + 1
+        self._parquet_parts[table] = part
+        path = self.directory / f"{table}-{part:05d}.parquet"
+        pq.write_table(pa.Table.from_pylist(rows), path, compression="zstd")
+        self.files.append(str(path))
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+
+class ChunkedDataCleaner:
+    """
+    清理超过保留期的已售房源(连同其图片、成交、收藏、提醒)和成交记录.
+    """
+
+    def __init__(
+        self,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        pause: float = DEFAULT_PAUSE_SECONDS,
+        archive: Optional[CleanupArchive] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.retention_days = retention_days
+        self.batch_size = max(1, batch_size)
+        self.pause = max(0.0, pause)
+        self.archive = archive
+        self.on_progress = on_progress
+        self.cutoff = timezone.now() - timedelta(days=retention_days)
+        # 被删除成交记录所在的 (区域, 户型, 月份) 单价单元, 清理后统一重算
+        self._touched_cells: Set[Tuple[int, str, Any]] = set()
+        # 删除了房源的区域, 清理后连同上面单元所在的区域一起刷新区域统计
+        self._touched_districts: Set[int] = set()
+
+    @classmethod
+    def from_settings(cls, archive: Optional[bool] = None, **overrides: Any) -> "ChunkedDataCleaner":
+        if archive is None:
+            archive = getattr(settings, "CLEANUP_ARCHIVE_ENABLED", False)
+        options = {
+            "retention_days": getattr(settings, "CLEANUP_RETENTION_DAYS", DEFAULT_RETENTION_DAYS),
+            "batch_size": getattr(settings, "CLEANUP_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+            "pause": getattr(settings, "CLEANUP_PAUSE_SECONDS", DEFAULT_PAUSE_SECONDS),
+        }
+        if archive:
+            directory = Path(getattr(settings, "CLEANUP_ARCHIVE_DIR", Path(settings.BASE_DIR) / "data" / "archive"))
+            options["archive"] = CleanupArchive(
+                directory / timezone.now().strftime("%Y%m%d-%H%M%S"),
+                getattr(settings, "CLEANUP_ARCHIVE_FORMAT", "jsonl"),
+            )
+        options.update(overrides)
+        return cls(**options)
+
+    def run(self) -> CleanupStats:
+        stats = CleanupStats()
+        started = time.monotonic()
+        try:
+            self._purge(
+                House.objects.filter(status="sold", updated_at__lt=self.cutoff),
+                stats, "houses",
+            )
+            self._purge(Transaction.objects.filter(deal_date__lt=self.cutoff.date()), stats, "transactions")
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+                stats.archived_files = list(self.archive.files)
+            stats.elapsed_seconds = time.monotonic() - started
+            self._after_purge(stats)
+        logger.info("旧数据清理完成: %s", stats.to_dict())
+        return stats
+
+    def _purge(self, queryset: models.QuerySet, stats: CleanupStats, counter: str) -> None:
+        """
+        按主键递增分批删除 queryset 匹配的记录; 每批从上一批最大主键之后继续扫描
+        """
+        model = queryset.model
+        children = self._cascade_children(model)
+        last_pk = 0
+        while True:
+            batch_started = time.monotonic()
+            candidates = list(
+                queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:self.batch_size]
+            )
+            if not candidates:
+                return
+            with transaction.atomic():
+                # 只按主键锁定本批记录, 并在锁定后重新校验清理条件
+                pks = list(queryset.filter(pk__in=candidates).select_for_update().values_list("pk", flat=True))
+                deleted = self._delete_batch(model, pks, children, stats) if pks else 0
+            last_pk = candidates[-1]
+            setattr(stats, counter, getattr(stats, counter) + deleted)
+            stats.batches += 1
+            self._report(stats, model, time.monotonic() - batch_started)
+            if len(candidates) < self.batch_size:
+                return
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _delete_batch(self, model, pks, children, stats: CleanupStats) -> int:
+        if model is House:
+            self._touched_districts.update(
+                House.objects.filter(pk__in=pks).order_by().values_list("district_id", flat=True).distinct()
+            )
+        if children is None:
+            # 存在多级级联或非 CASCADE 外键, 退回 ORM 删除, 批量大小依然受控
+            self._archive(model, model.objects.filter(pk__in=pks))
+            _, per_model = model.objects.filter(pk__in=pks).delete()
+            for label, count in per_model.items():
+                if label != model._meta.label:
+                    stats.related[label] = stats.related.get(label, 0) + count
+            return per_model.get(model._meta.label, 0)
+
+        parents = model.objects.filter(pk__in=pks)
+        self._archive(model, parents)
+        for child, field_name in children:
+            rows = child.objects.filter(**{f"{field_name}__in": pks})
+            self._archive(child, rows)
+            count = self._raw_delete(rows)
+            if count:
+                stats.related[child._meta.label] = stats.related.get(child._meta.label, 0) + count
+        return self._raw_delete(parents)
+
+    def _raw_delete(self, queryset: models.QuerySet) -> int:
+        if queryset.model is Transaction:
+            self._touched_cells.update(
+                queryset.values_list("house__district_id", "house__house_type", "deal_date__year", "deal_date__month")
+                .distinct()
+            )
+        # 跳过级联收集和逐行信号, 直接执行 DELETE ... WHERE
+        return queryset._raw_delete(queryset.db)
+
+    @staticmethod
+    def _cascade_children(model) -> Optional[List[Tuple[type[models.Model], str]]]:
+        """
+        返回可直接原生删除的子表 (模型, 外键字段名) 列表;
+        子表还有下级关联, 或外键不是 CASCADE 时返回 None, 由 ORM 处理
+        """
+        children = []
+        for relation in model._meta.related_objects:
+            if relation.many_to_many or relation.on_delete is not models.CASCADE:
+                return None
+            child = relation.related_model
+            if child._meta.related_objects:
+                return None
+            children.append((child, relation.field.name))
+        return children
+
+    def _archive(self, model, queryset: models.QuerySet) -> None:
+        if self.archive is not None:
+            self.archive.write(model, list(queryset.values()))
+
+    def _report(self, stats: CleanupStats, model, batch_seconds: float) -> None:
+        progress = {
+            "model": model._meta.label,
+            "batches": stats.batches,
+            "houses": stats.houses,
+            "transactions": stats.transactions,
+            "related": dict(stats.related),
+            "batch_seconds": round(batch_seconds, 3),
+        }
+        logger.info("旧数据清理进度: %s", progress)
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    def _after_purge(self, stats: CleanupStats) -> None:
+        """
+        补做原生删除绕过的信号副作用
+        """
+        from apps.analysis.models import DistrictStats, UnitPriceCube
+
+        if stats.houses or stats.related:
+            bump_version("house")
+        if stats.transactions or Transaction._meta.label in stats.related:
+            bump_version("transaction")
+        for district_id, house_type, year, month in sorted(self._touched_cells):
+            UnitPriceCube.refresh_cell(district_id, house_type, date(year, month, 1))
+        district_ids = self._touched_districts | {district_id for district_id, _, _, _ in self._touched_cells}
+        if district_ids:
+            DistrictStats.refresh(district_ids=sorted(district_ids))
+            bump_version("district_stats")
+        self._touched_cells.clear()
+        self._touched_districts.clear()
@@ -1,29 +1,45 @@
 """
-Excel 导入工具: 负责扫描 data 目录中的爬虫 Excel, 将其写入数据库.
+Excel 导入工具: 负责扫描 data 目录中的爬虫 Excel/CSV/Parquet, 将其写入数据库.
 """
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
 import random
 import re
 import shutil
+import time
+from collections import defaultdict
 from dataclasses import dataclass
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import pandas as pd
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 
+from apps.analysis.signals import schedule_moved_houses
+from apps.common.cache import bump_version
+from apps.favorites.signals import enqueue_price_alert_checks
 from apps.houses.models import District, House, HouseImage
+from apps.tasks.record_reader import SUPPORTED_SUFFIXES, batched, iter_record_batches
 from apps.users.models import User
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CITY = "北京"
 PHONE_PREFIXES = ["131", "132", "133", "134", "135", "136", "137", "138", "139", "150", "151", "152"]
+DEFAULT_CHUNK_SIZE = 1000
+AGENT_EMAIL_DOMAIN = "agents.fang.local"
+
+# 来源内容字段: 参与内容摘要计算, 重新导入时仅更新其中发生变化的列.
+# 封面图、装修、建造年份和经纬度由导入器或爬虫随机生成, 只在创建时写入; 浏览量从不覆盖.
+HOUSE_UPDATE_FIELDS = [
+    "title", "district", "address", "price", "unit_price", "area", "house_type", "floor",
+    "total_floors", "orientation", "description", "status", "agent",
+]
 
 @dataclass
 class ImportStats:
@@ -31,8 +47,12 @@ class ImportStats:
     created: int = 0
     updated: int = 0
     skipped: int = 0
+    skipped_unchanged: int = 0
     errors: int = 0
+    # 已读取并写库的行数; 中途失败时即失败位置
+    offset: int = 0
     error_messages: List[str] = None
+    chunk_timings: List[Dict[str, Any]] = None
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -40,32 +60,51 @@ class ImportStats:
             "created": self.created,
             "updated": self.updated,
             "skipped": self.skipped,
+            "skipped_unchanged": self.skipped_unchanged,
             "errors": self.errors,
+            "offset": self.offset,
             "error_messages": self.error_messages or [],
+            "chunk_timings": self.chunk_timings or [],
         }
 
 
 class FangExcelImporter:
     """
-    读取 data 目录下的 Excel 文件, 将其内容同步到 House / District / User.
+    读取 data 目录下的 Excel/CSV/Parquet 文件, 将其内容同步到 House / District / User.
+
+    batch=True(默认) 时整表一次性解析区域与经纪人, 按 chunk_size 分块批量写入;
+    batch=False 时逐行 update_or_create.
     """
 
-    def __init__(self, data_dir: Optional[Path] = None) -> None:
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        batch: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
         base_dir = Path(settings.BASE_DIR)
         self.data_dir = data_dir or (base_dir / "data")
+        self.batch = batch
+        self.chunk_size = max(1, chunk_size)
         self.processed_dir = self.data_dir / "processed"
         self.processed_dir.mkdir(parents=True, exist_ok=True)
+        # 已部分导入后失败的文件移到此处, 避免每次调度重复导入
+        self.failed_dir = self.data_dir / "failed"
         self.placeholder_images = self._load_placeholder_images()
 
     def run(self) -> Dict[str, Any]:
         if not self.data_dir.exists():
             logger.info("Data directory %s does not exist, skipping import.", self.data_dir)
-            return {"files": [], "total_created": 0, "total_updated": 0, "total_errors": 0}
+            return {"files": [], "total_created": 0, "total_updated": 0,
+                    "total_skipped_unchanged": 0, "total_errors": 0}
 
-        excel_files = sorted(self.data_dir.glob("*.xlsx"))
+        data_files = sorted(
+            path for path in self.data_dir.iterdir()
+            if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES
+        )
         results: List[ImportStats] = []
 
-        for file_path in excel_files:
+        for file_path in data_files:
             stats = self._process_file(file_path)
             results.append(stats)
 
@@ -73,37 +112,98 @@ class FangExcelImporter:
             "files": [stat.to_dict() for stat in results],
             "total_created": sum(stat.created for stat in results),
             "total_updated": sum(stat.updated for stat in results),
+            "total_skipped_unchanged": sum(stat.skipped_unchanged for stat in results),
             "total_errors": sum(stat.errors for stat in results),
         }
+        if summary["total_created"] or summary["total_updated"]:
+            # 批量写入不触发模型信号, 这里统一让房源相关的接口缓存失效
+            bump_version("house", "district")
         logger.info(
-            "Excel import completed: %s created, %s updated, %s errors",
+            "Excel import completed: %s created, %s updated, %s unchanged, %s errors",
             summary["total_created"],
             summary["total_updated"],
+            summary["total_skipped_unchanged"],
             summary["total_errors"],
         )
         return summary
 
+    def import_records(self, records: Iterable[Dict[str, Any]], source: str = "stream") -> ImportStats:
+        """
+        直接导入内存中的记录流(字段与导出文件的列一致), 不经过文件落地和归档.
+        记录按 chunk_size 边到达边写库, 供爬虫直连入库使用.
+        """
+        stats = ImportStats(file=source, error_messages=[], chunk_timings=[])
+        offset = 0
+        for chunk in batched(records, self.chunk_size):
+            if self.batch:
+                self._import_records_batch(chunk, stats, source, offset=offset)
+            else:
+                self._import_records(chunk, stats, source)
+            offset += len(chunk)
+
+        if stats.created or stats.updated:
+            bump_version("house", "district")
+        logger.info(
+            "Record stream %s imported: %s created, %s updated, %s unchanged, %s errors",
+            source, stats.created, stats.updated, stats.skipped_unchanged, stats.errors,
+        )
+        return stats
+
     def _process_file(self, file_path: Path) -> ImportStats:
-        stats = ImportStats(file=str(file_path), error_messages=[])
-        logger.info("Processing Excel file: %s", file_path)
+        stats = ImportStats(file=str(file_path), error_messages=[], chunk_timings=[])
+        logger.info("Processing data file: %s", file_path)
+
+        # 流式分批读取, 每批读入后立即写库, 不在内存中保留整张表.
+        # 读取与写库的异常分开捕获, 便于区分文件损坏和数据问题
+        batches = iter_record_batches(file_path, self.chunk_size)
         try:
-            df = pd.read_excel(file_path)
-        except Exception as exc:
-            stats.errors += 1
-            stats.error_messages.append(f"读取失败: {exc}")
-            logger.exception("Failed to read Excel file %s", file_path)
-            return stats
+            while True:
+                try:
+                    records = next(batches, None)
+                except Exception as exc:
+                    logger.exception("Failed to read data file %s after %s rows", file_path, stats.offset)
+                    self._fail_file(file_path, stats, f"读取失败(已处理 {stats.offset} 行): {exc}")
+                    return stats
+                if records is None:
+                    break
+
+                try:
+                    if self.batch:
+                        self._import_records_batch(records, stats, file_path, offset=stats.offset)
+                    else:
+                        self._import_records(records, stats, file_path)
+                except Exception as exc:
+                    logger.exception("Failed to import rows %s-%s of %s",
+                                     stats.offset, stats.offset + len(records), file_path)
+                    self._fail_file(file_path, stats, f"导入失败(第 {stats.offset + 1} 行起): {exc}")
+                    return stats
+                stats.offset += len(records)
+        finally:
+            batches.close()
+
+        self._archive_file(file_path)
+        return stats
 
-        df = df.where(pd.notnull(df), None)
-        records = df.to_dict("records")
+    def _fail_file(self, file_path: Path, stats: ImportStats, message: str) -> None:
+        """
+        记录文件级失败. 尚未写入任何行时保留在原目录等待下次重试;
+        已部分导入时移到 failed 目录, 由人工处理后再放回
+        """
+        stats.errors += 1
+        stats.error_messages.append(message)
+        if stats.offset:
+            self._archive_file(file_path, self.failed_dir, suffix=f"_failed_at_{stats.offset}")
 
+    def _import_records(self, records: List[Dict[str, Any]], stats: ImportStats, file_path: Path) -> None:
         for row in records:
             if not row.get("title"):
                 stats.skipped += 1
                 continue
             try:
                 created = self._import_row(row)
-                if created:
+                if created is None:
+                    stats.skipped_unchanged += 1
+                elif created:
                     stats.created += 1
                 else:
                     stats.updated += 1
@@ -112,35 +212,328 @@ class FangExcelImporter:
                 logger.exception("Failed to import row from %s: %s", file_path, exc)
                 stats.error_messages.append(str(exc))
 
-        self._archive_file(file_path)
-        return stats
+    def _import_records_batch(
+        self,
+        records: List[Dict[str, Any]],
+        stats: ImportStats,
+        file_path: Path,
+        offset: int = 0,
+    ) -> None:
+        rows = []
+        for row in records:
+            if not row.get("title"):
+                stats.skipped += 1
+                continue
+            rows.append(row)
+        if not rows:
+            return
+
+        districts = self._resolve_districts(rows)
+        agents = self._resolve_agents(rows)
+        default_agent = self._default_agent()
+
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    created, updated, unchanged = self._import_chunk(chunk, districts, agents, default_agent)
+                stats.created += created
+                stats.updated += updated
+                stats.skipped_unchanged += unchanged
+            except Exception as exc:
+                # 整块失败时逐行重试, 定位并跳过有问题的行
+                logger.warning("Batch chunk %s-%s of %s failed (%s), retrying row by row",
+                               offset + start, offset + start + len(chunk), file_path, exc)
+                self._import_records(chunk, stats, file_path)
+
+            elapsed = time.perf_counter() - started
+            stats.chunk_timings.append({"offset": offset + start, "rows": len(chunk), "seconds": round(elapsed, 3)})
+            logger.info("Imported rows %s-%s of %s in %.3fs",
+                        offset + start, offset + start + len(chunk), file_path, elapsed)
+
+    def _import_chunk(
+        self,
+        rows: List[Dict[str, Any]],
+        districts: Dict[str, District],
+        agents: Dict[str, User],
+        default_agent: Optional[User],
+    ) -> Tuple[int, int, int]:
+        # 同一块内按来源ID(缺失时按标题、区域、地址)去重, 后出现的行覆盖先出现的行
+        houses: Dict[Tuple, Dict[str, Any]] = {}
+        duplicates = 0
+        for row in rows:
+            district = districts[self._district_name(row)]
+            agent = agents.get((row.get("agent_name") or "").strip()) or default_agent
+            house_data = self._build_house_defaults(row, district, agent)
+            key = self._house_key(house_data)
+            if key in houses:
+                duplicates += 1
+            houses[key] = house_data
+
+        existing = self._existing_houses(houses)
+
+        # 内容摘要一致的行直接跳过, 不产生任何写入
+        to_create: Dict[Tuple, House] = {}
+        changed: Dict[int, Dict[str, Any]] = {}
+        unchanged = 0
+        for key, house_data in houses.items():
+            match = existing.get(key)
+            if match is None:
+                to_create[key] = House(**house_data)
+            elif match[1] == house_data["content_hash"]:
+                unchanged += 1
+            else:
+                changed[match[0]] = house_data
+
+        House.objects.bulk_create(list(to_create.values()), batch_size=self.chunk_size)
+        if any(house.pk is None for house in to_create.values()):
+            # MySQL 批量插入不回填主键, 按来源ID或自然键补查
+            created_data = {key: houses[key] for key in to_create}
+            for key, (house_id, _) in self._existing_houses(created_data).items():
+                to_create[key].pk = house_id
+        updated = self._update_changed_houses(changed)
+
+        self._ensure_house_images(list(to_create.values()))
+        return len(to_create), updated + duplicates, unchanged
+
+    def _update_changed_houses(self, changed: Dict[int, Dict[str, Any]]) -> int:
+        """
+        只写入内容发生变化的列: 按变化列的组合分组, 每组一次 bulk_update.
+        bulk_update 不发送 post_save, 价格提醒检查和单价立方体重算在这里直接登记
+        """
+        if not changed:
+            return 0
+        now = timezone.now()
+        groups: Dict[Tuple[str, ...], List[House]] = defaultdict(list)
+        repriced: List[int] = []
+        # 单价单元按 (区域, 户型) 归组, 成交单价按房源面积折算
+        moved: Dict[int, Tuple[int, str]] = {}
+        for house in House.objects.filter(pk__in=list(changed)):
+            house_data = changed[house.pk]
+            fields = [
+                name for name in HOUSE_UPDATE_FIELDS
+                if self._field_value(house, name) != self._data_value(house_data, name)
+            ]
+            if "price" in fields:
+                repriced.append(house.pk)
+            if {"district", "house_type", "area"} & set(fields):
+                moved[house.pk] = (house.district_id, house.house_type)
+            for name in fields:
+                setattr(house, name, house_data[name])
+            house.source_id = house_data["source_id"] or house.source_id
+            house.content_hash = house_data["content_hash"]
+            house.updated_at = now
+            groups[tuple(fields)].append(house)
+
+        for fields, group in groups.items():
+            House.objects.bulk_update(
+                group, list(fields) + ["source_id", "content_hash", "updated_at"], batch_size=self.chunk_size
+            )
+
+        if repriced:
+            transaction.on_commit(lambda: enqueue_price_alert_checks(repriced))
+        schedule_moved_houses(moved)
+        return sum(len(group) for group in groups.values())
+
+    @staticmethod
+    def _field_value(house: House, name: str) -> Any:
+        if name in ("district", "agent"):
+            return getattr(house, f"{name}_id")
+        return getattr(house, name)
+
+    @staticmethod
+    def _data_value(house_data: Dict[str, Any], name: str) -> Any:
+        value = house_data[name]
+        if name in ("district", "agent"):
+            return value.pk if value is not None else None
+        return value
+
+    @staticmethod
+    def _house_key(house_data: Dict[str, Any]) -> Tuple:
+        if house_data["source_id"]:
+            return ("source", house_data["source_id"])
+        return ("natural", house_data["title"], house_data["district"].id, house_data["address"])
+
+    def _existing_houses(self, houses: Dict[Tuple, Dict[str, Any]]) -> Dict[Tuple, Tuple[int, str]]:
+        """
+        查找已存在的房源, 返回 {键: (房源ID, 内容摘要)}.
+        先按来源ID匹配; 未匹配的行再按 (标题, 区域, 地址) 匹配尚未记录来源ID的旧数据.
+        """
+        if not houses:
+            return {}
+        existing: Dict[Tuple, Tuple[int, str]] = {}
+
+        source_ids = {data["source_id"] for data in houses.values() if data["source_id"]}
+        if source_ids:
+            for house_id, source_id, content_hash in House.objects.filter(
+                source_id__in=source_ids,
+            ).values_list("id", "source_id", "content_hash"):
+                existing[("source", source_id)] = (house_id, content_hash)
+
+        pending = {
+            (data["title"], data["district"].id, data["address"]): (key, data["source_id"])
+            for key, data in houses.items() if key not in existing
+        }
+        if not pending:
+            return existing
+        candidates = House.objects.filter(
+            title__in={title for title, _, _ in pending},
+            district_id__in={district_id for _, district_id, _ in pending},
+        ).order_by("id").values_list("id", "title", "district_id", "address", "source_id", "content_hash")
+        for house_id, title, district_id, address, source_id, content_hash in candidates:
+            match = pending.get((title, district_id, address))
+            if not match:
+                continue
+            key, wanted_source_id = match
+            if key not in existing and source_id in (None, "", wanted_source_id):
+                existing[key] = (house_id, content_hash)
+        return existing
+
+    def _ensure_house_images(self, houses: List[House]) -> None:
+        wanted = {(house.pk, self._normalize_image_path(str(house.cover_image))) for house in houses}
+        if not wanted:
+            return
+        present = set(HouseImage.objects.filter(
+            house_id__in={house_id for house_id, _ in wanted},
+        ).values_list("house_id", "image"))
+        HouseImage.objects.bulk_create(
+            [HouseImage(house_id=house_id, image=image, order=0)
+             for house_id, image in wanted - present],
+            batch_size=self.chunk_size,
+        )
+
+    def _resolve_districts(self, rows: List[Dict[str, Any]]) -> Dict[str, District]:
+        """
+        一次性解析整表涉及的区域: 查询已有区域, 批量创建缺失区域并补全城市与描述.
+        """
+        descriptions: Dict[str, str] = {}
+        for row in rows:
+            name = self._district_name(row)
+            if not descriptions.get(name):
+                descriptions[name] = row.get("region") or ""
+
+        districts = {d.name: d for d in District.objects.filter(name__in=descriptions)}
+        missing = [
+            District(name=name, city=DEFAULT_CITY, description=description)
+            for name, description in descriptions.items()
+            if name not in districts
+        ]
+        if missing:
+            District.objects.bulk_create(missing, ignore_conflicts=True)
+            districts = {d.name: d for d in District.objects.filter(name__in=descriptions)}
+
+        to_update = []
+        for name, district in districts.items():
+            changed = False
+            if district.city != DEFAULT_CITY:
+                district.city = DEFAULT_CITY
+                changed = True
+            if not district.description and descriptions[name]:
+                district.description = descriptions[name]
+                changed = True
+            if changed:
+                to_update.append(district)
+        if to_update:
+            District.objects.bulk_update(to_update, ["city", "description"])
+        return districts
+
+    def _resolve_agents(self, rows: List[Dict[str, Any]]) -> Dict[str, User]:
+        """
+        一次性解析整表涉及的经纪人: 先按真实姓名、再按用户名匹配, 剩余的批量创建.
+        """
+        names = {(row.get("agent_name") or "").strip() for row in rows} - {""}
+        if not names:
+            return {}
+
+        agents: Dict[str, User] = {}
+        for agent in User.objects.filter(role="agent", real_name__in=names).order_by("id"):
+            agents.setdefault(agent.real_name, agent)
+
+        remaining = names - agents.keys()
+        if remaining:
+            missing_real_name = []
+            for agent in User.objects.filter(role="agent", username__in=remaining).order_by("id"):
+                if agent.username in agents:
+                    continue
+                if not agent.real_name:
+                    # 补充真实姓名
+                    agent.real_name = agent.username
+                    missing_real_name.append(agent)
+                agents[agent.username] = agent
+            if missing_real_name:
+                User.objects.bulk_update(missing_real_name, ["real_name"])
+
+        remaining = sorted(names - agents.keys())
+        if remaining:
+            agents.update(self._create_agents(remaining))
+        return agents
+
+    def _create_agents(self, names: List[str]) -> Dict[str, User]:
+        usernames = {name: self._sanitize_username(name) for name in names}
+        taken = set(User.objects.filter(username__in=set(usernames.values())).values_list("username", flat=True))
+        suffix = timezone.now().strftime("%H%M%S%f")
+        phones = self._generate_unique_phones(len(names))
+
+        new_agents = []
+        for index, name in enumerate(names):
+            username = usernames[name]
+            if username in taken:
+                username = f"{username}_{suffix}_{index}"
+            taken.add(username)
+            # 邮箱字段唯一, 为导入的经纪人生成占位邮箱
+            agent = User(
+                username=username,
+                email=f"{username}@{AGENT_EMAIL_DOMAIN}",
+                phone=phones[index],
+                role="agent",
+                real_name=name,
+                company="北京经纪联盟",
+                is_verified=True,
+            )
+            agent.set_unusable_password()
+            new_agents.append(agent)
+
+        User.objects.bulk_create(new_agents)
+        created = User.objects.filter(username__in=[agent.username for agent in new_agents])
+        return {agent.real_name: agent for agent in created}
+
+    def _generate_unique_phones(self, count: int) -> List[str]:
+        phones: set = set()
+        while len(phones) < count:
+            candidates = {
+                random.choice(PHONE_PREFIXES) + "".join(random.choices("0123456789", k=8))
+                for _ in range(count - len(phones))
+            }
+            candidates -= set(User.objects.filter(phone__in=candidates).values_list("phone", flat=True))
+            phones |= candidates
+        return list(phones)[:count]
 
     @transaction.atomic
-    def _import_row(self, row: Dict[str, Any]) -> bool:
+    def _import_row(self, row: Dict[str, Any]) -> Optional[bool]:
+        """
+        导入单行, 返回 True 表示新建, False 表示更新, None 表示内容未变化
+        """
         district = self._get_or_create_district(row)
         agent = self._get_or_create_agent(row)
 
         house_data = self._build_house_defaults(row, district, agent)
-        lookup = {
-            "title": house_data["title"],
-            "district": district,
-            "address": house_data["address"],
-        }
+        key = self._house_key(house_data)
+        match = self._existing_houses({key: house_data}).get(key)
 
-        defaults = house_data.copy()
-        for key in ("title", "district", "address"):
-            defaults.pop(key, None)
-
-        house, created = House.objects.update_or_create(defaults=defaults, **lookup)
-
-        if created:
+        if match is None:
+            house = House.objects.create(**house_data)
             logger.debug("Created house %s (%s)", house.title, house.id)
-        else:
-            logger.debug("Updated house %s (%s)", house.title, house.id)
+            self._ensure_house_image(house, house_data["cover_image"])
+            return True
 
-        self._ensure_house_image(house, house_data["cover_image"])
+        house_id, content_hash = match
+        if content_hash == house_data["content_hash"]:
+            return None
 
-        return created
+        self._update_changed_houses({house_id: house_data})
+        logger.debug("Updated house %s (%s)", house_data["title"], house_id)
+        return False
 
     def _build_house_defaults(self, row: Dict[str, Any], district: District, agent: Optional[User]) -> Dict[str, Any]:
         price = self._to_decimal(row.get("price_total_wan"))
@@ -165,7 +558,10 @@ class FangExcelImporter:
         longitude = self._to_decimal(row.get("longitude"), digits=10, decimal_places=7)
         latitude = self._to_decimal(row.get("latitude"), digits=10, decimal_places=7)
 
-        return {
+        source_id = row.get("source_id")
+        source_id = str(source_id).strip()[:64] if source_id is not None else ""
+
+        house_data = {
             "title": row.get("title").strip(),
             "district": district,
             "address": (row.get("address") or "").strip()[:200],
@@ -184,11 +580,23 @@ class FangExcelImporter:
             "cover_image": cover_image,
             "status": status,
             "agent": agent,
-            "views": 0,
+            "source_id": source_id or None,
         }
+        house_data["content_hash"] = self._content_hash(house_data)
+        return house_data
+
+    @classmethod
+    def _content_hash(cls, house_data: Dict[str, Any]) -> str:
+        values = [cls._data_value(house_data, name) for name in HOUSE_UPDATE_FIELDS]
+        payload = json.dumps([None if value is None else str(value) for value in values], ensure_ascii=False)
+        return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _district_name(row: Dict[str, Any]) -> str:
+        return (row.get("district_name") or row.get("region") or "未知区域").split("-")[0].strip()
 
     def _get_or_create_district(self, row: Dict[str, Any]) -> District:
-        district_name = (row.get("district_name") or row.get("region") or "未知区域").split("-")[0].strip()
+        district_name = self._district_name(row)
         defaults = {
             "city": DEFAULT_CITY,
             "description": row.get("region") or "",
@@ -288,14 +696,18 @@ class FangExcelImporter:
         """
         确保HouseImage至少有一张图片，使用同一张占位图。
         """
-        normalized = image_path
-        if normalized.startswith(settings.MEDIA_URL):
-            normalized = normalized.replace(settings.MEDIA_URL, "", 1).lstrip("/")
+        normalized = self._normalize_image_path(image_path)
 
         has_image = house.images.filter(image=normalized).exists()
         if not has_image:
             HouseImage.objects.create(house=house, image=normalized, order=0)
 
+    @staticmethod
+    def _normalize_image_path(image_path: str) -> str:
+        if image_path.startswith(settings.MEDIA_URL):
+            return image_path.replace(settings.MEDIA_URL, "", 1).lstrip("/")
+        return image_path
+
     @staticmethod
     def _sanitize_username(name: str) -> str:
         ascii_name = re.sub(r"[^A-Za-z0-9]", "", name)
@@ -344,9 +756,11 @@ class FangExcelImporter:
         except (ValueError, TypeError):
             return default
 
-    def _archive_file(self, file_path: Path) -> None:
+    def _archive_file(self, file_path: Path, directory: Optional[Path] = None, suffix: str = "") -> None:
+        directory = directory or self.processed_dir
+        directory.mkdir(parents=True, exist_ok=True)
         timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-        destination = self.processed_dir / f"{file_path.stem}_{timestamp}{file_path.suffix}"
+        destination = directory / f"{file_path.stem}_{timestamp}{suffix}{file_path.suffix}"
         try:
             shutil.move(str(file_path), destination)
             logger.info("Archived Excel %s -> %s", file_path, destination)
@@ -0,0 +1,317 @@
+"""
+Concurrent paged crawler for Fang.com top listings.
+
+Fetches list pages for one or more city entry URLs with an async HTTP client,
+bounded concurrency, per-host rate limiting, retries with exponential backoff
+and conditional requests (ETag / If-Modified-Since). Parsing and export are
+delegated to FangTopScraper so both crawl modes produce identical records.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, asdict
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.tasks.fang_scraper import FANG_TOP_URL, FangListing, FangTopScraper
+
+logger = logging.getLogger(__name__)
+
+# Relative path of list page N (N >= 2) under a city entry URL
+PAGE_PATH_TEMPLATE = "i3{page}/"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Upper bound on a server-supplied Retry-After so one response cannot stall a worker
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+VALIDATOR_CACHE_PREFIX = "fang_crawler:validators"
+VALIDATOR_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+@dataclass
+class CrawlStats:
+    pages_fetched: int = 0
+    pages_not_modified: int = 0
+    pages_failed: int = 0
+    pages_skipped: int = 0
+    listings: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def listings_per_minute(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return round(self.listings * 60 / self.elapsed_seconds, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["elapsed_seconds"] = round(self.elapsed_seconds, 3)
+        data["listings_per_minute"] = self.listings_per_minute
+        return data
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to the same host at least 1 / rate_per_second apart.
+
+    Slots are reserved under the lock and slept on outside it, so waiting
+    on one host never blocks requests to another.
+    """
+
+    def __init__(self, rate_per_second: float) -> None:
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def page_urls(base_url: str, max_pages: int) -> List[str]:
+    """
+    List page URLs for a city entry URL; page 1 is the entry URL itself.
+    """
+    base = base_url if base_url.endswith("/") else f"{base_url}/"
+    return [base] + [urljoin(base, PAGE_PATH_TEMPLATE.format(page=page)) for page in range(2, max_pages + 1)]
+
+
+class FangPagedCrawler:
+    """
+    Crawls several list pages per city concurrently and exports the merged listings.
+    """
+
+    def __init__(
+        self,
+        base_urls: Optional[Sequence[str]] = None,
+        max_pages: int = 10,
+        concurrency: int = 8,
+        rate_per_host: float = 4.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: Tuple[float, float] = (8, 20),
+        conditional: bool = True,
+        scraper: Optional[FangTopScraper] = None,
+        transport: Any = None,
+    ) -> None:
+        self.base_urls = list(base_urls or [FANG_TOP_URL])
+        self.max_pages = max(1, max_pages)
+        self.concurrency = max(1, concurrency)
+        self.rate_per_host = rate_per_host
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self.conditional = conditional
+        self.scraper = scraper or FangTopScraper()
+        # Optional httpx transport (e.g. httpx.MockTransport); None uses the network
+        self.transport = transport
+        # Validators of pages handed off during the last crawl, stored by commit_validators()
+        self.pending_validators: Dict[str, Dict[str, Optional[str]]] = {}
+
+    @classmethod
+    def from_settings(cls, **overrides: Any) -> "FangPagedCrawler":
+        options = {
+            "base_urls": getattr(settings, "FANG_CRAWL_BASE_URLS", None),
+            "max_pages": getattr(settings, "FANG_CRAWL_MAX_PAGES", 10),
+            "concurrency": getattr(settings, "FANG_CRAWL_CONCURRENCY", 8),
+            "rate_per_host": getattr(settings, "FANG_CRAWL_RATE_PER_HOST", 4.0),
+            "max_retries": getattr(settings, "FANG_CRAWL_MAX_RETRIES", 3),
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def run(self) -> Dict[str, Any]:
+        listings, stats = self.crawl()
+        output_path, count = self.scraper.export_to_excel(listings)
+        self.commit_validators()
+        return {
+            "count": count,
+            "output_path": str(output_path) if output_path else "",
+            "timestamp": timezone.now().isoformat(),
+            "crawl": stats.to_dict(),
+        }
+
+    def crawl(
+        self, on_page: Optional[Callable[[List[FangListing]], None]] = None
+    ) -> Tuple[List[FangListing], CrawlStats]:
+        return asyncio.run(self.crawl_async(on_page=on_page))
+
+    async def crawl_async(
+        self, on_page: Optional[Callable[[List[FangListing]], None]] = None
+    ) -> Tuple[List[FangListing], CrawlStats]:
+        """
+        Crawl all pages. With on_page, each parsed page is handed over as soon
+        as it is ready and nothing is accumulated (the returned list is empty).
+
+        ETag / Last-Modified validators are only collected in pending_validators;
+        the caller stores them with commit_validators() once the listings are
+        safely exported or imported, so a failed run refetches the same pages.
+        """
+        try:
+            import httpx
+        except ImportError as exc:
+            raise ImportError("httpx is required for the paged crawl mode") from exc
+
+        stats = CrawlStats()
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiter = HostRateLimiter(self.rate_per_host)
+        # First empty page per entry URL; later pages of that city are skipped
+        exhausted: Dict[str, int] = {}
+        self.pending_validators = {}
+
+        async def crawl_page(client, base_url: str, page: int, url: str) -> List[FangListing]:
+            async with semaphore:
+                if exhausted.get(base_url, self.max_pages + 1) < page:
+                    stats.pages_skipped += 1
+                    return []
+                try:
+                    html_text, validators = await self._fetch(client, limiter, url)
+                except Exception as exc:
+                    stats.pages_failed += 1
+                    logger.warning("Failed to fetch %s: %s", url, exc)
+                    return []
+            if html_text is None:
+                stats.pages_not_modified += 1
+                return []
+            stats.pages_fetched += 1
+            listings = self.scraper.parse_listings(html_text)
+            if not listings:
+                exhausted[base_url] = min(exhausted.get(base_url, page), page)
+            if on_page is not None:
+                stats.listings += len(listings)
+                if listings:
+                    on_page(listings)
+            if validators:
+                self.pending_validators[url] = validators
+            return [] if on_page is not None else listings
+
+        timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(
+            timeout=timeout, limits=limits, follow_redirects=True, transport=self.transport
+        ) as client:
+            jobs = [
+                crawl_page(client, base_url, page, url)
+                for base_url in self.base_urls
+                for page, url in enumerate(page_urls(base_url, self.max_pages), start=1)
+            ]
+            pages = await asyncio.gather(*jobs)
+
+        listings = list(self._dedupe(listing for page in pages for listing in page))
+        if on_page is None:
+            stats.listings = len(listings)
+        stats.elapsed_seconds = time.monotonic() - started
+        logger.info("Fang.com paged crawl finished: %s", stats.to_dict())
+        return listings, stats
+
+    async def _fetch(
+        self, client, limiter: HostRateLimiter, url: str
+    ) -> Tuple[Optional[str], Optional[Dict[str, Optional[str]]]]:
+        """
+        GET a page with retries; returns (html, validators), html is None when
+        the server answers 304.
+        """
+        import httpx
+
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            await limiter.wait(host)
+            retry_after = None
+            try:
+                response = await client.get(url, headers=self._request_headers(url))
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code == 304:
+                    return None, None
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.text, self._validators(response.headers)
+                if attempt >= self.max_retries:
+                    response.raise_for_status()
+                retry_after = self._retry_after(response.headers.get("Retry-After"))
+            delay = retry_after if retry_after is not None else self.backoff * (2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(1.0, 1.25))
+        return None, None
+
+    def _request_headers(self, url: str) -> Dict[str, str]:
+        headers = self.scraper._build_headers()
+        if not self.conditional:
+            return headers
+        # Let the origin answer 304 instead of forcing a full response
+        headers.pop("Cache-Control", None)
+        headers.pop("Pragma", None)
+        validators = cache.get(self._validator_key(url)) or {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def _validators(self, headers) -> Optional[Dict[str, Optional[str]]]:
+        if not self.conditional:
+            return None
+        validators = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        return validators if any(validators.values()) else None
+
+    def commit_validators(self) -> int:
+        """
+        Store the validators of the last crawl's pages; call only after their
+        listings have been exported or imported. Returns the number of pages.
+        """
+        pending, self.pending_validators = self.pending_validators, {}
+        if pending:
+            cache.set_many(
+                {self._validator_key(url): validators for url, validators in pending.items()},
+                VALIDATOR_CACHE_TIMEOUT,
+            )
+        return len(pending)
+
+    @staticmethod
+    def _validator_key(url: str) -> str:
+        return f"{VALIDATOR_CACHE_PREFIX}:{url}"
+
+    @staticmethod
+    def _retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - timezone.now()).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        if seconds != seconds:  # NaN
+            return None
+        return min(MAX_RETRY_AFTER_SECONDS, max(0.0, seconds))
+
+    @staticmethod
+    def _dedupe(listings: Iterable[FangListing]) -> Iterable[FangListing]:
+        seen = set()
+        for listing in listings:
+            if listing.source_id in seen:
+                continue
+            seen.add(listing.source_id)
+            yield listing
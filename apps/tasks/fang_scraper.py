@@ -19,6 +19,13 @@ from bs4 import BeautifulSoup
 from django.conf import settings
 from django.utils import timezone
 
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # pragma: no cover - lxml is optional, html.parser is the fallback
+    etree = None
+    lxml_html = None
+
 logger = logging.getLogger(__name__)
 
 FANG_TOP_URL = "https://esf.fang.com/top/"
@@ -52,6 +59,36 @@ AREA_PATTERN = re.compile(r"([\d.]+)\s*㎡")
 TOTAL_FLOOR_PATTERN = re.compile(r"共(\d+)层")
 UNIT_PRICE_PATTERN = re.compile(r"([\d,]+)")
 
+PARSER_CHOICES = ("auto", "lxml", "html.parser")
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if etree is not None:
+    # XPath equivalents of the CSS selectors used by the BeautifulSoup path,
+    # compiled once at import time.
+    XPATH_NODES = etree.XPath('//dl[@dataflag="bg"]')
+    XPATH_TITLE_LINK = etree.XPath("(.//dd//h4//a)[1]")
+    XPATH_TEL_SHOP = etree.XPath(f"(.//p[{_has_class('tel_shop')}])[1]")
+    XPATH_AGENT_ANCHOR = etree.XPath(
+        f"(.//p[{_has_class('tel_shop')}]//span[{_has_class('people_name')}]//a)[1]"
+    )
+    XPATH_TOTAL_PRICE = etree.XPath(
+        f"(.//dd[{_has_class('price_right')}]//span[{_has_class('red')}]//b)[1]"
+    )
+    XPATH_UNIT_PRICE = etree.XPath(
+        f"(.//dd[{_has_class('price_right')}]//span[count(preceding-sibling::span) = 1])[1]"
+    )
+    XPATH_ADD_SHOP = etree.XPath(f"(.//p[{_has_class('add_shop')}])[1]")
+    XPATH_FIRST_ANCHOR = etree.XPath("(.//a)[1]")
+    XPATH_FIRST_SPAN = etree.XPath("(.//span)[1]")
+    XPATH_TAGS = etree.XPath(f".//p[{_has_class('label')}]//span")
+    XPATH_COVER = etree.XPath("(.//dt//img)[1]")
+    # BeautifulSoup's get_text skips comments and script/style content
+    XPATH_TEXT = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
 
 @dataclass
 class FangListing:
@@ -101,10 +138,18 @@ class FangTopScraper:
     Scraper that fetches Fang.com top listings, enriches them, and writes Excel files.
     """
 
-    def __init__(self, url: str = FANG_TOP_URL, timeout: Tuple[int, int] = (8, 20)) -> None:
+    def __init__(
+        self,
+        url: str = FANG_TOP_URL,
+        timeout: Tuple[int, int] = (8, 20),
+        parser: Optional[str] = None,
+    ) -> None:
         self.url = url
         self.timeout = timeout
         self.session = requests.Session()
+        self.parser = parser or getattr(settings, "FANG_HTML_PARSER", "auto")
+        if self.parser not in PARSER_CHOICES:
+            raise ValueError(f"Unsupported parser {self.parser!r}, expected one of {PARSER_CHOICES}")
 
     def _build_headers(self) -> Dict[str, str]:
         headers = HEADERS_BASE.copy()
@@ -123,13 +168,34 @@ class FangTopScraper:
         return response.text
 
     def parse_listings(self, html_text: str) -> List[FangListing]:
+        """
+        Parse listing nodes with lxml when available (or requested), otherwise
+        with BeautifulSoup's html.parser; both paths yield identical records.
+        """
+        if self.parser != "html.parser" and lxml_html is not None:
+            try:
+                return self._parse_listings_lxml(html_text)
+            except Exception as exc:
+                logger.warning("lxml parsing failed, falling back to html.parser: %s", exc)
+        elif self.parser == "lxml":
+            logger.warning("lxml is not installed, falling back to html.parser")
+        return self._parse_listings_soup(html_text)
+
+    def _parse_listings_soup(self, html_text: str) -> List[FangListing]:
         soup = BeautifulSoup(html_text, "html.parser")
-        nodes = soup.select('dl[dataflag="bg"]')
+        return self._parse_nodes(soup.select('dl[dataflag="bg"]'), self._parse_node)
+
+    def _parse_listings_lxml(self, html_text: str) -> List[FangListing]:
+        document = lxml_html.document_fromstring(html_text)
+        return self._parse_nodes(XPATH_NODES(document), self._parse_node_lxml)
+
+    @staticmethod
+    def _parse_nodes(nodes, parse_node) -> List[FangListing]:
         listings: List[FangListing] = []
 
         for node in nodes:
             try:
-                record = self._parse_node(node)
+                record = parse_node(node)
                 if record:
                     listings.append(record)
             except Exception as exc:
@@ -143,18 +209,78 @@ class FangTopScraper:
         if not title_link:
             return None
 
-        title = title_link.get_text(strip=True)
-        house_url = self._normalize_url(title_link.get("href"))
-        layout, area_sqm, floor_text, total_floors, orientation = self._extract_house_info(node)
+        agent_anchor = node.select_one("p.tel_shop span.people_name a")
+        return self._build_listing(
+            metadata=metadata,
+            title=title_link.get_text(strip=True),
+            house_href=title_link.get("href"),
+            house_info=self._extract_house_info(node),
+            price_info=self._extract_price_info(node),
+            agent_name=agent_anchor.get_text(strip=True) if agent_anchor else "",
+            agent_href=agent_anchor.get("href") if agent_anchor else None,
+            location=self._extract_location(node),
+            tags=[span.get_text(strip=True) for span in node.select("p.label span") if span.get_text(strip=True)],
+            cover_image=self._extract_cover(node),
+        )
 
-        price_total, unit_price = self._extract_price_info(node)
+    def _parse_node_lxml(self, node) -> Optional[FangListing]:
+        metadata = self._extract_metadata(node)
+        title_link = self._first(XPATH_TITLE_LINK(node))
+        if title_link is None:
+            return None
 
-        agent_anchor = node.select_one("p.tel_shop span.people_name a")
-        agent_name = agent_anchor.get_text(strip=True) if agent_anchor else ""
-        agent_store_url = self._normalize_url(agent_anchor.get("href")) if agent_anchor else ""
-        community, region = self._extract_location(node)
-        tags = [span.get_text(strip=True) for span in node.select("p.label span") if span.get_text(strip=True)]
-        cover_image = self._extract_cover(node)
+        tel_shop = self._first(XPATH_TEL_SHOP(node))
+        total_price_node = self._first(XPATH_TOTAL_PRICE(node))
+        unit_price_node = self._first(XPATH_UNIT_PRICE(node))
+        agent_anchor = self._first(XPATH_AGENT_ANCHOR(node))
+
+        community, region = "", ""
+        add_shop = self._first(XPATH_ADD_SHOP(node))
+        if add_shop is not None:
+            community_anchor = self._first(XPATH_FIRST_ANCHOR(add_shop))
+            community = self._lxml_text(community_anchor) if community_anchor is not None else ""
+            region_span = self._first(XPATH_FIRST_SPAN(add_shop))
+            region = self._lxml_text(region_span) if region_span is not None else ""
+
+        image = self._first(XPATH_COVER(node))
+        cover = (image.get("data-src") or image.get("src") or "") if image is not None else ""
+
+        return self._build_listing(
+            metadata=metadata,
+            title=self._lxml_text(title_link),
+            house_href=title_link.get("href"),
+            house_info=self._house_info_from_parts(
+                self._lxml_strings(tel_shop) if tel_shop is not None else None
+            ),
+            price_info=self._price_from_texts(
+                self._lxml_text(total_price_node) if total_price_node is not None else None,
+                "".join(XPATH_TEXT(unit_price_node)) if unit_price_node is not None else None,
+            ),
+            agent_name=self._lxml_text(agent_anchor) if agent_anchor is not None else "",
+            agent_href=agent_anchor.get("href") if agent_anchor is not None else None,
+            location=(community, region),
+            tags=[text for text in (self._lxml_text(span) for span in XPATH_TAGS(node)) if text],
+            cover_image=self._normalize_url(cover) if image is not None else "",
+        )
+
+    def _build_listing(
+        self,
+        metadata: Dict[str, Any],
+        title: str,
+        house_href: Optional[str],
+        house_info: Tuple[str, Optional[float], str, Optional[int], str],
+        price_info: Tuple[Optional[float], Optional[float]],
+        agent_name: str,
+        agent_href: Optional[str],
+        location: Tuple[str, str],
+        tags: List[str],
+        cover_image: str,
+    ) -> FangListing:
+        house_url = self._normalize_url(house_href)
+        layout, area_sqm, floor_text, total_floors, orientation = house_info
+        price_total, unit_price = price_info
+        agent_store_url = self._normalize_url(agent_href) if agent_href is not None else ""
+        community, region = location
 
         district_name, sub_district = self._split_region(region)
         address = " / ".join(filter(None, [community, region]))
@@ -190,7 +316,9 @@ class FangTopScraper:
             latitude=latitude,
         )
 
-    def export_to_excel(self, listings: List[FangListing]) -> Tuple[Optional[Path], int]:
+    def export_to_excel(
+        self, listings: List[FangListing], output_dir: Optional[Path] = None
+    ) -> Tuple[Optional[Path], int]:
         if not listings:
             return None, 0
 
@@ -202,7 +330,7 @@ class FangTopScraper:
 
         df = df.drop_duplicates(subset=["source_id"]).reset_index(drop=True)
 
-        output_dir = Path(settings.BASE_DIR) / "data"
+        output_dir = output_dir or Path(settings.BASE_DIR) / "data"
         output_dir.mkdir(parents=True, exist_ok=True)
         timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
         output_path = output_dir / f"fang_top_{timestamp}.xlsx"
@@ -232,13 +360,31 @@ class FangTopScraper:
             logger.debug("Failed to decode metadata: %s", raw)
             return {}
 
+    @staticmethod
+    def _first(elements):
+        return elements[0] if elements else None
+
+    @staticmethod
+    def _lxml_strings(element) -> List[str]:
+        return [text.strip() for text in XPATH_TEXT(element) if text.strip()]
+
+    @staticmethod
+    def _lxml_text(element) -> str:
+        return "".join(FangTopScraper._lxml_strings(element))
+
     @staticmethod
     def _extract_house_info(node) -> Tuple[str, Optional[float], str, Optional[int], str]:
         tel_shop = node.select_one("p.tel_shop")
         if not tel_shop:
             return "", None, "", None, ""
+        return FangTopScraper._house_info_from_parts(tel_shop.get_text(separator="|", strip=True).split("|"))
 
-        parts = [part.strip() for part in tel_shop.get_text(separator="|", strip=True).split("|") if part.strip()]
+    @staticmethod
+    def _house_info_from_parts(parts: Optional[List[str]]) -> Tuple[str, Optional[float], str, Optional[int], str]:
+        if parts is None:
+            return "", None, "", None, ""
+
+        parts = [part.strip() for part in parts if part.strip()]
         layout = parts[0] if parts else ""
 
         area_match = next((AREA_PATTERN.search(part) for part in parts if "㎡" in part), None)
@@ -259,11 +405,20 @@ class FangTopScraper:
         total_price_node = node.select_one("dd.price_right span.red b")
         unit_price_node = node.select_one("dd.price_right span:nth-of-type(2)")
 
-        total_price = float(total_price_node.get_text(strip=True)) if total_price_node else None
+        return FangTopScraper._price_from_texts(
+            total_price_node.get_text(strip=True) if total_price_node else None,
+            unit_price_node.get_text() if unit_price_node else None,
+        )
+
+    @staticmethod
+    def _price_from_texts(
+        total_price_text: Optional[str], unit_price_text: Optional[str]
+    ) -> Tuple[Optional[float], Optional[float]]:
+        total_price = float(total_price_text) if total_price_text is not None else None
 
         unit_price_value = None
-        if unit_price_node:
-            match = UNIT_PRICE_PATTERN.search(unit_price_node.get_text())
+        if unit_price_text is not None:
+            match = UNIT_PRICE_PATTERN.search(unit_price_text)
             if match:
                 unit_price_value = float(match.group(1).replace(",", ""))
 
@@ -0,0 +1,106 @@
+"""
+对比房天下列表页两种解析路径: 校验结果一致并统计每1000个房源节点的解析耗时
+"""
+import random
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.fang_scraper import FangTopScraper, lxml_html
+
+SAMPLE_NODE = '''<dl class="clearfix" dataflag="bg" data-bg='{{"houseid":"{index}","agentid":"9{index}"}}'>
+<dt class="floatl"><a href="/chushou/3_{index}.htm"><img src="//static.example.com/blank.gif" data-src="//img.example.com/{index}.jpg"></a></dt>
+<dd><h4 class="clearfix"><a href="/chushou/3_{index}.htm" title="房源{index}"><span class="tit_shop">望京 精装两居 {index}</span></a></h4>
+<p class="tel_shop">{rooms}室1厅<i>|</i>{area}㎡<i>|</i>中层 （共{floors}层）<i>|</i>南北向<i>|</i>2008年建
+<span class="people_name"><a href="//agent.example.com/{index}/">经纪人{index}</a></span></p>
+<p class="add_shop"><a href="/house-xm{index}/" title="小区{index}">小区{index}</a><span class="tit_shop">朝阳-望京</span></p>
+<p class="clearfix label"><span class="colorGreen">满五唯一</span><span class="colorBlue">近地铁</span><!-- 促销 --></p></dd>
+<dd class="price_right"><span class="red"><b>{price}</b>万</span><span>{unit_price}元/㎡</span></dd>
+</dl>'''
+
+
+def sample_listing_html(count):
+    nodes = []
+    for index in range(count):
+        area = 50 + index % 120
+        price = 200 + index % 900
+        nodes.append(SAMPLE_NODE.format(
+            index=100000 + index,
+            rooms=1 + index % 6,
+            area=area,
+            floors=6 + index % 30,
+            price=price,
+            unit_price=f"{price * 10000 // area:,}",
+        ))
+    return f'<html><head><meta charset="utf-8"></head><body><div class="shop_list">{"".join(nodes)}</div></body></html>'
+
+
+class Command(BaseCommand):
+    help = '校验 lxml 与 html.parser 解析结果一致, 并对比每1000个房源节点的解析耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='*',
+            help='保存的列表页 HTML 文件; 不指定时使用生成的样例页面',
+        )
+        parser.add_argument(
+            '--nodes',
+            type=int,
+            default=1000,
+            help='生成样例页面的房源节点数（默认：1000）',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='每种解析器重复解析次数, 取最快一次（默认：5）',
+        )
+
+    def handle(self, *args, **options):
+        if lxml_html is None:
+            raise CommandError('未安装 lxml, 无法对比解析路径')
+
+        pages = [(path, Path(path).read_text(encoding='utf-8')) for path in options['files']]
+        if not pages:
+            pages = [(f'sample({options["nodes"]})', sample_listing_html(options['nodes']))]
+
+        parsers = {name: FangTopScraper(parser=name) for name in ('html.parser', 'lxml')}
+        for label, html_text in pages:
+            results = {}
+            timings = {}
+            for name, scraper in parsers.items():
+                best = None
+                for _ in range(max(1, options['repeat'])):
+                    # 固定随机种子, 使两种解析路径生成的随机字段一致
+                    random.seed(0)
+                    started = time.perf_counter()
+                    listings = scraper.parse_listings(html_text)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                results[name] = [self._comparable(listing) for listing in listings]
+                timings[name] = best
+
+            count = len(results['html.parser'])
+            if results['html.parser'] != results['lxml']:
+                mismatched = sum(
+                    1 for left, right in zip(results['html.parser'], results['lxml']) if left != right
+                )
+                raise CommandError(
+                    f'{label}: 解析结果不一致 (html.parser {count} 条, lxml {len(results["lxml"])} 条, '
+                    f'差异 {mismatched} 条)'
+                )
+
+            self.stdout.write(self.style.SUCCESS(f'{label}: {count} 条房源, 两种解析结果一致'))
+            for name, elapsed in timings.items():
+                per_thousand = elapsed * 1000 / count * 1000 if count else 0
+                self.stdout.write(f'  {name:<12} {elapsed * 1000:8.1f} ms  每1000节点 {per_thousand:8.1f} ms')
+            if timings['lxml']:
+                self.stdout.write(f'  加速比 {timings["html.parser"] / timings["lxml"]:.1f}x')
+
+    @staticmethod
+    def _comparable(listing):
+        record = listing.as_dict()
+        record.pop('scraped_at', None)
+        return record
@@ -0,0 +1,114 @@
+"""
+对房源列表/搜索/筛选、地图数据、全部分析接口、导入器和价格提醒任务执行基准测试
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.tasks.benchmark import (
+    BenchmarkRunner,
+    SyntheticDataset,
+    add_dataset_arguments,
+    compare_results,
+    generator_from_options,
+    write_results,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '在合成数据上逐项测量热点接口与任务的耗时和查询数, 输出 JSON 结果并可与基线对比'
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument('--existing', action='store_true',
+                            help='使用 seed_benchmark_data 已生成的数据, 不再临时生成')
+        parser.add_argument('--repeat', type=int, default=5, help='每个场景计时次数（默认：5）')
+        parser.add_argument('--warmup', type=int, default=1, help='每个场景预热次数（默认：1）')
+        parser.add_argument('--only', action='append', default=[],
+                            help='只运行名称以此开头的场景, 可重复指定, 如 --only houses. --only analysis.')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='保留接口响应缓存(默认关闭, 测量实际查询路径)')
+        parser.add_argument('--output', help='JSON 结果保存路径')
+        parser.add_argument('--baseline', help='用于对比的历史 JSON 结果')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='中位数耗时增幅超过该比例视为回归（默认：0.2）')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='存在回归时以非零状态退出')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text(encoding='utf-8'))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'无法读取基线结果: {exc}') from exc
+
+        # 场景中的导入、提醒触发等写操作与临时数据一起回滚, 数据库保持原样
+        try:
+            with transaction.atomic():
+                results = self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['output']:
+            write_results(results, Path(options['output']))
+            self.stdout.write(f'结果已保存到 {options["output"]}')
+        else:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+
+        if baseline is not None:
+            self._report_comparison(results, baseline, options)
+
+    def _run(self, options):
+        if options['existing']:
+            try:
+                dataset = SyntheticDataset.load(options['city'])
+            except LookupError as exc:
+                raise CommandError(str(exc)) from exc
+        else:
+            try:
+                dataset = generator_from_options(options).generate()
+            except ValueError as exc:
+                raise CommandError(f'{exc} (已有数据时可使用 --existing)') from exc
+        summary = ', '.join(f'{name} {count}' for name, count in dataset.counts.items())
+        self.stderr.write(f'数据集: {summary}')
+
+        runner = BenchmarkRunner(
+            dataset,
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            response_cache=options['with_cache'],
+            seed=options['seed'],
+        )
+        return runner.run(only=options['only'], on_result=self._print_result)
+
+    def _print_result(self, name, result):
+        status = f' [{result["status"]}]' if 'status' in result else ''
+        self.stderr.write(
+            f'{name:<40} {result["median_ms"]:>10.2f} ms (min {result["min_ms"]:.2f}, '
+            f'p95 {result["p95_ms"]:.2f}) {result["queries"]:>4} 次查询{status}'
+        )
+
+    def _report_comparison(self, results, baseline, options):
+        rows = compare_results(results, baseline, threshold=options['threshold'])
+        self.stdout.write(f'与基线 {baseline.get("meta", {}).get("commit") or options["baseline"]} 对比:')
+        regressions = 0
+        for row in rows:
+            line = (
+                f'{row["name"]:<40} {row["baseline_ms"]:>10.2f} -> {row["current_ms"]:>10.2f} ms '
+                f'({row["change"] * 100:+.1f}%), 查询 {row["baseline_queries"]} -> {row["current_queries"]}'
+            )
+            if row['regression']:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{regressions} 个场景出现回归')
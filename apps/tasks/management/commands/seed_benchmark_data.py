@@ -0,0 +1,34 @@
+"""
+按随机种子批量生成基准测试用的合成数据并保留在数据库中
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.tasks.benchmark import add_dataset_arguments, flush_dataset, generator_from_options
+
+
+class Command(BaseCommand):
+    help = '用 bulk_create 批量生成可复现的区域、房源、成交、用户、收藏和价格提醒数据'
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='生成前先删除该城市已有的合成数据',
+        )
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            deleted = flush_dataset(options['city'])
+            self.stdout.write(f'已删除 {deleted} 个合成区域及其数据')
+
+        generator = generator_from_options(options)
+        try:
+            with transaction.atomic():
+                dataset = generator.generate()
+        except ValueError as exc:
+            raise CommandError(f'{exc} (可使用 --flush)') from exc
+
+        summary = ', '.join(f'{name} {count}' for name, count in dataset.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'已生成城市 {dataset.city} 的合成数据: {summary}'))
@@ -0,0 +1,104 @@
+"""
+爬虫数据文件流式读取: 按固定行数分批产出记录, 内存占用与文件大小无关.
+
+支持 .xlsx(openpyxl 只读模式)、.csv 与 .parquet(需要 pyarrow).
+"""
+from __future__ import annotations
+
+import csv
+import math
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+SUPPORTED_SUFFIXES = (".xlsx", ".csv", ".parquet")
+
+
+def iter_record_batches(file_path: Path, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    逐批产出文件中的记录, 每批最多 batch_size 行; 空单元格统一为 None.
+    """
+    suffix = file_path.suffix.lower()
+    if suffix == ".parquet":
+        yield from _iter_parquet_batches(file_path, batch_size)
+        return
+
+    if suffix == ".xlsx":
+        records = _iter_xlsx_records(file_path)
+    elif suffix == ".csv":
+        records = _iter_csv_records(file_path)
+    else:
+        raise ValueError(f"不支持的文件类型: {file_path.suffix}")
+
+    yield from batched(records, batch_size)
+
+
+def batched(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    将任意记录流按 batch_size 分批
+    """
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _clean(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+def clean_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按文件读取时的规则清洗内存中的记录, 使直接入库与读文件入库的取值一致
+    """
+    return {name: _clean(value) for name, value in record.items()}
+
+
+def _iter_xlsx_records(file_path: Path) -> Iterator[Dict[str, Any]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        columns = [(index, str(name)) for index, name in enumerate(header) if name is not None]
+        for values in rows:
+            if not values:
+                continue
+            yield {
+                name: _clean(values[index]) if index < len(values) else None
+                for index, name in columns
+            }
+    finally:
+        workbook.close()
+
+
+def _iter_csv_records(file_path: Path) -> Iterator[Dict[str, Any]]:
+    with open(file_path, newline="", encoding="utf-8-sig") as handle:
+        for row in csv.DictReader(handle):
+            yield {name: _clean(value) for name, value in row.items() if name is not None}
+
+
+def _iter_parquet_batches(file_path: Path, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("读取 parquet 文件需要安装 pyarrow") from exc
+
+    parquet_file = pq.ParquetFile(file_path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield [
+            {name: _clean(value) for name, value in row.items()}
+            for row in record_batch.to_pylist()
+        ]
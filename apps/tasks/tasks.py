@@ -7,25 +7,43 @@ from django.conf import settings
 from datetime import datetime, timedelta
 import logging
 
+from apps.tasks.data_cleanup import ChunkedDataCleaner
+from apps.tasks.fang_crawler import FangPagedCrawler
+from apps.tasks.fang_pipeline import FangImportPipeline
 from apps.tasks.fang_scraper import FangTopScraper
 from apps.tasks.excel_importer import FangExcelImporter
 
 logger = logging.getLogger(__name__)
 
+# 价格提醒通知每批投递的邮件任务数
+NOTIFICATION_BATCH_SIZE = 500
+
 
 @shared_task(bind=True, ignore_result=False)
-def crawl_fang_top_listings(self, run_immediately: bool = True):
+def crawl_fang_top_listings(self, run_immediately: bool = True, paged: bool = None, stream: bool = None):
     """
     run_immediately bool =false 
     使用伪装请求头抓取房天下Top房源数据并导出为Excel
     参数:
         run_immediately: 是否立即执行爬虫, False时只记录跳过
+        paged: 是否按城市并发抓取多页列表, 为None时读取 FANG_CRAWL_PAGED 配置
+        stream: 是否抓取后直接分批写库(不再经 Excel 中转), 为None时读取 FANG_CRAWL_STREAM_TO_DB 配置
     """
     if not run_immediately:
         logger.info("Fang.com Top crawl skipped because run_immediately=False")
         return {"skipped": True, "timestamp": datetime.now().isoformat()}
     
-    scraper = FangTopScraper()
+    if paged is None:
+        paged = getattr(settings, 'FANG_CRAWL_PAGED', False)
+    if stream is None:
+        stream = getattr(settings, 'FANG_CRAWL_STREAM_TO_DB', False)
+    
+    if stream:
+        scraper = FangImportPipeline.from_settings(paged=paged)
+    elif paged:
+        scraper = FangPagedCrawler.from_settings()
+    else:
+        scraper = FangTopScraper()
     try:
         result = scraper.run()
         logger.info(
@@ -64,148 +82,146 @@ def check_price_alerts():
     """
     定期检查价格提醒
     每小时执行一次,检查是否有房源价格达到用户设置的目标价格
+    
+    以集合方式处理: 一条语句同步全部当前价格, 一条语句批量触发, 再分批发送通知
     """
     from apps.favorites.models import PriceAlert
-    from apps.houses.models import House
-    
-    # 获取所有激活状态的价格提醒
-    active_alerts = PriceAlert.objects.filter(status='active').select_related('house', 'user')
     
-    triggered_count = 0
-    for alert in active_alerts:
-        # 更新当前价格
-        alert.current_price = alert.house.price
-        alert.save(update_fields=['current_price'])
-        
-        # 检查是否触发
-        if alert.check_and_trigger():
-            triggered_count += 1
-            # 这里可以发送通知(邮件、短信等)
-            logger.info(f"价格提醒触发: 用户{alert.user.username}, 房源{alert.house.title}")
+    synced_count = PriceAlert.sync_current_prices()
+    triggered_count, triggered_alerts = PriceAlert.trigger_reached()
+    notified_count = enqueue_price_alert_notifications(triggered_alerts)
     
-    logger.info(f"价格提醒检查完成, 触发{triggered_count}个提醒")
+    logger.info(f"价格提醒检查完成, 更新{synced_count}个当前价格, 触发{triggered_count}个提醒, 通知{notified_count}位用户")
     return f"检查完成, 触发{triggered_count}个提醒"
 
 
 @shared_task
-def generate_market_report(district_id=None, report_type='monthly'):
+def check_house_price_alerts(house_id):
+    """
+    房源价格变化后检查该房源的价格提醒
+    由 House 的 post_save 信号在价格变化时投递, 只处理单个房源, 定时全量检查作为兜底
+    """
+    triggered_count = check_price_alerts_for_houses([house_id])
+    if triggered_count:
+        logger.info(f"房源{house_id}价格变化, 触发{triggered_count}个价格提醒")
+    return triggered_count
+
+
+@shared_task
+def check_houses_price_alerts(house_ids):
+    """
+    批量导入更新房源价格后检查这些房源的价格提醒
+    bulk_update 不发送 post_save, 由导入器在事务提交后按批投递
+    """
+    triggered_count = check_price_alerts_for_houses(house_ids)
+    if triggered_count:
+        logger.info(f"{len(house_ids)}个房源价格变化, 触发{triggered_count}个价格提醒")
+    return triggered_count
+
+
+def check_price_alerts_for_houses(house_ids):
+    """
+    同步指定房源的当前价格并触发达到目标价的提醒, 返回触发数
+    """
+    from apps.favorites.models import PriceAlert
+    
+    PriceAlert.sync_current_prices(house_ids=house_ids)
+    triggered_count, triggered_alerts = PriceAlert.trigger_reached(house_ids=house_ids)
+    if triggered_count:
+        enqueue_price_alert_notifications(triggered_alerts)
+    return triggered_count
+
+
+def enqueue_price_alert_notifications(alerts, batch_size=NOTIFICATION_BATCH_SIZE):
+    """
+    为已触发的价格提醒分批投递通知邮件任务, 返回投递的邮件数
     """
-    生成市场报告
+    from celery import group
+    
+    rows = alerts.exclude(user__email='').values_list(
+        'user__email', 'house__title', 'current_price', 'target_price'
+    ).iterator(chunk_size=batch_size)
+    
+    enqueued = 0
+    batch = []
+    for email, title, current_price, target_price in rows:
+        batch.append(send_notification_email.s(
+            email,
+            f"价格提醒: {title}",
+            f"您关注的房源「{title}」当前价格{current_price}万元, 已达到您设置的目标价格{target_price}万元。"
+        ))
+        if len(batch) >= batch_size:
+            group(batch).apply_async()
+            enqueued += len(batch)
+            batch = []
+    if batch:
+        group(batch).apply_async()
+        enqueued += len(batch)
+    return enqueued
+
+
+@shared_task
+def generate_market_report(district_id=None, report_type='monthly', all_districts=False):
+    """
+    生成市场报告, 同一区域、类型、日期重复生成时覆盖旧报告
     参数:
         district_id: 区域ID,为None时生成全市报告
-        report_type: 报告类型 (monthly/quarterly/yearly)
+        report_type: 报告类型 (monthly/quarterly/yearly), 可传列表或 'all' 一次生成多种
+        all_districts: 为True时一次生成全部区域及全市报告, 忽略 district_id
     """
     from apps.analysis.models import MarketReport
-    from apps.houses.models import House, Transaction, District
-    from django.db.models import Avg, Count
     
-    # 确定时间范围
-    end_date = datetime.now().date()
-    if report_type == 'monthly':
-        start_date = end_date - timedelta(days=30)
-        title_prefix = "月度"
-    elif report_type == 'quarterly':
-        start_date = end_date - timedelta(days=90)
-        title_prefix = "季度"
-    else:  # yearly
-        start_date = end_date - timedelta(days=365)
-        title_prefix = "年度"
-    
-    # 查询数据
-    houses = House.objects.filter(status='available')
-    transactions = Transaction.objects.filter(
-        deal_date__gte=start_date,
-        deal_date__lte=end_date
-    )
-    
-    district = None
-    if district_id:
-        district = District.objects.get(id=district_id)
-        houses = houses.filter(district=district)
-        transactions = transactions.filter(house__district=district)
-        title = f"{district.name}{title_prefix}市场报告"
+    if report_type == 'all':
+        report_types = list(MarketReport.PERIOD_DAYS)
+    elif isinstance(report_type, str):
+        report_types = [report_type]
     else:
-        title = f"全市{title_prefix}市场报告"
-    
-    # 统计数据
-    house_stats = houses.aggregate(
-        avg_price=Avg('price'),
-        avg_unit_price=Avg('unit_price'),
-        count=Count('id')
-    )
+        report_types = list(report_type)
     
-    transaction_count = transactions.count()
-    
-    # 计算价格变化率(与上期对比)
-    previous_start = start_date - (end_date - start_date)
-    previous_transactions = Transaction.objects.filter(
-        deal_date__gte=previous_start,
-        deal_date__lt=start_date
-    )
-    if district_id:
-        previous_transactions = previous_transactions.filter(house__district=district)
-    
-    current_avg = transactions.aggregate(avg=Avg('deal_price'))['avg'] or 0
-    previous_avg = previous_transactions.aggregate(avg=Avg('deal_price'))['avg'] or 0
-    
-    if previous_avg > 0:
-        price_change_rate = ((current_avg - previous_avg) / previous_avg) * 100
+    if all_districts:
+        reports = MarketReport.generate(report_types)
+    elif district_id:
+        reports = MarketReport.generate(report_types, district_ids=[district_id], include_city=False)
+        if not reports:
+            logger.warning(f"市场报告生成跳过: 区域 {district_id} 不存在")
+            return f"区域不存在: {district_id}"
     else:
-        price_change_rate = 0
+        reports = MarketReport.generate(report_types, district_ids=[])
     
-    # 生成摘要
-    summary = f"本期平均价格{house_stats['avg_price']:.2f}万元，" \
-              f"平均单价{house_stats['avg_unit_price']:.2f}元/平米，" \
-              f"在售房源{house_stats['count']}套，" \
-              f"成交{transaction_count}套，" \
-              f"价格{'上涨' if price_change_rate > 0 else '下降'}{abs(price_change_rate):.2f}%"
-    
-    # 创建报告
-    report = MarketReport.objects.create(
-        title=title,
-        report_type=report_type,
-        district=district,
-        report_date=end_date,
-        avg_price=house_stats['avg_price'] or 0,
-        avg_unit_price=house_stats['avg_unit_price'] or 0,
-        total_listings=house_stats['count'],
-        total_transactions=transaction_count,
-        price_change_rate=price_change_rate,
-        summary=summary,
-        content=f"报告时间范围: {start_date} 至 {end_date}"
-    )
-    
-    logger.info(f"市场报告生成完成: {title}")
-    return f"报告生成完成: {report.id}"
+    logger.info(f"市场报告生成完成: {len(reports)}份 ({', '.join(report_types)})")
+    return f"报告生成完成: {len(reports)}份"
 
 
-@shared_task
-def cleanup_old_data():
+@shared_task(bind=True)
+def cleanup_old_data(self, archive=None, batch_size=None, pause=None):
     """
     清理旧数据
-    删除超过2年的已售房源和成交记录
+    分批删除超过保留期(默认2年)的已售房源和成交记录, 批次间暂停以免阻塞接口写入
+    参数:
+        archive: 删除前是否归档到 CLEANUP_ARCHIVE_DIR, 为None时读取 CLEANUP_ARCHIVE_ENABLED 配置
+        batch_size: 每批删除的记录数, 为None时读取 CLEANUP_BATCH_SIZE 配置
+        pause: 批次间暂停秒数, 为None时读取 CLEANUP_PAUSE_SECONDS 配置
     """
-    from apps.houses.models import House, Transaction
-    
-    two_years_ago = datetime.now().date() - timedelta(days=730)
+    overrides = {}
+    if batch_size is not None:
+        overrides['batch_size'] = batch_size
+    if pause is not None:
+        overrides['pause'] = pause
     
-    # 删除旧的已售房源
-    old_houses = House.objects.filter(
-        status='sold',
-        updated_at__lt=two_years_ago
-    )
-    house_count = old_houses.count()
-    old_houses.delete()
+    def report_progress(progress):
+        if self.request.is_eager or not self.request.id:
+            return
+        try:
+            self.update_state(state='PROGRESS', meta=progress)
+        except Exception as exc:
+            # 结果后端不可用时不影响清理本身
+            logger.warning(f"清理进度上报失败: {exc}")
     
-    # 删除旧的成交记录
-    old_transactions = Transaction.objects.filter(
-        deal_date__lt=two_years_ago
-    )
-    transaction_count = old_transactions.count()
-    old_transactions.delete()
+    cleaner = ChunkedDataCleaner.from_settings(archive=archive, on_progress=report_progress, **overrides)
+    stats = cleaner.run()
     
-    logger.info(f"数据清理完成: 删除{house_count}个房源, {transaction_count}条成交记录")
-    return f"清理完成: {house_count}个房源, {transaction_count}条记录"
+    logger.info(f"数据清理完成: 删除{stats.houses}个房源, {stats.transactions}条成交记录")
+    return stats.to_dict()
 
 
 @shared_task
@@ -229,28 +245,38 @@ def send_notification_email(user_email, subject, message):
 
 
 @shared_task
-def update_house_statistics():
+def update_house_statistics(district_ids=None):
     """
     更新房源统计数据
-    计算每个区域的房源数量、平均价格等统计信息
+    计算每个区域的房源数量、平均价格、近30天成交数等统计信息,
+    写入 DistrictStats 汇总表供分析接口读取
+    参数:
+        district_ids: 仅刷新指定区域, 为None时刷新全部区域
     """
-    from apps.houses.models import District, House
-    from django.db.models import Avg, Count, Max, Min
+    from apps.analysis.models import DistrictStats
+    from apps.common.cache import bump_version
     
-    districts = District.objects.all()
+    refreshed = DistrictStats.refresh(district_ids=district_ids)
+    bump_version('district_stats')
     
-    for district in districts:
-        stats = House.objects.filter(
-            district=district,
-            status='available'
-        ).aggregate(
-            count=Count('id'),
-            avg_price=Avg('price'),
-            max_price=Max('price'),
-            min_price=Min('price')
-        )
-        
-        logger.info(f"区域 {district.name}: {stats}")
+    logger.info(f"房源统计更新完成, 刷新{refreshed}个区域")
+    return f"统计更新完成: {refreshed}个区域"
+
+
+@shared_task
+def rebuild_unit_price_cube(months=None):
+    """
+    重建成交单价分位数立方体
+    成交记录新增时已增量更新对应单元, 此任务用于修正批量导入、户型变更等造成的偏差
+    参数:
+        months: 仅重建最近N个月, 为None时全量重建
+    """
+    from apps.analysis.models import UnitPriceCube
+    
+    since = None
+    if months:
+        since = datetime.now().date() - timedelta(days=31 * int(months))
+    rebuilt = UnitPriceCube.rebuild(since=since)
     
-    logger.info("房源统计更新完成")
-    return "统计更新完成"
+    logger.info(f"成交单价立方体重建完成, 写入{rebuilt}个单元")
+    return f"立方体重建完成: {rebuilt}个单元"
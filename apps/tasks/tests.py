@@ -0,0 +1,337 @@
+"""
+房天下分页抓取测试
+"""
+import gzip
+import json
+import random
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipIf
+
+import httpx
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.analysis.models import DistrictStats, UnitPriceCube
+from apps.favorites.models import Favorite, PriceAlert
+from apps.houses.models import District, House, HouseImage, Transaction
+from apps.users.models import User
+from .data_cleanup import ChunkedDataCleaner, CleanupArchive
+from .excel_importer import FangExcelImporter
+from .fang_crawler import MAX_RETRY_AFTER_SECONDS, FangPagedCrawler, page_urls
+from .fang_scraper import FangTopScraper, lxml_html
+
+BASE_URL = 'https://esf.example.com/top/'
+
+LISTING_FIXTURE = Path(__file__).resolve().parent / 'fixtures' / 'fang_top_listing.html'
+
+
+def listing_page(source_ids):
+    nodes = ''.join(
+        f'<dl dataflag="bg" data-bg=\'{json.dumps({"houseid": source_id})}\'>'
+        f'<dd><h4><a href="/chushou/{source_id}.htm">房源{source_id}</a></h4></dd></dl>'
+        for source_id in source_ids
+    )
+    return f'<html><body>{nodes}</body></html>'
+
+
+@skipIf(lxml_html is None, '未安装 lxml')
+class FangParserTests(SimpleTestCase):
+    """
+    lxml 与 html.parser 两种解析路径对保存的列表页给出相同结果
+    """
+
+    def setUp(self):
+        patcher = mock.patch('apps.tasks.fang_scraper.timezone.now', return_value=timezone.now())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _parse(self, parser):
+        scraper = FangTopScraper(parser=parser)
+        # 直接调用各自的解析路径, 避免 lxml 出错时静默回退到 html.parser
+        parse = scraper._parse_listings_lxml if parser == 'lxml' else scraper._parse_listings_soup
+        # 固定随机种子, 使随机补全的字段一致
+        random.seed(0)
+        return parse(LISTING_FIXTURE.read_text(encoding='utf-8'))
+
+    def test_parsers_produce_identical_listings(self):
+        soup_listings = self._parse('html.parser')
+        lxml_listings = self._parse('lxml')
+
+        self.assertEqual(len(lxml_listings), 5)
+        self.assertEqual(lxml_listings, soup_listings)
+
+    def test_missing_optional_nodes(self):
+        listings = {listing.title: listing for listing in self._parse('lxml')}
+
+        no_agent = listings['天通苑北一区\xa0精装两居']
+        self.assertEqual((no_agent.agent_name, no_agent.agent_id), ('', None))
+        self.assertEqual(no_agent.tags, ['满两年', '学区房'])
+
+        bare = listings['独栋别墅 带花园']
+        self.assertEqual((bare.price_total_wan, bare.unit_price), (None, None))
+        self.assertEqual((bare.community, bare.region, bare.cover_image), ('', '', ''))
+        self.assertEqual((bare.source_id, bare.house_type), ('独栋别墅 带花园', '5室及以上'))
+
+        broken_metadata = listings['地下车位急售']
+        self.assertEqual((broken_metadata.area_sqm, broken_metadata.house_type), (None, ''))
+        self.assertEqual(broken_metadata.unit_price, 9800.0)
+
+        self.assertIsNone(listings['西城 学区 一居'].unit_price)
+
+
+class FangPagedCrawlerTests(SimpleTestCase):
+    """
+    用 httpx.MockTransport 模拟列表页, 不访问网络
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.requests = []
+
+    def _crawler(self, handler, **kwargs):
+        def record(request):
+            self.requests.append(request)
+            return handler(request)
+
+        options = {
+            'base_urls': [BASE_URL],
+            'max_pages': 3,
+            'concurrency': 1,
+            'rate_per_host': 0,
+            'max_retries': 2,
+            'backoff': 0.01,
+            'scraper': FangTopScraper(parser='html.parser'),
+            'transport': httpx.MockTransport(record),
+        }
+        options.update(kwargs)
+        return FangPagedCrawler(**options)
+
+    def test_pages_are_merged_and_pages_after_an_empty_one_skipped(self):
+        pages = dict(zip(page_urls(BASE_URL, 5), [['a1', 'a2'], ['a2', 'b1'], []]))
+
+        def handler(request):
+            return httpx.Response(200, text=listing_page(pages.get(str(request.url), ['x'])))
+
+        listings, stats = self._crawler(handler, max_pages=5).crawl()
+
+        self.assertEqual([listing.source_id for listing in listings], ['a1', 'a2', 'b1'])
+        self.assertEqual([str(request.url) for request in self.requests], page_urls(BASE_URL, 3))
+        self.assertEqual((stats.pages_fetched, stats.pages_skipped, stats.listings), (3, 2, 3))
+
+    def test_committed_validators_turn_refetches_into_304(self):
+        def handler(request):
+            etag = f'"{request.url.path}"'
+            if request.headers.get('If-None-Match') == etag:
+                return httpx.Response(304)
+            return httpx.Response(200, text=listing_page([request.url.path]), headers={'ETag': etag})
+
+        crawler = self._crawler(handler)
+        listings, stats = crawler.crawl()
+        self.assertEqual((len(listings), stats.pages_fetched), (3, 3))
+        self.assertEqual(len(crawler.pending_validators), 3)
+
+        # 未提交的校验值不会被使用, 失败的一轮需要完整重抓
+        listings, stats = crawler.crawl()
+        self.assertEqual((len(listings), stats.pages_not_modified), (3, 0))
+
+        self.assertEqual(crawler.commit_validators(), 3)
+        self.requests.clear()
+        listings, stats = crawler.crawl()
+        self.assertEqual((listings, stats.pages_fetched, stats.pages_not_modified), ([], 0, 3))
+        self.assertTrue(all(request.headers.get('If-None-Match') for request in self.requests))
+
+    def test_retries_with_exponential_backoff(self):
+        failures = {url: 2 for url in page_urls(BASE_URL, 1)}
+
+        def handler(request):
+            url = str(request.url)
+            if failures.get(url):
+                failures[url] -= 1
+                return httpx.Response(503)
+            return httpx.Response(200, text=listing_page(['a1']))
+
+        sleep = mock.AsyncMock()
+        with mock.patch('apps.tasks.fang_crawler.asyncio.sleep', sleep), \
+                mock.patch('apps.tasks.fang_crawler.random.uniform', return_value=1.0):
+            listings, stats = self._crawler(handler, max_pages=1).crawl()
+
+        self.assertEqual([listing.source_id for listing in listings], ['a1'])
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual([call.args[0] for call in sleep.await_args_list], [0.01, 0.02])
+        self.assertEqual((stats.pages_fetched, stats.pages_failed), (1, 0))
+
+    def test_retry_after_is_capped_and_exhausted_retries_fail_the_page(self):
+        def handler(request):
+            return httpx.Response(429, headers={'Retry-After': '86400'})
+
+        sleep = mock.AsyncMock()
+        with mock.patch('apps.tasks.fang_crawler.asyncio.sleep', sleep), \
+                mock.patch('apps.tasks.fang_crawler.random.uniform', return_value=1.0), \
+                self.assertLogs('apps.tasks.fang_crawler', 'WARNING'):
+            listings, stats = self._crawler(handler, max_pages=1).crawl()
+
+        self.assertEqual(listings, [])
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual([call.args[0] for call in sleep.await_args_list], [MAX_RETRY_AFTER_SECONDS] * 2)
+        self.assertEqual((stats.pages_fetched, stats.pages_failed), (0, 1))
+
+    def test_retry_after_parsing(self):
+        cases = {
+            '5': 5.0,
+            '-3': 0.0,
+            'inf': MAX_RETRY_AFTER_SECONDS,
+            'nan': None,
+            'Fri, 31 Dec 9999 23:59:59 GMT': MAX_RETRY_AFTER_SECONDS,
+            'Thu, 01 Jan 1970 00:00:00 GMT': 0.0,
+            'soon': None,
+            None: None,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(FangPagedCrawler._retry_after(value), expected)
+
+
+class ExcelImporterUpdateTests(TestCase):
+    """
+    批量更新(bulk_update 不发送 post_save)后的价格提醒与单价立方体
+    """
+
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_dir.cleanup)
+        self.importer = FangExcelImporter(data_dir=Path(self.data_dir.name))
+        self._import()
+        self.house = House.objects.get(source_id='fang-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(house=self.house, deal_price=Decimal('480.00'), deal_date=date(2026, 1, 15))
+
+    def _import(self, **changes):
+        record = {
+            'source_id': 'fang-1', 'title': '望京两居', 'district_name': '朝阳', 'address': '望京花园',
+            'price_total_wan': 500, 'unit_price': 50000, 'area_sqm': 100, 'house_type': '2室',
+            'floor': '中层', 'total_floors': 18, 'orientation': '南北', 'agent_name': '张明',
+        }
+        record.update(changes)
+        with mock.patch('apps.tasks.tasks.check_houses_price_alerts.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = self.importer.import_records([record])
+        return stats, delay
+
+    def _cells(self):
+        return dict(UnitPriceCube.objects.values_list('house_type', 'sample_count'))
+
+    def test_price_change_enqueues_alert_check(self):
+        stats, delay = self._import(price_total_wan=440)
+        self.assertEqual(stats.updated, 1)
+        delay.assert_called_once_with([self.house.pk])
+
+    def test_other_changes_do_not_enqueue_alert_check(self):
+        stats, delay = self._import(floor='高层')
+        self.assertEqual(stats.updated, 1)
+        delay.assert_not_called()
+
+    def test_house_type_change_moves_unit_price_cells(self):
+        self.assertEqual(self._cells(), {'2室': 1})
+        self._import(house_type='3室')
+        self.assertEqual(self._cells(), {'3室': 1})
+
+    def test_row_mode_uses_the_same_update_path(self):
+        self.importer.batch = False
+        stats, delay = self._import(price_total_wan=440, house_type='3室')
+        self.assertEqual(stats.updated, 1)
+        delay.assert_called_once_with([self.house.pk])
+        self.assertEqual(self._cells(), {'3室': 1})
+
+
+class ChunkedDataCleanerTests(TestCase):
+    """
+    分批清理: 批次边界、原生删除的级联、归档与删除一致、区域统计刷新
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cleaner', password='password', email='cleaner@example.com', phone='13700000000',
+        )
+        cls.districts = [District.objects.create(name=f'清理测试区{index}') for index in range(3)]
+        houses = House.objects.bulk_create([
+            House(
+                title=f'房源{index}', district=cls.districts[index % 2], address=f'测试路{index}号',
+                price=Decimal('300.00'), unit_price=Decimal('30000.00'), area=Decimal('100.00'),
+                house_type='2室', floor='中层', total_floors=18, orientation='南',
+                status='available' if index == 6 else 'sold',
+            )
+            for index in range(7)
+        ])
+        # 前 5 套早已售出, 第 6 套刚售出, 第 7 套在售
+        cls.expired, cls.kept = houses[:5], houses[5:]
+        House.objects.filter(pk__in=[house.pk for house in cls.expired]).update(
+            updated_at=timezone.now() - timedelta(days=800),
+        )
+        old_day = timezone.now().date() - timedelta(days=800)
+        HouseImage.objects.bulk_create([HouseImage(house=house, image=f'houses/images/{house.pk}.jpg')
+                                        for house in houses])
+        Favorite.objects.bulk_create([Favorite(user=cls.user, house=house) for house in houses])
+        PriceAlert.objects.bulk_create([
+            PriceAlert(user=cls.user, house=house, target_price=Decimal('200.00'), current_price=house.price)
+            for house in houses
+        ])
+        Transaction.objects.bulk_create(
+            [Transaction(house=house, deal_price=Decimal('290.00'), deal_date=old_day) for house in houses]
+            + [Transaction(house=cls.kept[1], deal_price=Decimal('280.00'), deal_date=old_day) for _ in range(2)]
+            + [Transaction(house=cls.kept[1], deal_price=Decimal('310.00'), deal_date=timezone.now().date())]
+        )
+        DistrictStats.objects.bulk_create([DistrictStats(district=district, house_count=99)
+                                           for district in cls.districts])
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive = CleanupArchive(Path(archive_dir.name))
+
+    def _archived_ids(self, table):
+        path = self.archive.directory / f'{table}.jsonl.gz'
+        if not path.exists():
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            return sorted(json.loads(line)['id'] for line in handle)
+
+    def test_purges_in_batches_and_archives_exactly_the_deleted_rows(self):
+        before = {
+            model: set(model.objects.values_list('pk', flat=True))
+            for model in (House, HouseImage, Favorite, PriceAlert, Transaction)
+        }
+        progress = []
+        stats = ChunkedDataCleaner(batch_size=2, pause=0, archive=self.archive,
+                                   on_progress=progress.append).run()
+
+        # 5 套房源分 3 批, 第 6、7 套房源剩余的 4 条过期成交分 2 批
+        self.assertEqual((stats.houses, stats.transactions, stats.batches), (5, 4, 5))
+        self.assertEqual([item['houses'] for item in progress], [2, 4, 5, 5, 5])
+        self.assertEqual(stats.related, {
+            'houses.HouseImage': 5, 'houses.Transaction': 5, 'favorites.Favorite': 5, 'favorites.PriceAlert': 5,
+        })
+
+        expired = {house.pk for house in self.expired}
+        self.assertFalse(House.objects.filter(pk__in=expired).exists())
+        for model in (HouseImage, Favorite, PriceAlert, Transaction):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(house_id__in=expired).exists())
+        self.assertEqual(list(Transaction.objects.values_list('deal_date', flat=True)), [timezone.now().date()])
+        self.assertEqual(HouseImage.objects.count(), 2)
+
+        for model in (House, HouseImage, Favorite, PriceAlert, Transaction):
+            with self.subTest(archive=model.__name__):
+                deleted = before[model] - set(model.objects.values_list('pk', flat=True))
+                self.assertEqual(self._archived_ids(model._meta.db_table), sorted(deleted))
+
+    def test_refreshes_district_stats_of_touched_districts(self):
+        ChunkedDataCleaner(batch_size=2, pause=0).run()
+        counts = dict(DistrictStats.objects.values_list('district_id', 'house_count'))
+        self.assertEqual(counts, {
+            self.districts[0].pk: 1, self.districts[1].pk: 0, self.districts[2].pk: 99,
+        })
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -209,11 +210,31 @@ _fang_top_run_immediate = os.getenv('FANG_TOP_RUN_IMMEDIATELY', 'True') == 'True
 
 #	•	FANG_TOP_CRONTAB：控制执行频率（可修改执行间隔） •	FANG_TOP_RUN_IMMEDIATELY：控制是否立刻执行（True/False）
 
+# 分页并发抓取: FANG_CRAWL_BASE_URLS 为逗号分隔的城市入口地址, 每个入口抓取 FANG_CRAWL_MAX_PAGES 页
+FANG_CRAWL_PAGED = os.getenv('FANG_CRAWL_PAGED', 'False') == 'True'
+FANG_CRAWL_BASE_URLS = [
+    url.strip() for url in os.getenv('FANG_CRAWL_BASE_URLS', 'https://esf.fang.com/top/').split(',')
+    if url.strip()
+]
+FANG_CRAWL_MAX_PAGES = int(os.getenv('FANG_CRAWL_MAX_PAGES', 10))
+FANG_CRAWL_CONCURRENCY = int(os.getenv('FANG_CRAWL_CONCURRENCY', 8))
+FANG_CRAWL_RATE_PER_HOST = float(os.getenv('FANG_CRAWL_RATE_PER_HOST', 4))
+FANG_CRAWL_MAX_RETRIES = int(os.getenv('FANG_CRAWL_MAX_RETRIES', 3))
+# 抓取结果直接分批写库, 不再经 data/ 下的 Excel 中转; FANG_STREAM_EXPORT_EXCEL 时另存一份到 data/exports/
+FANG_CRAWL_STREAM_TO_DB = os.getenv('FANG_CRAWL_STREAM_TO_DB', 'False') == 'True'
+FANG_STREAM_EXPORT_EXCEL = os.getenv('FANG_STREAM_EXPORT_EXCEL', 'False') == 'True'
+# 列表页解析器: auto(优先 lxml, 未安装时回退 html.parser) / lxml / html.parser
+FANG_HTML_PARSER = os.getenv('FANG_HTML_PARSER', 'auto')
+
 _fang_excel_cron = os.getenv('FANG_EXCEL_CRONTAB', '*/10 * * * *').split()
 if len(_fang_excel_cron) != 5:
     _fang_excel_cron = ['*/10', '*', '*', '*', '*']
 _fang_excel_enabled = os.getenv('FANG_EXCEL_SCHEDULE_ENABLED', 'True') == 'True'
 
+_district_stats_cron = os.getenv('DISTRICT_STATS_CRONTAB', '*/10 * * * *').split()
+if len(_district_stats_cron) != 5:
+    _district_stats_cron = ['*/10', '*', '*', '*', '*']
+
 if os.getenv('FANG_TOP_SCHEDULE_ENABLED', 'True') == 'True':
     CELERY_BEAT_SCHEDULE['crawl_fang_top_listings'] = {
         'task': 'apps.tasks.tasks.crawl_fang_top_listings',
@@ -247,14 +268,71 @@ if _fang_excel_enabled:
         },
     }
 
-# Redis Cache
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': CELERY_BROKER_URL,
-    }
+CELERY_BEAT_SCHEDULE['update_house_statistics'] = {
+    'task': 'apps.tasks.tasks.update_house_statistics',
+    'schedule': crontab(
+        minute=_district_stats_cron[0],
+        hour=_district_stats_cron[1],
+        day_of_month=_district_stats_cron[2],
+        month_of_year=_district_stats_cron[3],
+        day_of_week=_district_stats_cron[4],
+    ),
+}
+
+CELERY_BEAT_SCHEDULE['rebuild_unit_price_cube'] = {
+    'task': 'apps.tasks.tasks.rebuild_unit_price_cube',
+    'schedule': crontab(minute=30, hour=3),
+    'kwargs': {'months': 7},
 }
 
+# 接口性能采样: 按比例抽样记录耗时、SQL 与响应大小, 管理员可在 /api/analysis/profiling_stats/ 查看
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.05))
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', 1000))
+PROFILING_FLUSH_INTERVAL = int(os.getenv('PROFILING_FLUSH_INTERVAL', 10))
+PROFILING_FLUSH_THRESHOLD = int(os.getenv('PROFILING_FLUSH_THRESHOLD', 100))
+
+# 旧数据清理: 按主键分批删除, 批次间暂停; 开启归档时删除前写入 CLEANUP_ARCHIVE_DIR (jsonl 为 gzip 压缩, parquet 需要 pyarrow)
+CLEANUP_RETENTION_DAYS = int(os.getenv('CLEANUP_RETENTION_DAYS', 730))
+CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', 1000))
+CLEANUP_PAUSE_SECONDS = float(os.getenv('CLEANUP_PAUSE_SECONDS', 0.2))
+CLEANUP_ARCHIVE_ENABLED = os.getenv('CLEANUP_ARCHIVE_ENABLED', 'False') == 'True'
+CLEANUP_ARCHIVE_FORMAT = os.getenv('CLEANUP_ARCHIVE_FORMAT', 'jsonl')
+CLEANUP_ARCHIVE_DIR = os.getenv('CLEANUP_ARCHIVE_DIR', str(BASE_DIR / 'data' / 'archive'))
+
+# 房源浏览量写回缓冲: 间隔秒数或累计次数任一达到即批量写回数据库
+HOUSE_VIEWS_FLUSH_INTERVAL = int(os.getenv('HOUSE_VIEWS_FLUSH_INTERVAL', 10))
+HOUSE_VIEWS_FLUSH_THRESHOLD = int(os.getenv('HOUSE_VIEWS_FLUSH_THRESHOLD', 100))
+# 后台线程按间隔写回, 空闲 worker 不再无限期持有缓冲的浏览量
+HOUSE_VIEWS_BACKGROUND_FLUSH = os.getenv('HOUSE_VIEWS_BACKGROUND_FLUSH', 'True') == 'True'
+
+# Cache: 生产环境使用 Redis, 本地开发可设置 CACHE_BACKEND=locmem 或 file
+_cache_backend = os.getenv('CACHE_BACKEND', 'redis')
+if _cache_backend == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+elif _cache_backend == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', '/var/tmp/django_cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', CELERY_BROKER_URL),
+        }
+    }
+
+# 只读接口响应缓存; RESPONSE_CACHE_TTLS 可按命名空间覆盖默认缓存秒数, 0 表示关闭
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_TTLS = {}
+
 # Logging
 LOGGING = {
     'version': 1,